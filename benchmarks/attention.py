@@ -0,0 +1,112 @@
+"""Latency and peak memory of every CrossAttention of the UNet (the self- and cross-attentions of the
+transformers at 24x24 and 12x12 of the 96px model, and the offset interpreters) by the "sdpa" and
+"math" attention backends at several batch sizes, and the end-to-end generate latency of both.
+
+    python -m benchmarks.attention --device cpu --bench_attention_batch_sizes 1 8 32
+"""
+import torch
+from torch.profiler import (profile,
+                            ProfilerActivity)
+
+from benchmarks.common import (get_bench_parser,
+                               parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               generate_kwargs,
+                               time_fn,
+                               report)
+from src.modules.attention import CrossAttention
+
+
+def peak_memory(fn, device):
+    """The peak memory allocated by `fn()` above the memory before it, in bytes.
+    """
+    with torch.no_grad():
+        if torch.device(device).type == "cuda":
+            torch.cuda.synchronize(device)
+            torch.cuda.reset_peak_memory_stats(device)
+            start = torch.cuda.memory_allocated(device)
+            fn()
+            return torch.cuda.max_memory_allocated(device) - start
+        with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+            fn()
+    current = peak = 0
+    for event in sorted(prof.events(), key=lambda event: event.time_range.start):
+        current += event.self_cpu_memory_usage
+        peak = max(peak, current)
+    return peak
+
+
+def expand_batch(inputs, batch_size):
+    if inputs is None:
+        return None
+    if isinstance(inputs, tuple):
+        return tuple(expand_batch(tensor, batch_size) for tensor in inputs)
+    return inputs[:1].expand(batch_size, *inputs.shape[1:]).contiguous()
+
+
+def main():
+    parser = get_bench_parser()
+    parser.add_argument("--bench_attention_batch_sizes", type=int, nargs="+", default=[1, 8, 32],
+                        help="The batch sizes of the attention inputs.")
+    args = parse_bench_args(parser)
+    pipe = load_bench_pipeline(args)
+    content_images, style_images = load_bench_images(args)
+    kwargs = generate_kwargs(args)
+
+    # Record the inputs of every CrossAttention call in one UNet step.
+    calls = []
+
+    def record(module, inputs, kwargs):
+        # The key/value of the style cross-attentions and the query of the offset interpreters are precomputed.
+        calls.append((module, inputs[0], {name: kwargs.get(name) for name in ["context", "query", "key_value"]}))
+
+    hooks = [module.register_forward_pre_hook(record, with_kwargs=True) \
+             for module in pipe.model.unet.modules() if isinstance(module, CrossAttention)]
+    with torch.no_grad():
+        pipe.generate(content_images=content_images[:1], style_images=style_images[:1], batch_size=1,
+                      **dict(kwargs, num_inference_step=1, order=1))
+    for hook in hooks:
+        hook.remove()
+    # The attentions of the same shapes are benchmarked once.
+    shapes = {}
+    for module, hidden_states, call_kwargs in calls:
+        if call_kwargs["key_value"] is not None:
+            num_keys = call_kwargs["key_value"][0].shape[1]
+        elif call_kwargs["context"] is not None:
+            num_keys = call_kwargs["context"].shape[1]
+        else:
+            num_keys = None
+        shapes.setdefault((*hidden_states.shape[1:], num_keys), (module, hidden_states, call_kwargs))
+
+    for (num_queries, channels, num_keys), (module, hidden_states, call_kwargs) in shapes.items():
+        kind = "self" if num_keys is None else f"cross ({num_keys} keys)"
+        print(f"{kind}-attention, {num_queries} queries of {channels} channels")
+        for batch_size in args.bench_attention_batch_sizes:
+            inputs = expand_batch(hidden_states, batch_size)
+            inputs_kwargs = {name: expand_batch(value, batch_size) for name, value in call_kwargs.items()}
+            results = {}
+            attention_backend = module.attention_backend
+            for backend in ["math", "sdpa"]:
+                module.set_attention_backend(backend)
+                fn = lambda: module(inputs, **inputs_kwargs)
+                results[backend] = (time_fn(fn, args.device, repeat=args.repeat, warmup=args.warmup),
+                                    peak_memory(fn, args.device))
+            module.set_attention_backend(attention_backend)
+            (math_seconds, math_memory), (sdpa_seconds, sdpa_memory) = results["math"], results["sdpa"]
+            print(f"    batch {batch_size:3d}  math {math_seconds * 1000:8.2f} ms {math_memory / 2**20:8.1f} MiB"
+                  f"   sdpa {sdpa_seconds * 1000:8.2f} ms {sdpa_memory / 2**20:8.1f} MiB   x{math_seconds / sdpa_seconds:.2f}")
+
+    batch_size = content_images.shape[0]
+    results = {}
+    for backend in ["math", "sdpa"]:
+        pipe.model.unet.set_attention_backend(backend)
+        results[backend] = time_fn(lambda: pipe.generate(content_images=content_images, style_images=style_images,
+                                                         batch_size=batch_size, **kwargs),
+                                   args.device, repeat=args.repeat, warmup=args.warmup)
+    report("generate, math attention", results["math"], batch_size)
+    report("generate, sdpa attention", results["sdpa"], batch_size, baseline=results["math"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Time to the first glyph, i.e. the load of the model plus one generate call, from the .pth files
+of a checkpoint directory against the fp32 single-file inference checkpoint, and the difference of
+their first glyphs. The fp16 file, which the sampling does not load, is only timed for the load.
+
+    python -m benchmarks.cold_start --ckpt_dir ckpt/ --device cpu
+
+Without --ckpt_dir, a randomly initialized checkpoint is written to a temporary directory.
+"""
+import os
+import tempfile
+import time
+from argparse import Namespace
+
+import torch
+
+from benchmarks.common import (parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               generate_kwargs)
+from src import (get_inference_config,
+                 save_inference_checkpoint,
+                 load_inference_checkpoint)
+
+
+def main():
+    args = parse_bench_args()
+    content_images, style_images = load_bench_images(args)
+    content_images, style_images = content_images[:1], style_images[:1]
+    kwargs = generate_kwargs(args)
+
+    def first_glyph(args):
+        from sample import load_fontdiffuer_pipeline
+
+        start = time.perf_counter()
+        pipe = load_fontdiffuer_pipeline(args=args)
+        load_seconds = time.perf_counter() - start
+        with torch.no_grad():
+            images = pipe.generate(content_images=content_images, style_images=style_images, batch_size=1,
+                                   generator=torch.Generator().manual_seed(args.seed), output_type="pt", **kwargs)
+        return load_seconds, time.perf_counter() - start, images.float()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pipe = load_bench_pipeline(args)
+        if args.ckpt_dir is None:
+            args.ckpt_dir = tmp_dir
+            for name in ["unet", "style_encoder", "content_encoder"]:
+                torch.save(getattr(pipe.model, name).state_dict(), f"{tmp_dir}/{name}.pth")
+        # The kernels and the thread pools are initialized before the timed loads.
+        with torch.no_grad():
+            pipe.generate(content_images=content_images, style_images=style_images, batch_size=1, **kwargs)
+
+        variants = [("pth files", args.ckpt_dir, dict(inference_ckpt_path=None))]
+        path = f"{tmp_dir}/fontdiffuser_fp32.safetensors"
+        save_inference_checkpoint(pipe.model, path, config=get_inference_config(args))
+        variants.append(("inference checkpoint fp32", path, dict(inference_ckpt_path=path)))
+        fp16_path = f"{tmp_dir}/fontdiffuser_fp16.safetensors"
+        save_inference_checkpoint(pipe.model, fp16_path, config=get_inference_config(args), dtype=torch.float16)
+        del pipe
+
+        baseline = None
+        for name, path, variant_args in variants:
+            files = [f"{path}/{module}.pth" for module in ["unet", "style_encoder", "content_encoder"]] \
+                if os.path.isdir(path) else [path]
+            size = sum(os.path.getsize(file) for file in files)
+            load_seconds, seconds, images = first_glyph(Namespace(**dict(vars(args), **variant_args)))
+            line = f"{name:<28s} {size / 2**20:7.1f} MiB   load {load_seconds * 1000:8.1f} ms" \
+                   f"   first glyph {seconds * 1000:8.1f} ms"
+            if baseline is None:
+                baseline, baseline_images = seconds, images
+            else:
+                diff = (baseline_images - images).abs().max().item()
+                line += f"   x{baseline / seconds:.2f}   max abs difference of the uint8 glyph {diff:.0f}"
+            print(line)
+
+        start = time.perf_counter()
+        load_inference_checkpoint(path=fp16_path, device=args.device)
+        print(f"{'inference checkpoint fp16':<28s} {os.path.getsize(fp16_path) / 2**20:7.1f} MiB"
+              f"   load {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
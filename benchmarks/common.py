@@ -0,0 +1,127 @@
+import time
+import statistics
+
+import torch
+from PIL import Image
+
+from configs.fontdiffuser import get_parser
+from src import (FontDiffuserDPMPipeline,
+                 FontDiffuserModelDPM,
+                 build_ddpm_scheduler,
+                 build_unet,
+                 build_content_encoder,
+                 build_style_encoder)
+
+
+def get_bench_parser():
+    parser = get_parser()
+    parser.add_argument("--ckpt_dir", type=str, default=None,
+                        help="The checkpoint directory. If None, the model is randomly initialized, \
+                            which is enough for latency numbers but not for quality numbers.")
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--content_image_path", type=str, default="data_examples/sampling/example_content.jpg")
+    parser.add_argument("--style_image_path", type=str, default="data_examples/sampling/example_style.jpg")
+    parser.add_argument("--bench_batch_size", type=int, default=1, help="The number of glyphs per generate call.")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of timed runs.")
+    parser.add_argument("--warmup", type=int, default=1, help="The number of untimed runs.")
+    return parser
+
+
+def parse_bench_args(parser=None):
+    parser = get_bench_parser() if parser is None else parser
+    args = parser.parse_args()
+    args.style_image_size = (args.style_image_size, args.style_image_size)
+    args.content_image_size = (args.content_image_size, args.content_image_size)
+    args.demo = True
+    args.character_input = False
+    return args
+
+
+def load_bench_pipeline(args):
+    if args.ckpt_dir is not None:
+        from sample import load_fontdiffuer_pipeline
+        return load_fontdiffuer_pipeline(args=args)
+
+    torch.manual_seed(args.seed)
+    model = FontDiffuserModelDPM(
+        unet=build_unet(args=args),
+        style_encoder=build_style_encoder(args=args),
+        content_encoder=build_content_encoder(args=args))
+    model.eval()
+    model.to(args.device)
+    if args.attention_backend is None:
+        from src.modules.attention import SDPA_AVAILABLE
+
+        # The attention of `load_fontdiffuer_model`.
+        if SDPA_AVAILABLE:
+            model.unet.set_attention_backend("sdpa")
+    pipe = FontDiffuserDPMPipeline(
+        model=model,
+        ddpm_train_scheduler=build_ddpm_scheduler(args=args),
+        model_type=args.model_type,
+        guidance_type=args.guidance_type,
+        guidance_scale=args.guidance_scale,
+        style_registry_max_memory_bytes=args.style_registry_max_memory_mb * 2**20,
+        style_registry_spill_dir=args.style_registry_spill_dir)
+    print("Built a randomly initialized pipeline for benchmarking.")
+    return pipe
+
+
+def load_bench_images(args):
+    """Return the (content_images, style_images) batch of `args.bench_batch_size`.
+    """
+    from sample import image_process
+    content_image = Image.open(args.content_image_path).convert('RGB')
+    style_image = Image.open(args.style_image_path).convert('RGB')
+    content_image, style_image, _ = image_process(args=args,
+                                                  content_image=content_image,
+                                                  style_image=style_image)
+    content_images = content_image.repeat(args.bench_batch_size, 1, 1, 1).to(args.device)
+    style_images = style_image.repeat(args.bench_batch_size, 1, 1, 1).to(args.device)
+    return content_images, style_images
+
+
+def generate_kwargs(args):
+    return dict(
+        order=args.order,
+        num_inference_step=args.num_inference_steps,
+        content_encoder_downsample_size=args.content_encoder_downsample_size,
+        dm_size=args.content_image_size,
+        algorithm_type=args.algorithm_type,
+        skip_type=args.skip_type,
+        method=args.method,
+        correcting_x0_fn=args.correcting_x0_fn,
+        guidance_interval=args.guidance_interval,
+        reuse_uncond=args.reuse_uncond,
+        deep_cache_interval=args.deep_cache_interval,
+        deep_cache_depth=args.deep_cache_depth,
+        early_stop_tol=args.early_stop_tol,
+        early_stop_patience=args.early_stop_patience)
+
+
+def _synchronize(device):
+    if torch.device(device).type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def time_fn(fn, device, repeat=3, warmup=1):
+    """Return the median wall time of `fn()` in seconds.
+    """
+    with torch.no_grad():
+        for _ in range(warmup):
+            fn()
+        _synchronize(device)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            _synchronize(device)
+            times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def report(name, seconds, num_glyphs, baseline=None):
+    line = f"{name:<32s} {seconds * 1000 / num_glyphs:10.1f} ms/glyph {num_glyphs / seconds:8.2f} glyphs/s"
+    if baseline is not None:
+        line += f"   x{baseline / seconds:.2f}"
+    print(line)
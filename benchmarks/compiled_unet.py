@@ -0,0 +1,53 @@
+"""Glyphs/s of the torch.compile UNet against the eager UNet, with the warm-up time of the
+compilation. Run it twice with the same --compile_cache_dir to see the warm-up of a restarted
+process, which reuses the compiled kernels.
+
+    python -m benchmarks.compiled_unet --device cpu --bench_batch_size 3 --compile_batch_sizes 1 4
+"""
+import time
+
+import torch
+
+from benchmarks.common import (parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               generate_kwargs,
+                               time_fn,
+                               report)
+
+
+def main():
+    args = parse_bench_args()
+    pipe = load_bench_pipeline(args)
+    content_images, style_images = load_bench_images(args)
+    batch_size = content_images.shape[0]
+    kwargs = generate_kwargs(args)
+
+    def generate():
+        cond = pipe.encode_condition(content_images, style_images)
+        uncond = pipe.get_uncond_condition(content_images, style_images)
+        x_sample = pipe.sample(model=pipe.model.denoise, cond=cond, uncond=uncond, batch_size=batch_size,
+                               generator=torch.Generator().manual_seed(args.seed), **kwargs)
+        return (x_sample / 2 + 0.5).clamp(0, 1)
+
+    with torch.no_grad():
+        eager_images = generate()
+    baseline = time_fn(generate, args.device, repeat=args.repeat, warmup=args.warmup)
+    report("eager UNet", baseline, batch_size)
+
+    pipe.enable_compile(batch_sizes=args.compile_batch_sizes, cache_dir=args.compile_cache_dir)
+    start = time.perf_counter()
+    pipe.warmup_compile(content_encoder_downsample_size=args.content_encoder_downsample_size,
+                        dm_size=args.content_image_size,
+                        batch_sizes=[pipe._padded_batch_size(batch_size)])
+    print(f"warm-up of the batch size bucket {pipe._padded_batch_size(batch_size)}: "
+          f"{time.perf_counter() - start:.1f}s")
+    with torch.no_grad():
+        diff = (generate() - eager_images).abs()
+    seconds = time_fn(generate, args.device, repeat=args.repeat, warmup=args.warmup)
+    report("compiled UNet", seconds, batch_size, baseline=baseline)
+    print(f"    image difference to eager: max {diff.max().item():.3e}, mean {diff.mean().item():.3e}")
+
+
+if __name__ == "__main__":
+    main()
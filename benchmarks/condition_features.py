@@ -0,0 +1,58 @@
+"""Per-glyph latency of encoding the condition once per generate() call versus
+running the encoders inside every DPM-Solver step, and of reusing the cached
+unconditional features on top of that.
+
+    python -m benchmarks.condition_features --ckpt_dir ckpt/ --device cpu
+"""
+import torch
+
+from benchmarks.common import (parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               generate_kwargs,
+                               time_fn,
+                               report)
+
+
+def main():
+    args = parse_bench_args()
+    pipe = load_bench_pipeline(args)
+    content_images, style_images = load_bench_images(args)
+    batch_size = content_images.shape[0]
+    kwargs = generate_kwargs(args)
+
+    def per_step_encoding():
+        # The encoders run inside `model.forward` at every step.
+        cond = [content_images, style_images]
+        uncond = [torch.ones_like(content_images), torch.ones_like(style_images)]
+        return pipe.sample(model=pipe.model, cond=cond, uncond=uncond, batch_size=batch_size,
+                           generator=torch.Generator().manual_seed(args.seed), **kwargs)
+
+    def encode_once():
+        cond = pipe.encode_condition(content_images, style_images)
+        uncond = pipe.encode_condition(torch.ones_like(content_images), torch.ones_like(style_images))
+        return pipe.sample(model=pipe.model.denoise, cond=cond, uncond=uncond, batch_size=batch_size,
+                           generator=torch.Generator().manual_seed(args.seed), **kwargs)
+
+    def cached_uncond():
+        cond = pipe.encode_condition(content_images, style_images)
+        uncond = pipe.get_uncond_condition(content_images, style_images)
+        return pipe.sample(model=pipe.model.denoise, cond=cond, uncond=uncond, batch_size=batch_size,
+                           generator=torch.Generator().manual_seed(args.seed), **kwargs)
+
+    with torch.no_grad():
+        baseline_images = (per_step_encoding() / 2 + 0.5).clamp(0, 1)
+        optimized_images = (encode_once() / 2 + 0.5).clamp(0, 1)
+    max_diff = (baseline_images - optimized_images).abs().max().item()
+    print(f"max abs difference of the output images: {max_diff:.3e}")
+
+    baseline = time_fn(per_step_encoding, args.device, repeat=args.repeat, warmup=args.warmup)
+    optimized = time_fn(encode_once, args.device, repeat=args.repeat, warmup=args.warmup)
+    report("encoders at every step", baseline, batch_size)
+    report("encoders once per generate", optimized, batch_size, baseline=baseline)
+    cached = time_fn(cached_uncond, args.device, repeat=args.repeat, warmup=args.warmup)
+    report("+ cached uncond features", cached, batch_size, baseline=baseline)
+
+
+if __name__ == "__main__":
+    main()
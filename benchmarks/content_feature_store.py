@@ -0,0 +1,59 @@
+"""Per-glyph latency of rendering and encoding the content images versus reading
+the content features from the precomputed ContentFeatureStore.
+
+    python -m benchmarks.content_feature_store --ckpt_dir ckpt/ --ttf_path ttf/KaiXinSongA.ttf
+"""
+import tempfile
+
+import torch
+
+from src import ContentFeatureStore
+from sample import charset_process
+from utils import (get_font_chars,
+                   read_charset)
+from benchmarks.common import (get_bench_parser,
+                               parse_bench_args,
+                               load_bench_pipeline,
+                               time_fn,
+                               report)
+
+
+def main():
+    parser = get_bench_parser()
+    parser.add_argument("--ttf_path", type=str, default="ttf/KaiXinSongA.ttf")
+    parser.add_argument("--charset", type=str, default="big5_4808.txt")
+    args = parse_bench_args(parser)
+    pipe = load_bench_pipeline(args)
+
+    font_chars = get_font_chars(font_path=args.ttf_path)
+    chars = [char for char in read_charset(args.charset) if ord(char) in font_chars][:args.bench_batch_size]
+
+    def render_and_encode():
+        content_images = torch.stack(list(charset_process(args=args, chars=chars))).to(args.device)
+        return pipe.model.encode_content(content_images)
+
+    with tempfile.TemporaryDirectory() as root_dir:
+        store = ContentFeatureStore.build(root_dir=root_dir,
+                                          key="bench",
+                                          model=pipe.model,
+                                          content_images=charset_process(args=args, chars=chars),
+                                          codepoints=[ord(char) for char in chars],
+                                          image_shape=(3, *args.content_image_size))
+
+        def read_store():
+            return store.get(chars, device=args.device)
+
+        with torch.no_grad():
+            max_diff = max((a - b).abs().max().item() for a, b in \
+                           zip(render_and_encode().residual_features, read_store().residual_features))
+        print(f"max abs difference of the content features: {max_diff:.3e}")
+
+        baseline = time_fn(render_and_encode, args.device, repeat=args.repeat, warmup=args.warmup)
+        optimized = time_fn(read_store, args.device, repeat=args.repeat, warmup=args.warmup)
+        del store
+    report("render + content encoder", baseline, len(chars))
+    report("content feature store", optimized, len(chars), baseline=baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Glyphs/s of the CPU inference fast path (channels_last, bf16 UNet) against the fp32
+NCHW baseline, with the parity of the output images.
+
+    python -m benchmarks.cpu_inference --ckpt_dir ckpt/ --device cpu --bench_batch_size 8
+"""
+import torch
+
+from benchmarks.common import (parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               generate_kwargs,
+                               time_fn,
+                               report)
+
+
+def main():
+    args = parse_bench_args()
+    pipe = load_bench_pipeline(args)
+    content_images, style_images = load_bench_images(args)
+    batch_size = content_images.shape[0]
+    kwargs = generate_kwargs(args)
+
+    def generate():
+        cond = pipe.encode_condition(content_images, style_images)
+        uncond = pipe.get_uncond_condition(content_images, style_images)
+        x_sample = pipe.sample(model=pipe.model.denoise, cond=cond, uncond=uncond, batch_size=batch_size,
+                               generator=torch.Generator().manual_seed(args.seed), **kwargs)
+        return (x_sample / 2 + 0.5).clamp(0, 1)
+
+    with torch.no_grad():
+        baseline_images = generate()
+    baseline = time_fn(generate, args.device, repeat=args.repeat, warmup=args.warmup)
+    report("fp32 NCHW", baseline, batch_size)
+
+    for name, unet_autocast_dtype in [("channels_last", None), ("channels_last + bf16 UNet", torch.bfloat16)]:
+        pipe.enable_cpu_inference(channels_last=True, unet_autocast_dtype=unet_autocast_dtype,
+                                  num_threads=args.num_threads)
+        with torch.no_grad():
+            diff = (generate() - baseline_images).abs()
+        seconds = time_fn(generate, args.device, repeat=args.repeat, warmup=args.warmup)
+        report(name, seconds, batch_size, baseline=baseline)
+        print(f"    image difference to fp32: max {diff.max().item():.3e}, mean {diff.mean().item():.3e}")
+
+
+if __name__ == "__main__":
+    main()
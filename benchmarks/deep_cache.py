@@ -0,0 +1,58 @@
+"""Glyphs/s and image difference of the cached sampling (DeepCache), which reuses the deep
+UNet path across the steps, against the full UNet at every step.
+
+    python -m benchmarks.deep_cache --ckpt_dir ckpt/ --device cpu --bench_batch_size 4 \
+        --num_inference_steps 20 --bench_deep_cache_intervals 2 3 5
+"""
+import torch
+
+from benchmarks.common import (get_bench_parser,
+                               parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               generate_kwargs,
+                               time_fn,
+                               report)
+
+
+def main():
+    parser = get_bench_parser()
+    parser.add_argument("--bench_deep_cache_intervals", type=int, nargs="+", default=[2, 3, 5],
+                        help="The DeepCache intervals compared with the full UNet.")
+    parser.add_argument("--bench_deep_cache_depths", type=int, nargs="+", default=[1, 2],
+                        help="The DeepCache depths compared with the full UNet.")
+    args = parse_bench_args(parser)
+    pipe = load_bench_pipeline(args)
+    content_images, style_images = load_bench_images(args)
+    batch_size = content_images.shape[0]
+    kwargs = generate_kwargs(args)
+
+    def generate(deep_cache_interval, deep_cache_depth):
+        cond = pipe.encode_condition(content_images, style_images)
+        uncond = pipe.get_uncond_condition(content_images, style_images)
+        x_sample = pipe.sample(model=pipe.model.denoise, cond=cond, uncond=uncond, batch_size=batch_size,
+                               generator=torch.Generator().manual_seed(args.seed),
+                               **dict(kwargs, deep_cache_interval=deep_cache_interval,
+                                      deep_cache_depth=deep_cache_depth))
+        return (x_sample / 2 + 0.5).clamp(0, 1)
+
+    with torch.no_grad():
+        full_images = generate(1, 1)
+    baseline = time_fn(lambda: generate(1, 1), args.device, repeat=args.repeat, warmup=args.warmup)
+    report(f"full UNet, {args.num_inference_steps} steps", baseline, batch_size)
+
+    for deep_cache_depth in args.bench_deep_cache_depths:
+        for deep_cache_interval in args.bench_deep_cache_intervals:
+            with torch.no_grad():
+                diff = generate(deep_cache_interval, deep_cache_depth) - full_images
+            seconds = time_fn(lambda: generate(deep_cache_interval, deep_cache_depth), args.device,
+                              repeat=args.repeat, warmup=args.warmup)
+            report(f"DeepCache depth {deep_cache_depth}, interval {deep_cache_interval}", seconds, batch_size,
+                   baseline=baseline)
+            psnr = -10 * torch.log10(diff.pow(2).mean()).item()
+            print(f"    image difference to the full UNet: max {diff.abs().max().item():.3e}, "
+                  f"PSNR {psnr:.1f} dB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Latency of every deformable conv of the StyleRSIUpBlock2Ds (3x3 kernels with one offset group
+on the 24x24 and 48x48 skip connections of the 96px model) by the "torchvision" and "grid_sample"
+deformable conv backends at several batch sizes, the difference of their outputs, and the
+end-to-end generate latency of both.
+
+    python -m benchmarks.deform_conv --device cpu --bench_deform_conv_batch_sizes 1 8 32
+"""
+import torch
+from torchvision.ops import DeformConv2d
+
+from benchmarks.common import (get_bench_parser,
+                               parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               generate_kwargs,
+                               time_fn,
+                               report)
+from src.modules.deform_conv import GridSampleDeformConv2d
+
+
+def main():
+    parser = get_bench_parser()
+    parser.add_argument("--bench_deform_conv_batch_sizes", type=int, nargs="+", default=[1, 8, 32],
+                        help="The batch sizes of the deformable conv inputs.")
+    args = parse_bench_args(parser)
+    pipe = load_bench_pipeline(args)
+    content_images, style_images = load_bench_images(args)
+    kwargs = generate_kwargs(args)
+    pipe.model.unet.set_deform_conv_backend("torchvision")
+
+    # Record the inputs and offsets of every deformable conv in one UNet step.
+    calls = []
+
+    def record(module, inputs):
+        calls.append((module, *inputs))
+
+    hooks = [module.register_forward_pre_hook(record) \
+             for module in pipe.model.unet.modules() if isinstance(module, DeformConv2d)]
+    with torch.no_grad():
+        pipe.generate(content_images=content_images[:1], style_images=style_images[:1], batch_size=1,
+                      **dict(kwargs, num_inference_step=1, order=1))
+    for hook in hooks:
+        hook.remove()
+    # The deformable convs of the same shapes are benchmarked once.
+    shapes = {}
+    for module, input, offset in calls:
+        shapes.setdefault(tuple(input.shape[1:]), (module, input, offset))
+
+    for (channels, height, width), (module, input, offset) in shapes.items():
+        grid_sample_module = GridSampleDeformConv2d(module)
+        print(f"deformable conv, {channels} channels at {height}x{width}")
+        for batch_size in args.bench_deform_conv_batch_sizes:
+            inputs = input[:1].expand(batch_size, -1, -1, -1).contiguous()
+            offsets = offset[:1].expand(batch_size, -1, -1, -1).contiguous()
+            with torch.no_grad():
+                diff = (module(inputs, offsets) - grid_sample_module(inputs, offsets)).abs().max().item()
+            torchvision_seconds = time_fn(lambda: module(inputs, offsets), args.device,
+                                          repeat=args.repeat, warmup=args.warmup)
+            grid_sample_seconds = time_fn(lambda: grid_sample_module(inputs, offsets), args.device,
+                                          repeat=args.repeat, warmup=args.warmup)
+            print(f"    batch {batch_size:3d}  torchvision {torchvision_seconds * 1000:8.2f} ms"
+                  f"   grid_sample {grid_sample_seconds * 1000:8.2f} ms"
+                  f"   x{torchvision_seconds / grid_sample_seconds:.2f}   max abs difference {diff:.3e}")
+
+    batch_size = content_images.shape[0]
+    results, images = {}, {}
+    for backend in ["torchvision", "grid_sample"]:
+        pipe.model.unet.set_deform_conv_backend(backend)
+        fn = lambda: pipe.generate(content_images=content_images, style_images=style_images, batch_size=batch_size,
+                                   generator=torch.Generator().manual_seed(args.seed), output_type="pt", **kwargs)
+        results[backend] = time_fn(fn, args.device, repeat=args.repeat, warmup=args.warmup)
+        images[backend] = fn().float()
+    report("generate, torchvision deformable convs", results["torchvision"], batch_size)
+    report("generate, grid_sample deformable convs", results["grid_sample"], batch_size,
+           baseline=results["torchvision"])
+    diff = (images["torchvision"] - images["grid_sample"]).abs().max().item()
+    print(f"max abs difference of the uint8 output images: {diff:.0f}")
+
+
+if __name__ == "__main__":
+    main()
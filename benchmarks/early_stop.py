@@ -0,0 +1,65 @@
+"""UNet batch cost, glyphs/s and image difference of the per-glyph early termination, which
+retires the glyphs whose binarized x0 has converged, against the full step count.
+
+    python -m benchmarks.early_stop --ckpt_dir ckpt/ --device cpu --bench_batch_size 8 \
+        --bench_early_stop_tols 0 0.001 0.005
+"""
+import torch
+
+from benchmarks.common import (get_bench_parser,
+                               parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               generate_kwargs,
+                               time_fn,
+                               report)
+
+
+def main():
+    parser = get_bench_parser()
+    parser.add_argument("--bench_early_stop_tols", type=float, nargs="+", default=[0, 0.001, 0.005],
+                        help="The early termination tolerances compared with the full step count.")
+    args = parse_bench_args(parser)
+    pipe = load_bench_pipeline(args)
+    content_images, style_images = load_bench_images(args)
+    batch_size = content_images.shape[0]
+    kwargs = generate_kwargs(args)
+
+    # The number of UNet rows evaluated, i.e. the batch cost of the sampling.
+    num_unet_rows = 0
+
+    def denoise(x_t, *denoise_args, **denoise_kwargs):
+        nonlocal num_unet_rows
+        num_unet_rows += x_t.shape[0]
+        return pipe.model.denoise(x_t, *denoise_args, **denoise_kwargs)
+
+    def generate(early_stop_tol):
+        cond = pipe.encode_condition(content_images, style_images)
+        uncond = pipe.get_uncond_condition(content_images, style_images)
+        x_sample = pipe.sample(model=denoise, cond=cond, uncond=uncond, batch_size=batch_size,
+                               generator=torch.Generator().manual_seed(args.seed),
+                               **dict(kwargs, early_stop_tol=early_stop_tol))
+        return (x_sample / 2 + 0.5).clamp(0, 1)
+
+    with torch.no_grad():
+        full_images = generate(None)
+    full_rows = num_unet_rows
+    baseline = time_fn(lambda: generate(None), args.device, repeat=args.repeat, warmup=args.warmup)
+    report(f"{args.num_inference_steps} steps for every glyph", baseline, batch_size)
+    print(f"    UNet rows {full_rows}")
+
+    for early_stop_tol in args.bench_early_stop_tols:
+        num_unet_rows = 0
+        with torch.no_grad():
+            diff = generate(early_stop_tol) - full_images
+        rows = num_unet_rows
+        seconds = time_fn(lambda: generate(early_stop_tol), args.device, repeat=args.repeat, warmup=args.warmup)
+        report(f"early termination, tol {early_stop_tol}", seconds, batch_size, baseline=baseline)
+        # The glyphs are near-binary, so the binarized pixels which differ matter the most.
+        binary_diff = ((full_images > 0.5) != (full_images + diff > 0.5)).float().mean()
+        print(f"    UNet rows {rows} ({100 * (1 - rows / full_rows):.0f}% fewer), image difference to the full "
+              f"steps: max {diff.abs().max().item():.3e}, binarized pixels changed {100 * binary_diff.item():.2f}%")
+
+
+if __name__ == "__main__":
+    main()
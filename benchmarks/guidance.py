@@ -0,0 +1,68 @@
+"""UNet batch cost, glyphs/s and image difference of the guidance interval and the reuse of
+the unconditional output, against the classifier-free guidance at every step.
+
+    python -m benchmarks.guidance --ckpt_dir ckpt/ --device cpu --bench_batch_size 4 \
+        --bench_guidance_interval 500 999
+"""
+import torch
+
+from benchmarks.common import (get_bench_parser,
+                               parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               generate_kwargs,
+                               time_fn,
+                               report)
+
+
+def main():
+    parser = get_bench_parser()
+    parser.add_argument("--bench_guidance_interval", type=float, nargs=2, default=[500, 999],
+                        help="The guidance interval compared with the full guidance.")
+    args = parse_bench_args(parser)
+    pipe = load_bench_pipeline(args)
+    content_images, style_images = load_bench_images(args)
+    batch_size = content_images.shape[0]
+    kwargs = generate_kwargs(args)
+
+    # The number of UNet rows evaluated, i.e. the batch cost of the sampling.
+    num_unet_rows = 0
+
+    def denoise(x_t, *denoise_args, **denoise_kwargs):
+        nonlocal num_unet_rows
+        num_unet_rows += x_t.shape[0]
+        return pipe.model.denoise(x_t, *denoise_args, **denoise_kwargs)
+
+    def generate(guidance_interval, reuse_uncond):
+        cond = pipe.encode_condition(content_images, style_images)
+        uncond = pipe.get_uncond_condition(content_images, style_images)
+        x_sample = pipe.sample(model=denoise, cond=cond, uncond=uncond, batch_size=batch_size,
+                               generator=torch.Generator().manual_seed(args.seed),
+                               **dict(kwargs, guidance_interval=guidance_interval, reuse_uncond=reuse_uncond))
+        return (x_sample / 2 + 0.5).clamp(0, 1)
+
+    baseline = None
+    for name, guidance_interval, reuse_uncond in [
+            ("guidance at every step", None, False),
+            ("guidance interval", args.bench_guidance_interval, False),
+            ("reuse uncond", None, True),
+            ("guidance interval + reuse uncond", args.bench_guidance_interval, True)]:
+        num_unet_rows = 0
+        with torch.no_grad():
+            images = generate(guidance_interval, reuse_uncond)
+        rows = num_unet_rows
+        seconds = time_fn(lambda: generate(guidance_interval, reuse_uncond), args.device,
+                          repeat=args.repeat, warmup=args.warmup)
+        report(name, seconds, batch_size, baseline=baseline)
+        if baseline is None:
+            baseline, baseline_images, baseline_rows = seconds, images, rows
+            print(f"    UNet rows {rows}")
+        else:
+            diff = images - baseline_images
+            psnr = -10 * torch.log10(diff.pow(2).mean()).item()
+            print(f"    UNet rows {rows} ({100 * (1 - rows / baseline_rows):.0f}% fewer), image difference "
+                  f"to the full guidance: max {diff.abs().max().item():.3e}, PSNR {psnr:.1f} dB")
+
+
+if __name__ == "__main__":
+    main()
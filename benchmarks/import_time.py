@@ -0,0 +1,60 @@
+"""Cold start of fresh interpreters: the wall time of importing the sampling CLI, the core inference
+path (what a worker building the pipeline imports) and the src package, and the top-level packages
+taking the most import time in each by `python -X importtime`.
+
+    python -m benchmarks.import_time --repeat 5 --bench_import_top 10
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import (get_bench_parser,
+                               parse_bench_args)
+
+IMPORT_TARGETS = [
+    ("sample.py CLI", "import sample"),
+    ("core inference path", "from src import (FontDiffuserDPMPipeline, FontDiffuserModelDPM, build_unet, "
+                            "build_style_encoder, build_content_encoder, build_ddpm_scheduler)"),
+    ("src package", "import src"),
+]
+
+
+def run_importtime(statement):
+    """Run `statement` in a fresh interpreter, return its wall time in seconds and the \
+        {top-level package: seconds} of `-X importtime`, where every module counts its self time \
+        to its top-level package, so the times of the packages add up.
+    """
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=repo_dir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    seconds = time.perf_counter() - start
+    packages = {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or line.endswith("imported package"):
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0.) + int(self_us) / 1e6
+    return seconds, packages
+
+
+def main():
+    parser = get_bench_parser()
+    parser.add_argument("--bench_import_top", type=int, default=8, help="The number of heaviest imports listed.")
+    args = parse_bench_args(parser)
+
+    for name, statement in IMPORT_TARGETS:
+        runs = [run_importtime(statement) for _ in range(args.warmup + args.repeat)][args.warmup:]
+        seconds = statistics.median(seconds for seconds, _ in runs)
+        print(f"{name:<24s} {seconds * 1000:8.1f} ms   ({statement})")
+        packages = runs[-1][1]
+        for package in sorted(packages, key=packages.get, reverse=True)[:args.bench_import_top]:
+            print(f"    {package:<24s} {packages[package] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Lookup time of the discrete NoiseScheduleVP, `interpolate_fn` with one lookup per quantity
+against the binary search lookup of `NoiseScheduleVP.marginal`, and the difference of the two.
+
+    python -m benchmarks.noise_schedule --device cpu --bench_query_sizes 1 20 1000
+"""
+import torch
+
+from benchmarks.common import (get_bench_parser,
+                               parse_bench_args,
+                               time_fn)
+from src import build_ddpm_scheduler
+from src.dpm_solver.dpm_solver_pytorch import (NoiseScheduleVP,
+                                               interpolate_fn)
+
+
+def interpolate_marginal(ns, t):
+    """(log_alpha_t, alpha_t, sigma_t, lambda_t) by `interpolate_fn`, as every marginal function looked them up before.
+    """
+    def log_mean_coeff():
+        return interpolate_fn(t.reshape((-1, 1)), ns.t_array.to(t.device), ns.log_alpha_array.to(t.device)).reshape((-1))
+
+    log_alpha_t = log_mean_coeff()
+    alpha_t = torch.exp(log_mean_coeff())
+    sigma_t = torch.sqrt(1. - torch.exp(2. * log_mean_coeff()))
+    log_mean_coeff_t = log_mean_coeff()
+    lambda_t = log_mean_coeff_t - 0.5 * torch.log(1. - torch.exp(2. * log_mean_coeff_t))
+    return log_alpha_t, alpha_t, sigma_t, lambda_t
+
+
+def interpolate_inverse_lambda(ns, lamb):
+    log_alpha = -0.5 * torch.logaddexp(torch.zeros((1,)).to(lamb.device), -2. * lamb)
+    t = interpolate_fn(log_alpha.reshape((-1, 1)), torch.flip(ns.log_alpha_array.to(lamb.device), [1]),
+                       torch.flip(ns.t_array.to(lamb.device), [1]))
+    return t.reshape((-1,))
+
+
+def main():
+    parser = get_bench_parser()
+    parser.add_argument("--bench_query_sizes", type=int, nargs="+", default=[1, 20, 1000],
+                        help="The numbers of time labels per lookup.")
+    parser.add_argument("--bench_num_calls", type=int, default=100, help="The number of lookups per timed run.")
+    args = parse_bench_args(parser)
+    ns = NoiseScheduleVP(schedule='discrete', betas=build_ddpm_scheduler(args=args).betas)
+    generator = torch.Generator().manual_seed(args.seed)
+
+    for query_size in args.bench_query_sizes:
+        # Beyond [1 / N, 1] on both sides to cover the extrapolated segments, but above t = 0 where sigma_t vanishes.
+        t = (0.5 / ns.total_N + torch.rand((query_size,), generator=generator) * 1.01).to(args.device)
+        lamb = ns.marginal_lambda(t.clamp(1. / ns.total_N, 1.))
+
+        def run(fn, *fn_args):
+            return time_fn(lambda: [fn(*fn_args) for _ in range(args.bench_num_calls)],
+                           args.device, repeat=args.repeat, warmup=args.warmup) / args.bench_num_calls
+
+        baseline = run(interpolate_marginal, ns, t)
+        seconds = run(ns.marginal, t)
+        inverse_baseline = run(interpolate_inverse_lambda, ns, lamb)
+        inverse_seconds = run(ns.inverse_lambda, lamb)
+        diffs = [(expected - value).abs().max().item() \
+                 for expected, value in zip(interpolate_marginal(ns, t), ns.marginal(t))]
+        inverse_diff = (interpolate_inverse_lambda(ns, lamb) - ns.inverse_lambda(lamb)).abs().max().item()
+        print(f"{query_size:5d} labels  marginal {baseline * 1e6:9.1f} -> {seconds * 1e6:7.1f} us   x{baseline / seconds:.2f}"
+              f"   inverse_lambda {inverse_baseline * 1e6:9.1f} -> {inverse_seconds * 1e6:7.1f} us"
+              f"   x{inverse_baseline / inverse_seconds:.2f}")
+        print("    max difference to interpolate_fn: log_alpha {:.2e}, alpha {:.2e}, sigma {:.2e}, lambda {:.2e}, "
+              "inverse_lambda {:.2e}".format(*diffs, inverse_diff))
+
+
+if __name__ == "__main__":
+    main()
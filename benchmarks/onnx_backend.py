@@ -0,0 +1,59 @@
+"""Glyphs/s of the onnxruntime backend against the torch pipeline, with the parity of the
+output images. The torch model is exported to --onnx_dir (a temporary directory if not set).
+
+    python -m benchmarks.onnx_backend --ckpt_dir ckpt/ --device cpu --bench_batch_size 4
+"""
+import tempfile
+
+import torch
+
+from src import (export_onnx,
+                 OnnxFontDiffuserModel)
+from benchmarks.common import (parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               generate_kwargs,
+                               time_fn,
+                               report)
+
+
+def main():
+    args = parse_bench_args()
+    assert torch.device(args.device).type == "cpu", "The onnxruntime backend only runs on cpu."
+    onnx_dir = args.onnx_dir if args.onnx_dir is not None else tempfile.mkdtemp()
+    # The torch pipeline is the baseline and the source of the export.
+    args.onnx_dir = None
+    pipe = load_bench_pipeline(args)
+    content_images, style_images = load_bench_images(args)
+    batch_size = content_images.shape[0]
+    kwargs = generate_kwargs(args)
+
+    def generate():
+        cond = pipe.encode_condition(content_images, style_images)
+        uncond = pipe.get_uncond_condition(content_images, style_images)
+        x_sample = pipe.sample(model=pipe.model.denoise, cond=cond, uncond=uncond, batch_size=batch_size,
+                               generator=torch.Generator().manual_seed(args.seed), **kwargs)
+        return (x_sample / 2 + 0.5).clamp(0, 1)
+
+    with torch.no_grad():
+        torch_images = generate()
+    baseline = time_fn(generate, args.device, repeat=args.repeat, warmup=args.warmup)
+    report("torch", baseline, batch_size)
+
+    export_onnx(model=pipe.model,
+                onnx_dir=onnx_dir,
+                content_image_size=args.content_image_size,
+                style_image_size=args.style_image_size,
+                content_encoder_downsample_size=args.content_encoder_downsample_size)
+    torch_model = pipe.model
+    pipe.model = OnnxFontDiffuserModel(onnx_dir=onnx_dir, num_threads=args.num_threads)
+    with torch.no_grad():
+        diff = (generate() - torch_images).abs()
+    seconds = time_fn(generate, args.device, repeat=args.repeat, warmup=args.warmup)
+    report("onnxruntime", seconds, batch_size, baseline=baseline)
+    print(f"    image difference to torch: max {diff.max().item():.3e}, mean {diff.mean().item():.3e}")
+    pipe.model = torch_model
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Post-processing time of a generated batch, from the [-1, 1] sample to the PNG files: the PIL
+images saved one by one against the uint8 batch quantized on the device and encoded by the
+batched PNG writer, in RGB, 8-bit grayscale and 1-bit.
+
+    python -m benchmarks.output_path --device cpu --bench_batch_size 64
+"""
+import os
+import tempfile
+
+import torch
+
+from benchmarks.common import (get_bench_parser,
+                               parse_bench_args,
+                               time_fn,
+                               report)
+from src import (FontDiffuserDPMPipeline,
+                 build_ddpm_scheduler)
+from utils import (save_image_atomic,
+                   save_images_atomic)
+
+
+def main():
+    parser = get_bench_parser()
+    parser.add_argument("--bench_png_threads", type=int, default=4, help="The threads of the batched PNG writer.")
+    args = parse_bench_args(parser)
+    # Only the post-processing runs, the model is not needed.
+    pipe = FontDiffuserDPMPipeline(model=None, ddpm_train_scheduler=build_ddpm_scheduler(args=args))
+    batch_size = args.bench_batch_size
+    # Near-binary glyphs: a blurred random mask in [-1, 1].
+    generator = torch.Generator().manual_seed(args.seed)
+    mask = torch.rand((batch_size, 1, args.content_image_size[0] // 8, args.content_image_size[1] // 8),
+                      generator=generator) > 0.5
+    x_sample = torch.nn.functional.interpolate(mask.float() * 2 - 1, size=args.content_image_size, mode="bilinear")
+    x_sample = x_sample.expand(-1, 3, -1, -1).contiguous().to(args.device)
+
+    with tempfile.TemporaryDirectory() as save_dir:
+        save_paths = [f"{save_dir}/{i}.png" for i in range(batch_size)]
+
+        def save_pil():
+            images = (x_sample / 2 + 0.5).clamp(0, 1).cpu().permute(0, 2, 3, 1).numpy()
+            for image, save_path in zip(pipe.numpy_to_pil(images), save_paths):
+                save_image_atomic(image=image, save_path=save_path)
+
+        def save_batch(mode, compress_level):
+            images = pipe.quantize_images(x_sample, grayscale=mode != "RGB").permute(0, 2, 3, 1).cpu().numpy()
+            if mode != "RGB":
+                images = images[..., 0]
+            save_images_atomic(images, save_paths, mode=mode, compress_level=compress_level,
+                               num_threads=args.bench_png_threads)
+
+        def total_bytes():
+            return sum(os.path.getsize(save_path) for save_path in save_paths)
+
+        baseline = time_fn(save_pil, args.device, repeat=args.repeat, warmup=args.warmup)
+        report("PIL images one by one", baseline, batch_size)
+        print(f"    {total_bytes() / batch_size:.0f} bytes/glyph")
+        for mode in ["RGB", "L", "1"]:
+            for compress_level in [6, 1]:
+                seconds = time_fn(lambda: save_batch(mode, compress_level), args.device,
+                                  repeat=args.repeat, warmup=args.warmup)
+                report(f"batched {mode}, compress level {compress_level}", seconds, batch_size, baseline=baseline)
+                print(f"    {total_bytes() / batch_size:.0f} bytes/glyph")
+
+
+if __name__ == "__main__":
+    main()
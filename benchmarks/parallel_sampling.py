@@ -0,0 +1,51 @@
+"""Glyphs/s of the charset sampling with 1, 2, 4, ... CPU workers sharing the model weights.
+
+    python -m benchmarks.parallel_sampling --ckpt_dir ckpt/ --ttf_path ttf/KaiXinSongA.ttf \
+        --max_workers 16 --num_glyphs 64
+"""
+import os
+import time
+import tempfile
+
+from PIL import Image
+
+from sample import sampling_charset_parallel
+from utils import read_charset
+from benchmarks.common import (get_bench_parser,
+                               parse_bench_args,
+                               load_bench_pipeline,
+                               report)
+
+
+def main():
+    parser = get_bench_parser()
+    parser.add_argument("--ttf_path", type=str, default="ttf/KaiXinSongA.ttf")
+    parser.add_argument("--charset", type=str, default="big5_4808.txt")
+    parser.add_argument("--num_glyphs", type=int, default=32, help="The number of glyphs of every run.")
+    parser.add_argument("--max_workers", type=int, default=os.cpu_count())
+    args = parse_bench_args(parser)
+    args.batch_size = args.bench_batch_size
+    args.num_threads_per_worker = None
+    args.content_feature_store_dir = None
+    args.save_image_mode = "RGB"
+    args.png_compress_level = 6
+    pipe = load_bench_pipeline(args)
+    style_image = Image.open(args.style_image_path).convert('RGB')
+    chars = read_charset(args.charset)[:args.num_glyphs]
+
+    baseline = None
+    num_workers = 1
+    while num_workers <= args.max_workers:
+        args.num_workers = num_workers
+        with tempfile.TemporaryDirectory() as save_image_dir:
+            args.save_image_dir = save_image_dir
+            start = time.perf_counter()
+            image_paths = sampling_charset_parallel(args=args, pipe=pipe, chars=chars, style_image=style_image)
+            seconds = time.perf_counter() - start
+        report(f"{num_workers} workers", seconds, len(image_paths), baseline=baseline)
+        baseline = seconds if baseline is None else baseline
+        num_workers *= 2
+
+
+if __name__ == "__main__":
+    main()
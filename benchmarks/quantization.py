@@ -0,0 +1,53 @@
+"""Latency and image quality of the int8 UNet (dynamic Linear, and static convs on top)
+against the fp32 UNet, calibrated on the benchmark glyphs.
+
+    python -m benchmarks.quantization --ckpt_dir ckpt/ --device cpu --bench_batch_size 4
+"""
+import copy
+
+import torch
+
+from src import quantize_unet
+from benchmarks.common import (parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               generate_kwargs,
+                               time_fn,
+                               report)
+
+
+def main():
+    args = parse_bench_args()
+    pipe = load_bench_pipeline(args)
+    content_images, style_images = load_bench_images(args)
+    batch_size = content_images.shape[0]
+    kwargs = generate_kwargs(args)
+    fp32_unet = pipe.model.unet
+
+    def generate():
+        cond = pipe.encode_condition(content_images, style_images)
+        uncond = pipe.get_uncond_condition(content_images, style_images)
+        x_sample = pipe.sample(model=pipe.model.denoise, cond=cond, uncond=uncond, batch_size=batch_size,
+                               generator=torch.Generator().manual_seed(args.seed), **kwargs)
+        return (x_sample / 2 + 0.5).clamp(0, 1)
+
+    with torch.no_grad():
+        fp32_images = generate()
+    baseline = time_fn(generate, args.device, repeat=args.repeat, warmup=args.warmup)
+    report("fp32 UNet", baseline, batch_size)
+
+    for name, static_conv in [("int8 Linear", False), ("int8 Linear + static int8 conv", True)]:
+        pipe.model.unet = copy.deepcopy(fp32_unet)
+        quantize_unet(pipe.model.unet, calibrate_fn=generate, static_conv=static_conv)
+        with torch.no_grad():
+            diff = generate() - fp32_images
+        seconds = time_fn(generate, args.device, repeat=args.repeat, warmup=args.warmup)
+        report(name, seconds, batch_size, baseline=baseline)
+        psnr = -10 * torch.log10(diff.pow(2).mean()).item()
+        print(f"    image difference to fp32: max {diff.abs().max().item():.3e}, "
+              f"mean {diff.abs().mean().item():.3e}, PSNR {psnr:.1f} dB")
+    pipe.model.unet = fp32_unet
+
+
+if __name__ == "__main__":
+    main()
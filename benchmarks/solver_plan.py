@@ -0,0 +1,60 @@
+"""Solver overhead of a DPM-Solver sample call with a trivial model, planning the time steps and
+the update coefficients at every call against reusing the SolverPlan of the pipeline, and the
+difference of the planned multistep updates to `DPM_Solver.multistep_dpm_solver_update`.
+
+    python -m benchmarks.solver_plan --device cpu --bench_batch_size 8
+"""
+import torch
+
+from benchmarks.common import (get_bench_parser,
+                               parse_bench_args,
+                               time_fn,
+                               report)
+from src import build_ddpm_scheduler
+from src.dpm_solver.dpm_solver_pytorch import (NoiseScheduleVP,
+                                               DPM_Solver)
+
+
+def main():
+    parser = get_bench_parser()
+    parser.add_argument("--bench_num_calls", type=int, default=20, help="The number of sample calls per timed run.")
+    args = parse_bench_args(parser)
+    noise_schedule = NoiseScheduleVP(schedule='discrete', betas=build_ddpm_scheduler(args=args).betas)
+    x_T = torch.randn((args.bench_batch_size, 3, *args.content_image_size), device=args.device)
+    sample_kwargs = dict(steps=args.num_inference_steps, order=args.order, skip_type=args.skip_type, method=args.method)
+
+    # The model costs nothing, so only the solver itself is timed.
+    def model_fn(x, t_continuous):
+        return x
+
+    def sample(plan_cache):
+        dpm_solver = DPM_Solver(model_fn, noise_schedule, algorithm_type=args.algorithm_type, plan_cache=plan_cache)
+        return dpm_solver.sample(x_T, **sample_kwargs)
+
+    num_glyphs = args.bench_num_calls * args.bench_batch_size
+    baseline = time_fn(lambda: [sample(None) for _ in range(args.bench_num_calls)],
+                       args.device, repeat=args.repeat, warmup=args.warmup)
+    report("planned at every call", baseline, num_glyphs)
+    plan_cache = {}
+    seconds = time_fn(lambda: [sample(plan_cache) for _ in range(args.bench_num_calls)],
+                      args.device, repeat=args.repeat, warmup=args.warmup)
+    report("cached SolverPlan", seconds, num_glyphs, baseline=baseline)
+
+    if args.method == "multistep":
+        dpm_solver = DPM_Solver(model_fn, noise_schedule, algorithm_type=args.algorithm_type)
+        t_0, t_T = 1. / noise_schedule.total_N, noise_schedule.T
+        plan = dpm_solver.get_plan(t_T=t_T, t_0=t_0, device=args.device, **sample_kwargs)
+        max_diff = 0.
+        for step in range(1, args.num_inference_steps + 1):
+            step_order = plan.orders[step]
+            model_prev_list = [torch.randn_like(x_T) for _ in range(step_order)]
+            t_prev_list = [plan.timesteps[step - step_order + i] for i in range(step_order)]
+            expected = dpm_solver.multistep_dpm_solver_update(x_T, model_prev_list, t_prev_list, plan.timesteps[step],
+                                                              step_order)
+            diff = plan.multistep_update(x_T, model_prev_list, step) - expected
+            max_diff = max(max_diff, diff.abs().max().item())
+        print(f"    max difference of the planned updates to multistep_dpm_solver_update {max_diff:.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Latency of the content and style encoders with the spectral norm layers, which run a power
+iteration at every forward, against the same encoders baked by `bake_spectral_norm`, and the
+difference of their eval outputs and of the generated images.
+
+    python -m benchmarks.spectral_norm --ckpt_dir ckpt/ --device cpu --bench_batch_size 8
+"""
+import copy
+
+import torch
+
+from benchmarks.common import (parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               generate_kwargs,
+                               time_fn,
+                               report)
+from src import bake_spectral_norm
+
+
+def max_difference(expected, value):
+    if isinstance(expected, (list, tuple)):
+        return max(max_difference(e, v) for e, v in zip(expected, value))
+    return (expected - value).abs().max().item()
+
+
+def main():
+    args = parse_bench_args()
+    pipe = load_bench_pipeline(args)
+    content_images, style_images = load_bench_images(args)
+    batch_size = content_images.shape[0]
+    kwargs = generate_kwargs(args)
+
+    sn_model = pipe.model
+    baked_model = copy.deepcopy(sn_model)
+    bake_spectral_norm(baked_model.content_encoder)
+    bake_spectral_norm(baked_model.style_encoder)
+
+    for name, images in [("content_encoder", content_images), ("style_encoder", style_images)]:
+        sn_encoder, baked_encoder = getattr(sn_model, name), getattr(baked_model, name)
+        with torch.no_grad():
+            diff = max_difference(sn_encoder(images), baked_encoder(images))
+        baseline = time_fn(lambda: sn_encoder(images), args.device, repeat=args.repeat, warmup=args.warmup)
+        seconds = time_fn(lambda: baked_encoder(images), args.device, repeat=args.repeat, warmup=args.warmup)
+        report(f"{name}, spectral norm layers", baseline, batch_size)
+        report(f"{name}, baked", seconds, batch_size, baseline=baseline)
+        print(f"    max abs difference of the outputs: {diff:.3e}")
+
+    # The cached uncond features are keyed by the model, so every model encodes its own.
+    images = {}
+    for name, model in [("spectral norm", sn_model), ("baked", baked_model)]:
+        pipe.model = model
+        images[name] = pipe.generate(content_images=content_images, style_images=style_images,
+                                     batch_size=batch_size, generator=torch.Generator().manual_seed(args.seed),
+                                     output_type="pt", **kwargs).float()
+    pipe.model = sn_model
+    diff = max_difference(images["spectral norm"], images["baked"])
+    print(f"max abs difference of the uint8 output images: {diff:.0f}")
+
+
+if __name__ == "__main__":
+    main()
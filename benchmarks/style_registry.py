@@ -0,0 +1,39 @@
+"""Per-call latency of encoding the style image versus looking it up in the StyleRegistry
+by its content hash, which is what every generate() call with the same style pays.
+
+    python -m benchmarks.style_registry --ckpt_dir ckpt/ --device cpu
+"""
+import torch
+
+from benchmarks.common import (parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               time_fn,
+                               report)
+
+
+def main():
+    args = parse_bench_args()
+    pipe = load_bench_pipeline(args)
+    _, style_images = load_bench_images(args)
+    style_images = style_images[:1]
+
+    def encode_style():
+        return pipe.model.encode_style(style_images)
+
+    def registry_lookup():
+        return pipe.get_style_features(pipe.style_registry.make_handle(style_images))
+
+    with torch.no_grad():
+        max_diff = max((a - b).abs().max().item() for a, b in \
+                       zip(encode_style().content_res_features, registry_lookup().content_res_features))
+    print(f"max abs difference of the style features: {max_diff:.3e}")
+
+    baseline = time_fn(encode_style, args.device, repeat=args.repeat, warmup=args.warmup)
+    optimized = time_fn(registry_lookup, args.device, repeat=args.repeat, warmup=args.warmup)
+    report("style encoder", baseline, 1)
+    report("style registry hit", optimized, 1, baseline=baseline)
+
+
+if __name__ == "__main__":
+    main()
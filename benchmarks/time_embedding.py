@@ -0,0 +1,52 @@
+"""Time embedding cost of one sampling run, the sinusoidal projection and the TimestepEmbedding MLP
+of every UNet call against the lookups in the TimestepEmbeddingTable of the solver plan, at several
+batch sizes, and the difference of the embeddings.
+
+    python -m benchmarks.time_embedding --device cpu --bench_time_embedding_batch_sizes 1 8 32
+"""
+import torch
+
+from benchmarks.common import (get_bench_parser,
+                               parse_bench_args,
+                               load_bench_pipeline,
+                               time_fn)
+from src.dpm_solver.dpm_solver_pytorch import (model_wrapper,
+                                               DPM_Solver)
+
+
+def main():
+    parser = get_bench_parser()
+    parser.add_argument("--bench_time_embedding_batch_sizes", type=int, nargs="+", default=[1, 8, 32],
+                        help="The UNet batch sizes, twice the glyphs under classifier-free guidance.")
+    args = parse_bench_args(parser)
+    pipe = load_bench_pipeline(args)
+    unet = pipe.model.unet
+
+    model_fn = model_wrapper(lambda x, t: x, pipe.noise_schedule)
+    dpm_solver = DPM_Solver(model_fn, pipe.noise_schedule, algorithm_type=args.algorithm_type,
+                            plan_cache=pipe.solver_plans)
+    plan = dpm_solver.get_plan(steps=args.num_inference_steps, order=args.order, skip_type=args.skip_type,
+                               method=args.method, t_T=pipe.noise_schedule.T, t_0=1. / pipe.noise_schedule.total_N,
+                               device=args.device)
+    # The model input times of the UNet calls, one per step.
+    timesteps = model_fn.get_model_input_time(plan.timesteps[:args.num_inference_steps])
+    table = unet.prepare_time_embedding_table(model_fn.get_model_input_time(plan.timesteps))
+
+    for batch_size in args.bench_time_embedding_batch_sizes:
+        def embed():
+            return [unet.embed_timesteps(t.expand(batch_size)) for t in timesteps]
+
+        def lookup():
+            return [table.lookup(t.expand(batch_size), unet.embed_timesteps, version=unet.time_embedding_version()) \
+                    for t in timesteps]
+
+        with torch.no_grad():
+            diff = max((expected - value).abs().max().item() for expected, value in zip(embed(), lookup()))
+        baseline = time_fn(embed, args.device, repeat=args.repeat, warmup=args.warmup)
+        seconds = time_fn(lookup, args.device, repeat=args.repeat, warmup=args.warmup)
+        print(f"batch {batch_size:3d}, {len(timesteps)} UNet calls   embedded {baseline * 1e6:9.1f} us"
+              f"   looked up {seconds * 1e6:9.1f} us   x{baseline / seconds:.2f}   max abs difference {diff:.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Per-NFE latency of the UNet with and without the prepared (step-invariant) context.
+
+    python -m benchmarks.unet_context --ckpt_dir ckpt/ --device cpu
+"""
+import torch
+
+from benchmarks.common import (parse_bench_args,
+                               load_bench_pipeline,
+                               load_bench_images,
+                               time_fn,
+                               report)
+
+
+def main():
+    args = parse_bench_args()
+    pipe = load_bench_pipeline(args)
+    content_images, style_images = load_bench_images(args)
+    batch_size = content_images.shape[0]
+    unet = pipe.model.unet
+
+    with torch.no_grad():
+        content_features, style_features = pipe.encode_condition(content_images, style_images)
+        encoder_hidden_states = [style_features.img_feature, content_features.residual_features,
+                                 style_features.hidden_states, style_features.content_res_features]
+        prepared_context = unet.prepare_context(encoder_hidden_states)
+
+    x_t = torch.randn((batch_size, 3, *args.content_image_size), device=args.device)
+    timesteps = torch.full((batch_size,), 500., device=args.device)
+
+    def step(prepared_context=None):
+        return unet(x_t, timesteps, encoder_hidden_states,
+                    content_encoder_downsample_size=args.content_encoder_downsample_size,
+                    prepared_context=prepared_context)[0]
+
+    with torch.no_grad():
+        max_diff = (step() - step(prepared_context)).abs().max().item()
+    print(f"max abs difference of the noise prediction: {max_diff:.3e}")
+
+    baseline = time_fn(step, args.device, repeat=args.repeat, warmup=args.warmup)
+    optimized = time_fn(lambda: step(prepared_context), args.device, repeat=args.repeat, warmup=args.warmup)
+    report("UNet step", baseline, batch_size)
+    report("UNet step, prepared context", optimized, batch_size, baseline=baseline)
+
+
+if __name__ == "__main__":
+    main()
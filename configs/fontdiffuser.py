@@ -92,6 +92,44 @@ def get_parser():
     parser.add_argument("--correcting_x0_fn", type=str, default=None, help="correcting_x0_fn of dpmsolver.")
     parser.add_argument("--t_start", type=str, default=None, help="t_start of dpmsolver.")
     parser.add_argument("--t_end", type=str, default=None, help="t_end of dpmsolver.")
+    parser.add_argument("--guidance_interval", type=float, nargs=2, default=None, metavar=("T_MIN", "T_MAX"), 
+                        help="Only apply the classifier-free guidance when the timestep (0 to 999) is in [T_MIN, T_MAX].")
+    parser.add_argument("--reuse_uncond", action="store_true", 
+                        help="Evaluate the unconditional branch of the guidance only at every other step, estimating it in between.")
+    parser.add_argument("--deep_cache_interval", type=int, default=1, 
+                        help="If > 1, the deep UNet path only runs every N UNet calls and is reused in between (DeepCache).")
+    parser.add_argument("--deep_cache_depth", type=int, default=1, 
+                        help="The number of the shallow down/up blocks which still run at every step of the DeepCache.")
+    parser.add_argument("--early_stop_tol", type=float, default=None, 
+                        help="If set, a glyph is retired from the batch once at most this fraction of its binarized x0 pixels changes per step.")
+    parser.add_argument("--early_stop_patience", type=int, default=2, 
+                        help="The number of consecutive converged steps to retire a glyph.")
+    parser.add_argument("--cpu_inference", action="store_true", 
+                        help="Tune the inference on CPU: channels_last model and the thread settings.")
+    parser.add_argument("--unet_bf16", action="store_true", 
+                        help="In the CPU inference, run the UNet under bf16 autocast while the solver stays fp32.")
+    parser.add_argument("--num_threads", type=int, default=None, 
+                        help="The intra-op threads of the CPU inference. If None, the PyTorch default is kept.")
+    parser.add_argument("--style_registry_max_memory_mb", type=int, default=256, 
+                        help="The memory budget of the cached style features, beyond which the least recently used are evicted.")
+    parser.add_argument("--style_registry_spill_dir", type=str, default=None, 
+                        help="If set, the evicted style features are spilled to this directory instead of being dropped.")
+    parser.add_argument("--onnx_dir", type=str, default=None, 
+                        help="The graphs written by export_onnx.py. If set, the sampling runs on onnxruntime instead of the torch checkpoint.")
+    parser.add_argument("--inference_ckpt_path", type=str, default=None, 
+                        help="The single-file checkpoint written by convert_checkpoint.py. If set, the model is memory-mapped from it without a copy and built from its stored config instead of the ckpt_dir and the model args. The sampling needs the fp32 file (convert_checkpoint.py --dtype fp32).")
+    parser.add_argument("--attention_backend", type=str, default=None, choices=["sdpa", "math"], 
+                        help="The attention of the UNet: the fused scaled_dot_product_attention or the explicit matmul-softmax. If None, the training runs math and the sampling runs sdpa when available.")
+    parser.add_argument("--deform_conv_backend", type=str, default=None, choices=["torchvision", "grid_sample"], 
+                        help="The deformable convs of the UNet: the torchvision kernel or its grid_sample decomposition, which is faster on CPU. If None, torchvision.")
+    parser.add_argument("--bake_spectral_norm", action="store_true", 
+                        help="Replace the spectral norm layers of the encoders by plain layers of the normalized weights at load time. The content feature stores are keyed by the baked weights, so build them with the same flag.")
+    parser.add_argument("--compile_unet", action="store_true", 
+                        help="Compile the UNet by torch.compile for the bucketed batch sizes. It is not faster than the eager UNet on every host (x0.79 on a 1-core CPU), measure it with benchmarks/compiled_unet.py first. The compiled UNet runs without the time embedding table and cannot be used with early_stop_tol.")
+    parser.add_argument("--compile_batch_sizes", type=int, nargs="+", default=[1, 2, 4, 8], 
+                        help="The batch size buckets of the compiled UNet, the batches are padded up to them.")
+    parser.add_argument("--compile_cache_dir", type=str, default=None, 
+                        help="The directory caching the compiled kernels across processes. If None, the inductor default in the temp directory is used.")
     
     parser.add_argument("--local_rank", type=int, default=-1, help="For distributed training: local_rank")
     
@@ -0,0 +1,43 @@
+"""Convert a checkpoint into the single-file inference checkpoint, memory-mapped at load time.
+
+    python convert_checkpoint.py --ckpt_dir ckpt/ --inference_ckpt_path ckpt/fontdiffuser.safetensors --dtype fp32
+
+The checkpoint is sampled by `sample.py --inference_ckpt_path ckpt/fontdiffuser.safetensors`, \
+without the model args since its config is stored in the file.
+"""
+from src import (get_inference_config,
+                 save_inference_checkpoint)
+from src.checkpoint import INFERENCE_CHECKPOINT_DTYPES
+from sample import load_fontdiffuer_model
+
+
+def arg_parse():
+    from configs.fontdiffuser import get_parser
+
+    parser = get_parser()
+    parser.add_argument("--ckpt_dir", type=str, default="ckpt")
+    parser.add_argument("--dtype", type=str, default="fp32", choices=list(INFERENCE_CHECKPOINT_DTYPES),
+                        help="The dtype of the stored weights, which are loaded in it without a copy. sample.py samples the fp32 files only, fp16/bf16 halve the file for the callers of load_inference_checkpoint running the model in that dtype.")
+    parser.add_argument("--device", type=str, default="cpu")
+    args = parser.parse_args()
+    args.style_image_size = (args.style_image_size, args.style_image_size)
+    args.content_image_size = (args.content_image_size, args.content_image_size)
+    assert args.inference_ckpt_path is not None, "The inference_ckpt_path should be set."
+
+    return args
+
+
+if __name__=="__main__":
+    args = arg_parse()
+    inference_ckpt_path = args.inference_ckpt_path
+    # Load the .pth checkpoint of ckpt_dir to convert it, with the weights of training.
+    args.inference_ckpt_path = None
+    args.onnx_dir = None
+    args.bake_spectral_norm = False
+    model, quantization_config = load_fontdiffuer_model(args=args)
+    assert quantization_config is None, "The int8 checkpoint cannot be converted, convert the fp32 one."
+    save_inference_checkpoint(model=model,
+                              path=inference_ckpt_path,
+                              config=get_inference_config(args),
+                              dtype=INFERENCE_CHECKPOINT_DTYPES[args.dtype])
+    print(f"Converted the checkpoint to {inference_ckpt_path}")
@@ -0,0 +1,40 @@
+"""Export a checkpoint to ONNX graphs for the onnxruntime backend.
+
+    python export_onnx.py --ckpt_dir ckpt/ --onnx_dir ckpt_onnx/
+
+The graphs are sampled by `sample.py --onnx_dir ckpt_onnx/ --device cpu`.
+"""
+from src import export_onnx
+from sample import load_fontdiffuer_model
+
+
+def arg_parse():
+    from configs.fontdiffuser import get_parser
+
+    parser = get_parser()
+    parser.add_argument("--ckpt_dir", type=str, default="ckpt")
+    parser.add_argument("--opset", type=int, default=17, 
+                        help="The ONNX opset, at least 16 for the GridSample of the deformable convs.")
+    parser.add_argument("--device", type=str, default="cpu")
+    args = parser.parse_args()
+    args.style_image_size = (args.style_image_size, args.style_image_size)
+    args.content_image_size = (args.content_image_size, args.content_image_size)
+    assert args.onnx_dir is not None, "The onnx_dir should be set."
+
+    return args
+
+
+if __name__=="__main__":
+    args = arg_parse()
+    onnx_dir = args.onnx_dir
+    # Load the torch checkpoint to export it.
+    args.onnx_dir = None
+    model, quantization_config = load_fontdiffuer_model(args=args)
+    assert quantization_config is None, "The int8 checkpoint cannot be exported, export the fp32 one."
+    export_onnx(model=model,
+                onnx_dir=onnx_dir,
+                content_image_size=args.content_image_size,
+                style_image_size=args.style_image_size,
+                content_encoder_downsample_size=args.content_encoder_downsample_size,
+                opset=args.opset)
+    print(f"Exported the ONNX graphs to {onnx_dir}")
@@ -0,0 +1,39 @@
+"""Precompute the content features of every character of a charset for a ttf and a checkpoint.
+
+    python precompute_content_features.py --ckpt_dir ckpt/ --ttf_path ttf/KaiXinSongA.ttf \
+        --charset big5_4808.txt --content_feature_store_dir content_features/
+"""
+import time
+
+from src import ContentFeatureStore
+from sample import (arg_parse,
+                    charset_process,
+                    load_fontdiffuer_pipeline)
+from utils import (get_font_chars,
+                   read_charset)
+
+
+if __name__=="__main__":
+    args = arg_parse()
+    assert args.charset is not None, "The charset should not be None."
+    assert args.content_feature_store_dir is not None, "The content_feature_store_dir should not be None."
+
+    pipe = load_fontdiffuer_pipeline(args=args)
+
+    font_chars = get_font_chars(font_path=args.ttf_path)
+    chars = [char for char in dict.fromkeys(read_charset(args.charset)) if ord(char) in font_chars]
+    key = ContentFeatureStore.get_key(content_encoder=pipe.model.content_encoder,
+                                      ttf_path=args.ttf_path,
+                                      content_image_size=args.content_image_size)
+
+    print(f"Encoding {len(chars)} characters into the content feature store {key} ......")
+    start = time.time()
+    store = ContentFeatureStore.build(root_dir=args.content_feature_store_dir,
+                                      key=key,
+                                      model=pipe.model,
+                                      content_images=charset_process(args=args, chars=chars),
+                                      codepoints=[ord(char) for char in chars],
+                                      image_shape=(3, *args.content_image_size),
+                                      batch_size=max(args.batch_size, 32))
+    end = time.time()
+    print(f"Saved {len(store)} characters to {store.store_dir}, costing time {end - start}s")
@@ -0,0 +1,86 @@
+"""Quantize the UNet of a checkpoint to int8 for the CPU inference, calibrated on sample glyphs.
+
+    python quantize.py --ckpt_dir ckpt/ --quantized_ckpt_dir ckpt_int8/ \
+        --style_image_path data_examples/sampling/example_style.jpg --charset big5_4808.txt
+
+The quantized checkpoint is loaded by `load_fontdiffuer_pipeline` with --ckpt_dir ckpt_int8/.
+"""
+import os
+import shutil
+
+import torch
+
+from src import (quantize_unet,
+                 save_quantization_config)
+from sample import (charset_process,
+                    style_process,
+                    set_seed,
+                    load_fontdiffuer_pipeline)
+from utils import (get_font_chars,
+                   read_charset)
+
+
+def arg_parse():
+    from configs.fontdiffuser import get_parser
+
+    parser = get_parser()
+    parser.add_argument("--ckpt_dir", type=str, default="ckpt")
+    parser.add_argument("--quantized_ckpt_dir", type=str, default="ckpt_int8")
+    parser.add_argument("--style_image_path", type=str, default="data_examples/sampling/example_style.jpg")
+    parser.add_argument("--ttf_path", type=str, default="ttf/KaiXinSongA.ttf")
+    parser.add_argument("--charset", type=str, default="big5_4808.txt")
+    parser.add_argument("--num_calibration_glyphs", type=int, default=16, 
+                        help="The number of glyphs sampled to observe the activation ranges of the convs.")
+    parser.add_argument("--batch_size", type=int, default=4)
+    parser.add_argument("--dynamic_only", action="store_true", 
+                        help="Only quantize the Linear layers dynamically and keep all the convs fp32.")
+    parser.add_argument("--device", type=str, default="cpu")
+    args = parser.parse_args()
+    args.style_image_size = (args.style_image_size, args.style_image_size)
+    args.content_image_size = (args.content_image_size, args.content_image_size)
+
+    return args
+
+
+if __name__=="__main__":
+    args = arg_parse()
+    assert torch.device(args.device).type == "cpu", "The int8 model only runs on cpu."
+    set_seed(seed=args.seed)
+    pipe = load_fontdiffuer_pipeline(args=args)
+
+    # Calibrate on glyphs spread over the charset, sampled by the full DPM-Solver loop so
+    # the activations of every timestep are observed.
+    font_chars = get_font_chars(font_path=args.ttf_path)
+    chars = [char for char in read_charset(args.charset) if ord(char) in font_chars]
+    chars = chars[::max(1, len(chars) // args.num_calibration_glyphs)][:args.num_calibration_glyphs]
+    style_handle = pipe.register_style(style_process(args=args))
+
+    def calibrate_fn():
+        for _ in pipe.generate_many(
+            content_images=charset_process(args=args, chars=chars),
+            style_images=style_handle,
+            batch_size=args.batch_size,
+            order=args.order,
+            num_inference_step=args.num_inference_steps,
+            content_encoder_downsample_size=args.content_encoder_downsample_size,
+            dm_size=args.content_image_size,
+            algorithm_type=args.algorithm_type,
+            skip_type=args.skip_type,
+            method=args.method,
+            guidance_interval=args.guidance_interval,
+            reuse_uncond=args.reuse_uncond,
+            deep_cache_interval=args.deep_cache_interval,
+            deep_cache_depth=args.deep_cache_depth,
+            early_stop_tol=args.early_stop_tol,
+            early_stop_patience=args.early_stop_patience):
+            pass
+
+    print(f"Calibrating the int8 UNet on {len(chars)} glyphs ......")
+    quantize_unet(pipe.model.unet, calibrate_fn=calibrate_fn, static_conv=not args.dynamic_only)
+
+    os.makedirs(args.quantized_ckpt_dir, exist_ok=True)
+    torch.save(pipe.model.unet.state_dict(), f"{args.quantized_ckpt_dir}/unet.pth")
+    for name in ["style_encoder.pth", "content_encoder.pth"]:
+        shutil.copy(f"{args.ckpt_dir}/{name}", f"{args.quantized_ckpt_dir}/{name}")
+    save_quantization_config(ckpt_dir=args.quantized_ckpt_dir, static_conv=not args.dynamic_only)
+    print(f"Saved the int8 checkpoint to {args.quantized_ckpt_dir}")
@@ -1,28 +1,46 @@
 import os
-import cv2
+import copy
+import glob
+import json
+import hashlib
 import time
 import random
+import itertools
 import numpy as np
 from PIL import Image
 
 import torch
 import torchvision.transforms as transforms
-from accelerate.utils import set_seed
 
 from src import (FontDiffuserDPMPipeline,
                  FontDiffuserModelDPM,
+                 ContentFeatureStore,
+                 StyleHandle,
                  build_ddpm_scheduler,
                  build_unet,
                  build_content_encoder,
-                 build_style_encoder)
+                 build_style_encoder,
+                 glyph_seed)
 from utils import (ttf2im,
                    load_ttf,
                    is_char_in_font,
+                   get_font_chars,
+                   read_charset,
+                   read_manifest,
+                   write_manifest,
                    save_args_to_yaml,
+                   save_images_atomic,
                    save_single_image,
                    save_image_with_content_style)
 
 
+def set_seed(seed):
+    # The seeding of accelerate.utils.set_seed, without importing accelerate at startup.
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
 def arg_parse():
     from configs.fontdiffuser import get_parser
 
@@ -40,6 +58,23 @@ def arg_parse():
                         help="The saving directory.")
     parser.add_argument("--device", type=str, default="cuda:0")
     parser.add_argument("--ttf_path", type=str, default="ttf/KaiXinSongA.ttf")
+    parser.add_argument("--charset", type=str, default=None,
+                        help="The charset file (e.g. big5_4808.txt). If set, every character in it is \
+                            generated and saved as {codepoint}.png in save_image_dir.")
+    parser.add_argument("--batch_size", type=int, default=1, 
+                        help="The number of characters sampled in one batch in the charset mode.")
+    parser.add_argument("--num_workers", type=int, default=1, 
+                        help="The number of CPU processes sharing the model in the charset mode.")
+    parser.add_argument("--num_threads_per_worker", type=int, default=None, 
+                        help="The intra-op threads of every worker. If None, the cores are divided among the workers.")
+    parser.add_argument("--content_feature_store_dir", type=str, default=None,
+                        help="The directory of the content feature stores built by precompute_content_features.py. \
+                            If set, the charset mode reads the content features from the store of the ttf and \
+                            the checkpoint instead of rendering and encoding the characters.")
+    parser.add_argument("--save_image_mode", type=str, default="RGB", choices=["RGB", "L", "1"],
+                        help="The PNG mode of the charset mode: RGB, 8-bit grayscale (L) or 1-bit (1).")
+    parser.add_argument("--png_compress_level", type=int, default=6,
+                        help="The zlib level of the PNGs of the charset mode, 1 is the fastest.")
     args = parser.parse_args()
     style_image_size = args.style_image_size
     content_image_size = args.content_image_size
@@ -91,20 +126,76 @@ def image_process(args, content_image=None, style_image=None):
 
     return content_image, style_image, content_image_pil
 
+def load_fontdiffuer_model(args):
+    if args.onnx_dir is not None:
+        # The graphs exported by export_onnx.py, run by onnxruntime on cpu.
+        from src import OnnxFontDiffuserModel
+
+        assert torch.device(args.device).type == "cpu", "The onnxruntime backend only runs on cpu."
+        model = OnnxFontDiffuserModel(onnx_dir=args.onnx_dir, num_threads=args.num_threads)
+        print(f"Loaded the onnxruntime model from {args.onnx_dir} successfully!")
+        return model, None
+
+    if args.inference_ckpt_path is not None:
+        # The single-file checkpoint written by convert_checkpoint.py, whose stored config
+        # replaces the model args so the rest of the sampling matches the checkpoint. The sampling
+        # runs the fp32 weights (the bf16 UNet by autocast), so it only loads the fp32 files.
+        from src import load_inference_checkpoint
+
+        model, config = load_inference_checkpoint(path=args.inference_ckpt_path,
+                                                  device=args.device,
+                                                  dtype=torch.float32,
+                                                  attention_backend=args.attention_backend,
+                                                  deform_conv_backend=args.deform_conv_backend)
+        vars(args).update(config)
+        quantization_config = None
+        print(f"Loaded the inference checkpoint {args.inference_ckpt_path} successfully!")
+    else:
+        # Load the model state_dict
+        from src import load_quantization_config
+
+        unet = build_unet(args=args)
+        quantization_config = load_quantization_config(ckpt_dir=args.ckpt_dir)
+        if quantization_config is not None:
+            # The int8 checkpoint saved by quantize.py, build the same int8 structure before loading.
+            from src import quantize_unet
+
+            quantize_unet(unet, **quantization_config)
+            print(f"Loading the int8 UNet quantized by {quantization_config}")
+        incompatible_keys = unet.load_state_dict(torch.load(f"{args.ckpt_dir}/unet.pth"), strict=True)
+        assert len(incompatible_keys.missing_keys) == 0 and len(incompatible_keys.unexpected_keys) == 0, \
+            f"The UNet checkpoint does not match the model: {incompatible_keys}"
+        style_encoder = build_style_encoder(args=args)
+        style_encoder.load_state_dict(torch.load(f"{args.ckpt_dir}/style_encoder.pth"))
+        content_encoder = build_content_encoder(args=args)
+        content_encoder.load_state_dict(torch.load(f"{args.ckpt_dir}/content_encoder.pth"))
+        model = FontDiffuserModelDPM(
+            unet=unet,
+            style_encoder=style_encoder,
+            content_encoder=content_encoder)
+        # The encoders of the cached features run in eval mode, since in train mode their spectral
+        # norm layers update the u/sv buffers at every forward.
+        model.eval()
+        model.to(args.device)
+        print("Loaded the model state_dict successfully!")
+    if args.attention_backend is None:
+        from src.modules.attention import SDPA_AVAILABLE
+
+        # The sampling runs the fused attention, which never materializes the score matrices
+        # of the large self-attentions, while the modules keep the math attention of the training.
+        if SDPA_AVAILABLE:
+            model.unet.set_attention_backend("sdpa")
+    if args.bake_spectral_norm:
+        from src import bake_spectral_norm
+
+        bake_spectral_norm(model.style_encoder)
+        bake_spectral_norm(model.content_encoder)
+
+    return model, quantization_config
+
+
 def load_fontdiffuer_pipeline(args):
-    # Load the model state_dict
-    unet = build_unet(args=args)
-    unet.load_state_dict(torch.load(f"{args.ckpt_dir}/unet.pth"))
-    style_encoder = build_style_encoder(args=args)
-    style_encoder.load_state_dict(torch.load(f"{args.ckpt_dir}/style_encoder.pth"))
-    content_encoder = build_content_encoder(args=args)
-    content_encoder.load_state_dict(torch.load(f"{args.ckpt_dir}/content_encoder.pth"))
-    model = FontDiffuserModelDPM(
-        unet=unet,
-        style_encoder=style_encoder,
-        content_encoder=content_encoder)
-    model.to(args.device)
-    print("Loaded the model state_dict successfully!")
+    model, quantization_config = load_fontdiffuer_model(args=args)
 
     # Load the training ddpm_scheduler.
     train_scheduler = build_ddpm_scheduler(args=args)
@@ -117,9 +208,34 @@ def load_fontdiffuer_pipeline(args):
         model_type=args.model_type,
         guidance_type=args.guidance_type,
         guidance_scale=args.guidance_scale,
+        style_registry_max_memory_bytes=args.style_registry_max_memory_mb * 2**20,
+        style_registry_spill_dir=args.style_registry_spill_dir,
     )
     print("Loaded dpm_solver pipeline sucessfully!")
 
+    if args.cpu_inference:
+        pipe.enable_cpu_inference(
+            channels_last=quantization_config is None and args.onnx_dir is None,
+            unet_autocast_dtype=torch.bfloat16 if args.unet_bf16 else None,
+            num_threads=args.num_threads)
+        print(f"Enabled the CPU inference with {torch.get_num_threads()} threads, bf16 UNet: {args.unet_bf16}")
+
+    if args.onnx_dir is not None:
+        assert args.deep_cache_interval == 1, "The UNet exported to onnx has no DeepCache path."
+
+    if args.compile_unet:
+        assert args.onnx_dir is None, "The onnxruntime backend cannot be compiled by torch.compile."
+        assert args.early_stop_tol is None, "The early termination cannot be used with the compiled UNet."
+        pipe.enable_compile(batch_sizes=args.compile_batch_sizes, cache_dir=args.compile_cache_dir)
+        # Only the buckets up to the sampling batch size are used.
+        batch_size = getattr(args, "batch_size", 1)
+        start = time.time()
+        pipe.warmup_compile(
+            content_encoder_downsample_size=args.content_encoder_downsample_size,
+            dm_size=args.content_image_size,
+            batch_sizes=[size for size in pipe.compile_batch_sizes if size <= pipe._padded_batch_size(batch_size)])
+        print(f"Compiled the UNet for the batch sizes {pipe.compile_batch_sizes} in {time.time() - start:.1f}s")
+
     return pipe
 
 
@@ -140,6 +256,11 @@ def sampling(args, pipe, content_image=None, style_image=None):
                 Please change the content_character or you can change the ttf.")
         return None
 
+    # The glyph gets the same noise as in a batch of `sampling_charset`.
+    seeds = None
+    if args.character_input and args.seed:
+        seeds = [glyph_seed(seed=args.seed, codepoint=ord(args.content_character))]
+
     with torch.no_grad():
         content_image = content_image.to(args.device)
         style_image = style_image.to(args.device)
@@ -149,6 +270,7 @@ def sampling(args, pipe, content_image=None, style_image=None):
             content_images=content_image,
             style_images=style_image,
             batch_size=1,
+            seeds=seeds,
             order=args.order,
             num_inference_step=args.num_inference_steps,
             content_encoder_downsample_size=args.content_encoder_downsample_size,
@@ -158,7 +280,13 @@ def sampling(args, pipe, content_image=None, style_image=None):
             algorithm_type=args.algorithm_type,
             skip_type=args.skip_type,
             method=args.method,
-            correcting_x0_fn=args.correcting_x0_fn)
+            correcting_x0_fn=args.correcting_x0_fn,
+            guidance_interval=args.guidance_interval,
+            reuse_uncond=args.reuse_uncond,
+            deep_cache_interval=args.deep_cache_interval,
+            deep_cache_depth=args.deep_cache_depth,
+            early_stop_tol=args.early_stop_tol,
+            early_stop_patience=args.early_stop_patience)
         end = time.time()
 
         if args.save_image:
@@ -182,6 +310,276 @@ def sampling(args, pipe, content_image=None, style_image=None):
         return images[0]
 
 
+def charset_process(args, chars):
+    """Render the content image of every character lazily for `pipe.generate_many`.
+    """
+    font = load_ttf(ttf_path=args.ttf_path)
+    content_inference_transforms = transforms.Compose(
+        [transforms.Resize(args.content_image_size, \
+                            interpolation=transforms.InterpolationMode.BILINEAR),
+            transforms.ToTensor(),
+            transforms.Normalize([0.5], [0.5])])
+    for char in chars:
+        content_image = ttf2im(font=font, char=char)
+        yield content_inference_transforms(content_image)
+
+
+def load_content_feature_store(args, pipe):
+    """Return the content feature store of the ttf and the content encoder of `pipe`, \
+        or None if it has not been built.
+    """
+    if args.onnx_dir is not None:
+        print("The content feature store is keyed by the torch content encoder, \
+                the characters are rendered and encoded by onnxruntime instead.")
+        return None
+    key = ContentFeatureStore.get_key(content_encoder=pipe.model.content_encoder,
+                                      ttf_path=args.ttf_path,
+                                      content_image_size=args.content_image_size)
+    store = ContentFeatureStore.open(root_dir=args.content_feature_store_dir, key=key)
+    if store is None:
+        print(f"No content feature store {key} in {args.content_feature_store_dir}, \
+                the characters are rendered and encoded instead.")
+    return store
+
+
+def style_process(args, style_image=None):
+    if style_image is None:
+        style_image = Image.open(args.style_image_path).convert('RGB')
+    style_inference_transforms = transforms.Compose(
+        [transforms.Resize(args.style_image_size, \
+                           interpolation=transforms.InterpolationMode.BILINEAR),
+         transforms.ToTensor(),
+         transforms.Normalize([0.5], [0.5])])
+    return style_inference_transforms(style_image)[None, :]
+
+
+# The args which change the generated glyphs. The seed is not part of the job, it is stored in
+# the manifest instead, so a resumed job keeps the seed it was started with.
+CHARSET_JOB_ARGS = ["ttf_path", "ckpt_dir", "inference_ckpt_path", "onnx_dir", "resolution", "unet_channels",
+                    "style_image_size", "content_image_size", "content_encoder_downsample_size", "channel_attn",
+                    "content_start_channel", "style_start_channel", "beta_scheduler", "model_type",
+                    "algorithm_type", "guidance_type", "guidance_scale", "num_inference_steps", "order",
+                    "skip_type", "method", "correcting_x0_fn", "t_start", "t_end", "guidance_interval",
+                    "reuse_uncond", "deep_cache_interval", "deep_cache_depth", "early_stop_tol",
+                    "early_stop_patience", "cpu_inference", "unet_bf16", "attention_backend",
+                    "deform_conv_backend", "bake_spectral_norm", "compile_unet", "content_feature_store_dir",
+                    "save_image_mode"]
+
+
+def get_checkpoint_files(args):
+    if args.onnx_dir is not None:
+        return sorted(glob.glob(f"{args.onnx_dir}/*"))
+    if args.inference_ckpt_path is not None:
+        return [args.inference_ckpt_path]
+    return sorted(glob.glob(f"{args.ckpt_dir}/*.pth") + glob.glob(f"{args.ckpt_dir}/*.json"))
+
+
+def get_charset_job(args, style_handle):
+    """Return the fingerprint of a charset job, only the job of the same style image, settings \
+        and checkpoint files is resumed.
+    """
+    settings = {name: getattr(args, name, None) for name in CHARSET_JOB_ARGS}
+    # A checkpoint replaced at the same path changes the size or the modification time of its files.
+    settings["checkpoint_files"] = [(path, os.path.getsize(path), os.path.getmtime(path)) \
+                                    for path in get_checkpoint_files(args)]
+    settings = json.dumps(settings, sort_keys=True, default=str)
+    return {"style": style_handle.key,
+            "settings": hashlib.sha256(settings.encode()).hexdigest()}
+
+
+def read_charset_manifests(args, job):
+    """Return the finished codepoints of the job whose images exist and the seed of the job (None if \
+        it has not been started), from manifest.json and the manifest_{rank}.json of the workers \
+        of `sampling_charset_parallel`.
+    """
+    finished_codepoints = set()
+    seed = None
+    for manifest_path in glob.glob(f"{args.save_image_dir}/manifest*.json"):
+        codepoints, manifest_seed = read_manifest(manifest_path=manifest_path, job=job)
+        finished_codepoints |= codepoints
+        seed = manifest_seed if seed is None else seed
+    finished_codepoints = {codepoint for codepoint in finished_codepoints \
+                           if os.path.exists(f"{args.save_image_dir}/{codepoint}.png")}
+    return finished_codepoints, seed
+
+
+def iter_sampling_charset(args, pipe, chars, style_image=None, manifest_path=None):
+    """Generate the glyphs of `chars` and yield the [(char, image_path)] of every batch as soon as it finishes.
+
+    The finished codepoints are recorded atomically in `manifest_path` ({save_image_dir}/manifest.json \
+        by default) after every batch, so a job interrupted with the same style image and settings \
+        resumes from where it stopped, and the glyphs already generated are yielded first as one batch. \
+        `style_image` can be a PIL image or the StyleHandle registered in `pipe`.
+    """
+    os.makedirs(args.save_image_dir, exist_ok=True)
+    if not args.demo:
+        # saving sampling config
+        save_args_to_yaml(args=args, output_file=f"{args.save_image_dir}/sampling_config.yaml")
+
+    if args.seed:
+        set_seed(seed=args.seed)
+
+    font_chars = get_font_chars(font_path=args.ttf_path)
+    missing_chars = [char for char in chars if ord(char) not in font_chars]
+    if len(missing_chars) > 0:
+        print(f"Skip {len(missing_chars)} characters which are not in the ttf: {''.join(missing_chars)}")
+    chars = [char for char in dict.fromkeys(chars) if ord(char) in font_chars]
+
+    if isinstance(style_image, StyleHandle):
+        style_handle = style_image
+    else:
+        style_handle = pipe.register_style(style_process(args=args, style_image=style_image))
+
+    job = get_charset_job(args=args, style_handle=style_handle)
+    if manifest_path is None:
+        manifest_path = f"{args.save_image_dir}/manifest.json"
+    finished_codepoints, seed = read_charset_manifests(args=args, job=job)
+    if seed is None:
+        seed = args.seed
+    finished_chars = [char for char in chars if ord(char) in finished_codepoints]
+    chars = [char for char in chars if ord(char) not in finished_codepoints]
+    if len(finished_chars) > 0:
+        print(f"Resume the job with its seed {seed}, {len(finished_chars)} characters have been generated.")
+        yield [(char, f"{args.save_image_dir}/{ord(char)}.png") for char in finished_chars]
+
+    content_images = charset_process(args=args, chars=chars)
+    if args.content_feature_store_dir is not None:
+        if pipe.content_feature_store is None:
+            pipe.content_feature_store = load_content_feature_store(args=args, pipe=pipe)
+        if pipe.content_feature_store is not None:
+            if all(char in pipe.content_feature_store for char in chars):
+                content_images = chars
+            else:
+                print(f"Not all the characters are in the content feature store, \
+                        the characters are rendered and encoded instead.")
+
+    print(f"Sampling {len(chars)} characters by DPM-Solver++ with batch size {args.batch_size} ......")
+    start = time.time()
+    # Every glyph draws its noise from its own seed, so it does not depend on the batching or the sharding.
+    seeds = [glyph_seed(seed=seed, codepoint=ord(char)) for char in chars] if seed else None
+    images = pipe.generate_many(
+        content_images=content_images,
+        style_images=style_handle,
+        batch_size=args.batch_size,
+        seeds=seeds,
+        order=args.order,
+        num_inference_step=args.num_inference_steps,
+        content_encoder_downsample_size=args.content_encoder_downsample_size,
+        t_start=args.t_start,
+        t_end=args.t_end,
+        dm_size=args.content_image_size,
+        algorithm_type=args.algorithm_type,
+        skip_type=args.skip_type,
+        method=args.method,
+        correcting_x0_fn=args.correcting_x0_fn,
+        guidance_interval=args.guidance_interval,
+        reuse_uncond=args.reuse_uncond,
+        deep_cache_interval=args.deep_cache_interval,
+        deep_cache_depth=args.deep_cache_depth,
+        early_stop_tol=args.early_stop_tol,
+        early_stop_patience=args.early_stop_patience,
+        output_type="np",
+        grayscale=args.save_image_mode != "RGB")
+    for batch_start in range(0, len(chars), args.batch_size):
+        batch_chars = chars[batch_start:batch_start + args.batch_size]
+        # Not yielding inside no_grad, so the grad mode of the caller is left untouched.
+        with torch.no_grad():
+            batch_images = list(itertools.islice(images, len(batch_chars)))
+
+        batch = [(char, f"{args.save_image_dir}/{ord(char)}.png") for char in batch_chars]
+        save_images_atomic(images=batch_images, save_paths=[image_path for _, image_path in batch],
+                           mode=args.save_image_mode, compress_level=args.png_compress_level)
+        finished_codepoints.update(ord(char) for char in batch_chars)
+        write_manifest(manifest_path=manifest_path, job=job, codepoints=finished_codepoints, seed=seed)
+
+        num_done = batch_start + len(batch_chars)
+        cost = time.time() - start
+        remaining = cost / num_done * (len(chars) - num_done)
+        print(f"[{num_done}/{len(chars)}] {num_done / cost:.2f} characters/s, remaining time {remaining:.0f}s")
+        yield batch
+    print(f"Finish the sampling process, costing time {time.time() - start}s")
+
+
+def sampling_charset(args, pipe, chars, style_image=None):
+    image_paths = []
+    for batch in iter_sampling_charset(args=args, pipe=pipe, chars=chars, style_image=style_image):
+        image_paths.extend(image_path for _, image_path in batch)
+
+    return image_paths
+
+
+def _sampling_charset_worker(args, pipe, chars, style_handle, rank, num_threads):
+    # Pin the intra-op threads, so the workers together do not oversubscribe the cores.
+    torch.set_num_threads(num_threads)
+    manifest_path = f"{args.save_image_dir}/manifest_{rank}.json"
+    for _ in iter_sampling_charset(args=args, pipe=pipe, chars=chars, style_image=style_handle, 
+                                   manifest_path=manifest_path):
+        pass
+
+
+def sampling_charset_parallel(args, pipe, chars, style_image=None):
+    """Shard the charset across `args.num_workers` CPU processes and generate into one save_image_dir.
+
+    The weights and the registered style features are moved to the shared memory, so the \
+        workers share them instead of copying them. The workers are spawned rather than forked, \
+        since forking after the OpenMP threads of the parent have started (by loading the checkpoint \
+        or encoding the style) can hang the workers with libgomp. Every worker records its own \
+        manifest_{rank}.json, which are merged into manifest.json at the end.
+    """
+    assert torch.device(args.device).type == "cpu", "The parallel sampling only supports the cpu device."
+    assert args.onnx_dir is None, "The onnxruntime sessions cannot be shared by the workers."
+    assert pipe.compile_batch_sizes is None, "The UNet compiled by torch.compile cannot be sent to the workers."
+    os.makedirs(args.save_image_dir, exist_ok=True)
+    if not args.demo:
+        # saving sampling config
+        save_args_to_yaml(args=args, output_file=f"{args.save_image_dir}/sampling_config.yaml")
+    # The sampling config has been saved, the workers do not save it again.
+    worker_args = copy.copy(args)
+    worker_args.demo = True
+
+    pipe.model.share_memory()
+    style_handle = pipe.register_style(style_process(args=args, style_image=style_image))
+    job = get_charset_job(args=args, style_handle=style_handle)
+    font_chars = get_font_chars(font_path=args.ttf_path)
+    missing_chars = [char for char in chars if ord(char) not in font_chars]
+    if len(missing_chars) > 0:
+        print(f"Skip {len(missing_chars)} characters which are not in the ttf: {''.join(missing_chars)}")
+    finished_codepoints, seed = read_charset_manifests(args=args, job=job)
+    # The workers generate with the seed of the job if it is resumed.
+    if seed is not None:
+        worker_args.seed = seed
+    chars = [char for char in dict.fromkeys(chars) \
+             if ord(char) in font_chars and ord(char) not in finished_codepoints]
+
+    num_workers = max(1, min(args.num_workers, len(chars)))
+    num_threads = args.num_threads_per_worker
+    if num_threads is None:
+        num_threads = max(1, torch.get_num_threads() // num_workers)
+    print(f"Sampling {len(chars)} characters by {num_workers} workers with {num_threads} threads each ......")
+    start = time.time()
+    context = torch.multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_sampling_charset_worker, 
+                               args=(worker_args, pipe, chars[rank::num_workers], style_handle, rank, num_threads)) \
+               for rank in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    # Merge the manifests of the workers, which are kept if a worker failed so the job can be resumed.
+    finished_codepoints, _ = read_charset_manifests(args=args, job=job)
+    write_manifest(manifest_path=f"{args.save_image_dir}/manifest.json", job=job, codepoints=finished_codepoints,
+                   seed=worker_args.seed)
+    failed_ranks = [rank for rank, worker in enumerate(workers) if worker.exitcode != 0]
+    if len(failed_ranks) > 0:
+        raise RuntimeError(f"The sampling workers {failed_ranks} failed, run again to resume the job.")
+    for manifest_path in glob.glob(f"{args.save_image_dir}/manifest_*.json"):
+        os.remove(manifest_path)
+    print(f"Finish the sampling process, costing time {time.time() - start}s")
+
+    return [f"{args.save_image_dir}/{codepoint}.png" for codepoint in sorted(finished_codepoints)]
+
+
 def load_controlnet_pipeline(args,
                              config_path="lllyasviel/sd-controlnet-canny", 
                              ckpt_path="runwayml/stable-diffusion-v1-5"):
@@ -207,6 +605,8 @@ def load_controlnet_pipeline(args,
 def controlnet(text_prompt, 
                pil_image,
                pipe):
+    import cv2
+
     image = np.array(pil_image)
     # get canny image
     image = cv2.Canny(image=image, threshold1=100, threshold2=200)
@@ -249,4 +649,9 @@ if __name__=="__main__":
     
     # load fontdiffuser pipeline
     pipe = load_fontdiffuer_pipeline(args=args)
-    out_image = sampling(args=args, pipe=pipe)
+    if args.charset is not None and args.num_workers > 1:
+        image_paths = sampling_charset_parallel(args=args, pipe=pipe, chars=read_charset(args.charset))
+    elif args.charset is not None:
+        image_paths = sampling_charset(args=args, pipe=pipe, chars=read_charset(args.charset))
+    else:
+        out_image = sampling(args=args, pipe=pipe)
@@ -0,0 +1,3 @@
+python export_onnx.py \
+    --ckpt_dir="ckpt/" \
+    --onnx_dir="ckpt_onnx/"
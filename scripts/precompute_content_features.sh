@@ -0,0 +1,6 @@
+python precompute_content_features.py \
+    --ckpt_dir="ckpt/" \
+    --ttf_path="ttf/KaiXinSongA.ttf" \
+    --charset="big5_4808.txt" \
+    --content_feature_store_dir="content_features/" \
+    --device="cuda:0"
@@ -0,0 +1,7 @@
+python quantize.py \
+    --ckpt_dir="ckpt/" \
+    --quantized_ckpt_dir="ckpt_int8/" \
+    --style_image_path="data_examples/sampling/example_style.jpg" \
+    --ttf_path="ttf/KaiXinSongA.ttf" \
+    --charset="big5_4808.txt" \
+    --num_calibration_glyphs=16
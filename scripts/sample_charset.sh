@@ -0,0 +1,12 @@
+python sample.py \
+    --ckpt_dir="ckpt/" \
+    --style_image_path="data_examples/sampling/example_style.jpg" \
+    --charset="big5_4808.txt" \
+    --batch_size=8 \
+    --save_image_dir="generated_images/" \
+    --device="cuda:0" \
+    --algorithm_type="dpmsolver++" \
+    --guidance_type="classifier-free" \
+    --guidance_scale=7.5 \
+    --num_inference_steps=20 \
+    --method="multistep"
@@ -1,13 +1,50 @@
-from .model import (FontDiffuserModel,
-                   FontDiffuserModelDPM)
-from .criterion import ContentPerceptualLoss
-from .dpm_solver.pipeline_dpm_solver import FontDiffuserDPMPipeline
-from .modules import (ContentEncoder,
-                     StyleEncoder, 
-                     UNet,
-                     SCR)
-from .build import (build_unet, 
-                   build_ddpm_scheduler, 
-                   build_style_encoder, 
-                   build_content_encoder,
-                   build_scr)
\ No newline at end of file
+import importlib
+
+# The public names and their submodules, which are only imported on the first access, so the
+# inference path does not import the training (SCR: kornia, info_nce) and optional modules.
+_LAZY_ATTRS = {
+    "FontDiffuserModel": ".model",
+    "FontDiffuserModelDPM": ".model",
+    "ContentFeatures": ".model",
+    "StyleFeatures": ".model",
+    "DeepCache": ".model",
+    "ContentPerceptualLoss": ".criterion",
+    "FontDiffuserDPMPipeline": ".dpm_solver.pipeline_dpm_solver",
+    "glyph_seed": ".dpm_solver.pipeline_dpm_solver",
+    "ContentFeatureStore": ".content_feature_store",
+    "StyleHandle": ".style_registry",
+    "StyleRegistry": ".style_registry",
+    "ContentEncoder": ".modules",
+    "StyleEncoder": ".modules",
+    "UNet": ".modules",
+    "SCR": ".modules",
+    "bake_spectral_norm": ".modules.spectral_norm",
+    "build_unet": ".build",
+    "build_ddpm_scheduler": ".build",
+    "build_style_encoder": ".build",
+    "build_content_encoder": ".build",
+    "build_scr": ".build",
+    "get_inference_config": ".checkpoint",
+    "save_inference_checkpoint": ".checkpoint",
+    "load_inference_config": ".checkpoint",
+    "load_inference_checkpoint": ".checkpoint",
+    "quantize_unet": ".quantization",
+    "save_quantization_config": ".quantization",
+    "load_quantization_config": ".quantization",
+    "export_onnx": ".onnx_backend",
+    "OnnxFontDiffuserModel": ".onnx_backend",
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,8 +1,7 @@
 from diffusers.schedulers.scheduling_ddpm import DDPMScheduler
 from src import (ContentEncoder, 
                  StyleEncoder, 
-                 UNet,
-                 SCR)
+                 UNet)
 
 
 def build_unet(args):
@@ -33,6 +32,10 @@ def build_unet(args):
         content_encoder_downsample_size=args.content_encoder_downsample_size,
         content_start_channel=args.content_start_channel,
         reduction=32)
+    if args.attention_backend is not None:
+        unet.set_attention_backend(args.attention_backend)
+    if args.deform_conv_backend is not None:
+        unet.set_deform_conv_backend(args.deform_conv_backend)
     
     return unet
 
@@ -54,6 +57,8 @@ def build_content_encoder(args):
 
 
 def build_scr(args):
+    from src import SCR
+
     scr = SCR(
         temperature=args.temperature,
         mode=args.mode,
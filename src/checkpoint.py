@@ -0,0 +1,85 @@
+import json
+from argparse import Namespace
+
+import torch
+
+from .model import FontDiffuserModelDPM
+from .build import (build_unet,
+                    build_style_encoder,
+                    build_content_encoder)
+
+INFERENCE_CHECKPOINT_FORMAT = "fontdiffuser-inference-1"
+# The args of build_unet, build_style_encoder, build_content_encoder and build_ddpm_scheduler
+# which define the model, stored in the inference checkpoint.
+INFERENCE_CONFIG_KEYS = ["resolution", "unet_channels", "channel_attn", "style_start_channel", "content_start_channel",
+                         "content_encoder_downsample_size", "style_image_size", "content_image_size", "beta_scheduler"]
+INFERENCE_CHECKPOINT_DTYPES = {"fp32": torch.float32, "fp16": torch.float16, "bf16": torch.bfloat16}
+
+
+def get_inference_config(args):
+    """The model config of `args` stored in the inference checkpoint.
+    """
+    return {key: list(value) if isinstance(value, tuple) else value \
+            for key, value in ((key, getattr(args, key)) for key in INFERENCE_CONFIG_KEYS)}
+
+
+@torch.no_grad()
+def save_inference_checkpoint(model, path, config, dtype=None):
+    """Save the unet, style_encoder and content_encoder weights of the FontDiffuserModelDPM `model` \
+        and its `config` (see `get_inference_config`) into the single safetensors file `path`.
+
+    The floating point tensors are stored in `dtype` if it is set (e.g. torch.float16 to halve \
+        the file), otherwise in their own dtype.
+    """
+    from safetensors.torch import save_file
+
+    tensors = {}
+    for name in ["unet", "style_encoder", "content_encoder"]:
+        for key, tensor in getattr(model, name).state_dict().items():
+            if dtype is not None and tensor.is_floating_point():
+                tensor = tensor.to(dtype)
+            # safetensors refuses the tensors sharing their storage.
+            tensors[f"{name}.{key}"] = tensor.detach().cpu().clone().contiguous()
+    save_file(tensors, path, metadata={"format": INFERENCE_CHECKPOINT_FORMAT, "config": json.dumps(config)})
+
+
+def load_inference_config(path):
+    from safetensors import safe_open
+
+    with safe_open(path, framework="pt") as f:
+        metadata = f.metadata()
+    assert metadata is not None and metadata.get("format") == INFERENCE_CHECKPOINT_FORMAT, \
+        f"{path} is not an inference checkpoint of save_inference_checkpoint."
+    return {key: tuple(value) if isinstance(value, list) else value \
+            for key, value in json.loads(metadata["config"]).items()}
+
+
+def load_inference_checkpoint(path, device="cpu", dtype=None, attention_backend=None,
+                              deform_conv_backend=None):
+    """Return the (FontDiffuserModelDPM, config) of the inference checkpoint `path` in eval mode.
+
+    The model is built from the stored config on the meta device, and the tensors of the \
+        memory-mapped file are assigned to it in their stored dtype, so they are never copied \
+        (unless moved to another `device`) and are only read from the disk when they are used. \
+        If `dtype` is set, a file whose floating point tensors are stored in another dtype is \
+        refused instead of cast, since the cast would copy every tensor.
+    """
+    from safetensors.torch import load_file
+
+    config = load_inference_config(path)
+    args = Namespace(attention_backend=attention_backend, deform_conv_backend=deform_conv_backend, **config)
+    with torch.device("meta"):
+        model = FontDiffuserModelDPM(
+            unet=build_unet(args=args),
+            style_encoder=build_style_encoder(args=args),
+            content_encoder=build_content_encoder(args=args))
+    state_dict = load_file(path)
+    if dtype is not None:
+        stored_dtypes = {tensor.dtype for tensor in state_dict.values() if tensor.is_floating_point()}
+        if stored_dtypes - {dtype}:
+            raise ValueError(f"The weights of {path} are stored in {sorted(map(str, stored_dtypes))}, not {dtype}, "
+                             f"convert the checkpoint with the dtype it is sampled in.")
+    model.load_state_dict(state_dict, assign=True)
+    model.eval()
+    model.to(device)
+    return model, config
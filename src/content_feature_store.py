@@ -0,0 +1,126 @@
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+import torch
+
+from .model import (ContentFeatures,
+                    state_dict_fingerprint)
+
+
+class ContentFeatureStore():
+    """Memory-mapped fp16 content encoder features of a charset, indexed by codepoint.
+
+    For a fixed content ttf and content encoder the features of a character never change, \
+        so they are computed once by `build` and read from the disk afterwards. Every feature \
+        level is one [N, C, H, W] `.npy` file whose rows are in the order of the codepoints.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(f"{store_dir}/meta.json", "r") as f:
+            meta = json.load(f)
+        self.key = meta["key"]
+        self.image_shape = tuple(meta["image_shape"])
+        self.codepoint_to_index = {codepoint: index for index, codepoint in enumerate(meta["codepoints"])}
+        # The copy-on-write mapping is writable for torch.from_numpy but never touches the file,
+        # and only the rows which are read are paged in.
+        self.levels = [torch.from_numpy(np.load(f"{store_dir}/level_{i}.npy", mmap_mode="c")) \
+                       for i in range(meta["num_levels"])]
+
+    def __reduce__(self):
+        # A store sent to another process maps the same files again, instead of copying the features.
+        return (self.__class__, (self.store_dir,))
+
+    def __len__(self):
+        return len(self.codepoint_to_index)
+
+    def __contains__(self, char):
+        return ord(char) in self.codepoint_to_index
+
+    @staticmethod
+    def get_key(content_encoder, ttf_path, content_image_size):
+        """Hash of the content encoder weights, the ttf file and the content image size.
+        """
+        sha = hashlib.sha256()
+        sha.update(state_dict_fingerprint([content_encoder]).encode())
+        with open(ttf_path, "rb") as f:
+            sha.update(f.read())
+        sha.update(str(tuple(content_image_size)).encode())
+        return sha.hexdigest()[:16]
+
+    @classmethod
+    def open(cls, root_dir, key):
+        """Return the store of `key` under `root_dir`, or None if it has not been built.
+        """
+        store_dir = f"{root_dir}/{key}"
+        if not os.path.exists(f"{store_dir}/meta.json"):
+            return None
+        return cls(store_dir)
+
+    @classmethod
+    @torch.no_grad()
+    def build(cls, root_dir, key, model, content_images, codepoints, image_shape, batch_size=32):
+        """Encode the content images of `codepoints` by the content encoder of the \
+            FontDiffuserModelDPM `model` and write them to the store of `key`.
+
+        `content_images` is an iterable of [C, H, W] tensors in the order of `codepoints`.
+        """
+        store_dir = f"{root_dir}/{key}"
+        tmp_dir = f"{store_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        levels = None
+        num_rows = len(codepoints)
+
+        def write(index, features):
+            nonlocal levels
+            if levels is None:
+                levels = [np.lib.format.open_memmap(f"{tmp_dir}/level_{i}.npy", mode="w+", dtype=np.float16,
+                                                    shape=(num_rows, *feature.shape[1:])) \
+                          for i, feature in enumerate(features.residual_features)]
+            for level, feature in zip(levels, features.residual_features):
+                level[index:index + feature.shape[0]] = feature.cpu().numpy()
+
+        index = 0
+        batch = []
+        for content_image in content_images:
+            batch.append(content_image)
+            if len(batch) == batch_size:
+                write(index, model.encode_content(torch.stack(batch).to(model.device)))
+                index += len(batch)
+                batch = []
+        if len(batch) > 0:
+            write(index, model.encode_content(torch.stack(batch).to(model.device)))
+            index += len(batch)
+        assert index == len(codepoints), "The number of content images should be the same as codepoints."
+
+        for level in levels:
+            level.flush()
+        with open(f"{tmp_dir}/meta.json", "w") as f:
+            json.dump({"key": key,
+                       "image_shape": list(image_shape),
+                       "num_levels": len(levels),
+                       "codepoints": list(codepoints)}, f)
+        del levels
+        shutil.rmtree(store_dir, ignore_errors=True)
+        os.replace(tmp_dir, store_dir)
+
+        return cls(store_dir)
+
+    def _get_rows(self, indices, device, dtype):
+        if indices == list(range(indices[0], indices[0] + len(indices))):
+            # Consecutive rows, e.g. a batch of a charset in the store order, are sliced without a gather.
+            rows = [level[indices[0]:indices[0] + len(indices)] for level in self.levels]
+        else:
+            index = torch.tensor(indices)
+            rows = [level.index_select(0, index) for level in self.levels]
+        return ContentFeatures(residual_features=[row.to(device=device, dtype=dtype) for row in rows])
+
+    def get(self, chars, device="cpu", dtype=torch.float32):
+        """Return the ContentFeatures of `chars`, which should all be in the store.
+        """
+        return self._get_rows([self.codepoint_to_index[ord(char)] for char in chars], device, dtype)
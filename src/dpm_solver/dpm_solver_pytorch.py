@@ -28,6 +28,10 @@ class NoiseScheduleVP:
             sigma_t = self.marginal_std(t)
             lambda_t = self.marginal_lambda(t)
 
+        or all of them (and alpha_t) at once by
+
+            log_alpha_t, alpha_t, sigma_t, lambda_t = self.marginal(t)
+
         Moreover, as lambda(t) is an invertible function, we also support its inverse function:
 
             t = self.inverse_lambda(lambda_t)
@@ -43,6 +47,9 @@ class NoiseScheduleVP:
             e.g. for N = 1000, we have t_0 = 1e-3 and T = t_{N-1} = 1.
             We solve the corresponding diffusion ODE from time T = 1 to time t_0 = 1e-3.
 
+            log(alpha_t) is looked up by `lookup_fn` in the (t_i, log(alpha_{t_i})) table, whose copies on every
+            device and the slopes of its segments are kept in `self.lookup_tables`.
+
             Args:
                 betas: A `torch.Tensor`. The beta array for the discrete-time DPM. (See the original DDPM paper for details)
                 alphas_cumprod: A `torch.Tensor`. The cumprod alphas for the discrete-time DPM. (See the original DDPM paper for details)
@@ -107,6 +114,8 @@ class NoiseScheduleVP:
             self.T = 1.
             self.t_array = torch.linspace(0., 1., self.total_N + 1)[1:].reshape((1, -1)).to(dtype=dtype)
             self.log_alpha_array = log_alphas.reshape((1, -1,)).to(dtype=dtype)
+            # (device, dtype) -> the lookup tables of log_alpha_t and of its inverse.
+            self.lookup_tables = {}
         else:
             self.total_N = 1000
             self.beta_0 = continuous_beta_0
@@ -123,12 +132,29 @@ class NoiseScheduleVP:
             else:
                 self.T = 1.
 
+    def get_lookup_tables(self, device, dtype):
+        """
+        Return the (t -> log_alpha_t) and the (log_alpha_t -> t) tables of the discrete schedule on `device`,
+        each as (xp, yp, slopes) with ascending xp.
+        """
+        key = (device, dtype)
+        if key not in self.lookup_tables:
+            t_array = self.t_array.reshape((-1,)).to(device=device, dtype=dtype)
+            log_alpha_array = self.log_alpha_array.reshape((-1,)).to(device=device, dtype=dtype)
+            tables = []
+            # log_alpha_t decreases with t, so its inverse is looked up in the flipped table.
+            for xp, yp in [(t_array, log_alpha_array), (torch.flip(log_alpha_array, [0]), torch.flip(t_array, [0]))]:
+                slopes = (yp[1:] - yp[:-1]) / (xp[1:] - xp[:-1])
+                tables.append((xp.contiguous(), yp.contiguous(), slopes))
+            self.lookup_tables[key] = tables
+        return self.lookup_tables[key]
+
     def marginal_log_mean_coeff(self, t):
         """
         Compute log(alpha_t) of a given continuous-time label t in [0, T].
         """
         if self.schedule == 'discrete':
-            return interpolate_fn(t.reshape((-1, 1)), self.t_array.to(t.device), self.log_alpha_array.to(t.device)).reshape((-1))
+            return lookup_fn(t.reshape((-1,)), *self.get_lookup_tables(t.device, t.dtype)[0])
         elif self.schedule == 'linear':
             return -0.25 * t ** 2 * (self.beta_1 - self.beta_0) - 0.5 * t * self.beta_0
         elif self.schedule == 'cosine':
@@ -156,6 +182,16 @@ class NoiseScheduleVP:
         log_std = 0.5 * torch.log(1. - torch.exp(2. * log_mean_coeff))
         return log_mean_coeff - log_std
 
+    def marginal(self, t):
+        """
+        Compute (log(alpha_t), alpha_t, sigma_t, lambda_t) of a given continuous-time label t in [0, T] by a single
+        lookup of log(alpha_t), instead of one lookup in each of the marginal functions above.
+        """
+        log_mean_coeff = self.marginal_log_mean_coeff(t)
+        one_minus_alpha_sq = 1. - torch.exp(2. * log_mean_coeff)
+        return (log_mean_coeff, torch.exp(log_mean_coeff), torch.sqrt(one_minus_alpha_sq),
+                log_mean_coeff - 0.5 * torch.log(one_minus_alpha_sq))
+
     def inverse_lambda(self, lamb):
         """
         Compute the continuous-time label t in [0, T] of a given half-logSNR lambda_t.
@@ -165,9 +201,8 @@ class NoiseScheduleVP:
             Delta = self.beta_0**2 + tmp
             return tmp / (torch.sqrt(Delta) + self.beta_0) / (self.beta_1 - self.beta_0)
         elif self.schedule == 'discrete':
-            log_alpha = -0.5 * torch.logaddexp(torch.zeros((1,)).to(lamb.device), -2. * lamb)
-            t = interpolate_fn(log_alpha.reshape((-1, 1)), torch.flip(self.log_alpha_array.to(lamb.device), [1]), torch.flip(self.t_array.to(lamb.device), [1]))
-            return t.reshape((-1,))
+            log_alpha = -0.5 * torch.logaddexp(torch.zeros_like(lamb), -2. * lamb)
+            return lookup_fn(log_alpha.reshape((-1,)), *self.get_lookup_tables(lamb.device, lamb.dtype)[1])
         else:
             log_alpha = -0.5 * torch.logaddexp(-2. * lamb, torch.zeros((1,)).to(lamb))
             t_fn = lambda log_alpha_t: torch.arccos(torch.exp(log_alpha_t + self.cosine_log_alpha_0)) * 2. * (1. + self.cosine_s) / math.pi - self.cosine_s
@@ -186,6 +221,8 @@ def model_wrapper(
     guidance_scale=1.,
     classifier_fn=None,
     classifier_kwargs={},
+    guidance_interval=None,
+    reuse_uncond=False,
 ):
     """Create a wrapper function for the noise prediction model.
 
@@ -272,6 +309,13 @@ def model_wrapper(
         guidance_scale: A `float`. The scale for the guided sampling.
         classifier_fn: A classifier function. Only used for the classifier guidance.
         classifier_kwargs: A `dict`. A dict for the other inputs of the classifier function.
+        guidance_interval: A `tuple` (t_min, t_max) of the model input time (i.e. 0 to 999 for discrete-time DPMs).
+                    If set, the classifier-free guidance is only applied when t_min <= t_input <= t_max, and
+                    the conditional model alone is evaluated at the other steps, which halves their batch.
+        reuse_uncond: A `bool`. If True, the unconditional output of the classifier-free guidance is only
+                    evaluated at every other guided step. In between, it is estimated from the conditional output
+                    and the (conditional - unconditional) difference of the previous step, which changes more
+                    slowly over the steps than the unconditional output itself.
     Returns:
         A noise prediction model that accepts the noised data and the continuous time as the inputs.
     """
@@ -296,10 +340,10 @@ def model_wrapper(
         if model_type == "noise":
             return output
         elif model_type == "x_start":
-            alpha_t, sigma_t = noise_schedule.marginal_alpha(t_continuous), noise_schedule.marginal_std(t_continuous)
+            _, alpha_t, sigma_t, _ = noise_schedule.marginal(t_continuous)
             return (x - alpha_t * output) / sigma_t
         elif model_type == "v":
-            alpha_t, sigma_t = noise_schedule.marginal_alpha(t_continuous), noise_schedule.marginal_std(t_continuous)
+            _, alpha_t, sigma_t, _ = noise_schedule.marginal(t_continuous)
             return alpha_t * output + sigma_t * x
         elif model_type == "score":
             sigma_t = noise_schedule.marginal_std(t_continuous)
@@ -314,6 +358,20 @@ def model_wrapper(
             log_prob = classifier_fn(x_in, t_input, condition, **classifier_kwargs)
             return torch.autograd.grad(log_prob.sum(), x_in)[0]
 
+    guided_condition = {}
+    # The number of guided steps and the last (conditional - unconditional) output, for `reuse_uncond`.
+    guided_state = {"num_guided_steps": 0, "guidance_delta": None}
+
+    def in_guidance_interval(t_continuous):
+        if guidance_interval is None:
+            return True
+        t_input = get_model_input_time(t_continuous).reshape(-1)[0].item()
+        return guidance_interval[0] <= t_input <= guidance_interval[1]
+
+    def reusing_uncond():
+        return reuse_uncond and guided_state["guidance_delta"] is not None \
+            and guided_state["num_guided_steps"] % 2 == 1
+
     def model_fn(x, t_continuous):
         """
         The noise predicition model function that is used for DPM-Solver.
@@ -330,21 +388,50 @@ def model_wrapper(
         elif guidance_type == "classifier-free":
             if guidance_scale == 1. or unconditional_condition is None:
                 return noise_pred_fn(x, t_continuous, cond=condition)
+            elif not in_guidance_interval(t_continuous):
+                return noise_pred_fn(x, t_continuous, cond=condition)
             elif model_kwargs["version"] == "V1" or model_kwargs["version"] == "V2_ConStyle" or model_kwargs["version"] == "V3":  # add this
-                x_in = torch.cat([x] * 2)
-                t_in = torch.cat([t_continuous] * 2)
-                c_in = []
-                c_in.append(torch.cat([unconditional_condition[0], condition[0]], dim=0))
-                c_in.append(torch.cat([unconditional_condition[1], condition[1]], dim=0))
-                noise_uncond, noise = noise_pred_fn(x_in, t_in, cond=c_in).chunk(2)
+                if reusing_uncond():
+                    noise = noise_pred_fn(x, t_continuous, cond=condition)
+                    noise_uncond = noise - guided_state["guidance_delta"]
+                else:
+                    x_in = torch.cat([x] * 2)
+                    t_in = torch.cat([t_continuous] * 2)
+                    # The condition is the same for every step, so only concat it once.
+                    if "c_in" not in guided_condition:
+                        c_in = []
+                        c_in.append(cat_condition([unconditional_condition[0], condition[0]]))
+                        c_in.append(cat_condition([unconditional_condition[1], condition[1]]))
+                        guided_condition["c_in"] = c_in
+                    c_in = guided_condition["c_in"]
+                    noise_uncond, noise = noise_pred_fn(x_in, t_in, cond=c_in).chunk(2)
+                    guided_state["guidance_delta"] = noise - noise_uncond
+                guided_state["num_guided_steps"] += 1
                 return noise_uncond + guidance_scale * (noise - noise_uncond)
             elif model_kwargs["version"] == "FG_Sep":
-                x_in = torch.cat([x] * 3)
-                t_in = torch.cat([t_continuous] * 3)
-                c_in = []
-                c_in.append(torch.cat([unconditional_condition[0], unconditional_condition[0], condition[0]], dim=0))
-                c_in.append(torch.cat([unconditional_condition[1], condition[1], unconditional_condition[1]], dim=0))
-                noise_uncond, noise_cond_style, noise_cond_content = noise_pred_fn(x_in, t_in, cond=c_in).chunk(3)
+                if reusing_uncond():
+                    x_in = torch.cat([x] * 2)
+                    t_in = torch.cat([t_continuous] * 2)
+                    if "c_in_cond" not in guided_condition:
+                        c_in = []
+                        c_in.append(cat_condition([unconditional_condition[0], condition[0]]))
+                        c_in.append(cat_condition([condition[1], unconditional_condition[1]]))
+                        guided_condition["c_in_cond"] = c_in
+                    c_in = guided_condition["c_in_cond"]
+                    noise_cond_style, noise_cond_content = noise_pred_fn(x_in, t_in, cond=c_in).chunk(2)
+                    noise_uncond = (noise_cond_style + noise_cond_content) / 2 - guided_state["guidance_delta"]
+                else:
+                    x_in = torch.cat([x] * 3)
+                    t_in = torch.cat([t_continuous] * 3)
+                    if "c_in" not in guided_condition:
+                        c_in = []
+                        c_in.append(cat_condition([unconditional_condition[0], unconditional_condition[0], condition[0]]))
+                        c_in.append(cat_condition([unconditional_condition[1], condition[1], unconditional_condition[1]]))
+                        guided_condition["c_in"] = c_in
+                    c_in = guided_condition["c_in"]
+                    noise_uncond, noise_cond_style, noise_cond_content = noise_pred_fn(x_in, t_in, cond=c_in).chunk(3)
+                    guided_state["guidance_delta"] = (noise_cond_style + noise_cond_content) / 2 - noise_uncond
+                guided_state["num_guided_steps"] += 1
 
                 style_guidance_scale = guidance_scale[0]
                 content_guidance_scale = guidance_scale[1]
@@ -356,6 +443,22 @@ def model_wrapper(
                 noise_uncond, noise = noise_pred_fn(x_in, t_in, cond=c_in).chunk(2)
                 return noise_uncond + guidance_scale * (noise - noise_uncond)
 
+    def select_batch(indices):
+        """
+        Keep only the `indices` rows of the batch-dependent inputs, when the converged samples are retired.
+        """
+        nonlocal condition, unconditional_condition
+        if condition is not None:
+            condition = select_condition(condition, indices)
+        if unconditional_condition is not None:
+            unconditional_condition = select_condition(unconditional_condition, indices)
+        guided_condition.clear()
+        if guided_state["guidance_delta"] is not None:
+            guided_state["guidance_delta"] = guided_state["guidance_delta"].index_select(0, indices)
+
+    model_fn.select_batch = select_batch
+    model_fn.get_model_input_time = get_model_input_time
+
     assert model_type in ["noise", "x_start", "v"]
     assert guidance_type in ["uncond", "classifier", "classifier-free"]
     return model_fn
@@ -371,6 +474,8 @@ class DPM_Solver:
         correcting_xt_fn=None,
         thresholding_max_val=1.,
         dynamic_thresholding_ratio=0.995,
+        select_batch_fn=None,
+        plan_cache=None,
     ):
         """Construct a DPM-Solver. 
 
@@ -423,12 +528,19 @@ class DPM_Solver:
                 Valid only when use `dpmsolver++` and `correcting_x0_fn="dynamic_thresholding"`.
             dynamic_thresholding_ratio: A `float`. The ratio for dynamic thresholding (see Imagen[1] for details).
                 Valid only when use `dpmsolver++` and `correcting_x0_fn="dynamic_thresholding"`.
+            select_batch_fn: A function `select_batch_fn(indices)` which keeps only the `indices` rows of the
+                batch-dependent inputs of `model_fn` (e.g. `model_fn.select_batch` of `model_wrapper`), called
+                when the converged samples are retired by the early termination of `sample`.
+            plan_cache: A `dict` keeping the `SolverPlan`s built by `sample`, which can be shared by the DPM-Solvers
+                of the same noise schedule so that the repeated sampling configurations are planned only once.
 
         [1] Chitwan Saharia, William Chan, Saurabh Saxena, Lala Li, Jay Whang, Emily Denton, Seyed Kamyar Seyed Ghasemipour,
             Burcu Karagol Ayan, S Sara Mahdavi, Rapha Gontijo Lopes, et al. Photorealistic text-to-image diffusion models
             with deep language understanding. arXiv preprint arXiv:2205.11487, 2022b.
         """
         self.model = lambda x, t: model_fn(x, t.expand((x.shape[0])))
+        self.select_batch_fn = select_batch_fn
+        self.plan_cache = {} if plan_cache is None else plan_cache
         self.noise_schedule = noise_schedule
         assert algorithm_type in ["dpmsolver", "dpmsolver++"]
         self.algorithm_type = algorithm_type
@@ -457,23 +569,24 @@ class DPM_Solver:
         """
         return self.model(x, t)
 
-    def data_prediction_fn(self, x, t):
+    def data_prediction_fn(self, x, t, alpha_t=None, sigma_t=None):
         """
-        Return the data prediction model (with corrector).
+        Return the data prediction model (with corrector). `alpha_t` and `sigma_t` can be precomputed by a `SolverPlan`.
         """
         noise = self.noise_prediction_fn(x, t)
-        alpha_t, sigma_t = self.noise_schedule.marginal_alpha(t), self.noise_schedule.marginal_std(t)
+        if alpha_t is None:
+            _, alpha_t, sigma_t, _ = self.noise_schedule.marginal(t)
         x0 = (x - sigma_t * noise) / alpha_t
         if self.correcting_x0_fn is not None:
             x0 = self.correcting_x0_fn(x0)
         return x0
 
-    def model_fn(self, x, t):
+    def model_fn(self, x, t, alpha_t=None, sigma_t=None):
         """
         Convert the model to the noise prediction model or the data prediction model. 
         """
         if self.algorithm_type == "dpmsolver++":
-            return self.data_prediction_fn(x, t)
+            return self.data_prediction_fn(x, t, alpha_t=alpha_t, sigma_t=sigma_t)
         else:
             return self.noise_prediction_fn(x, t)
 
@@ -565,6 +678,18 @@ class DPM_Solver:
             timesteps_outer = self.get_time_steps(skip_type, t_T, t_0, steps, device)[torch.cumsum(torch.tensor([0,] + orders), 0).to(device)]
         return timesteps_outer, orders
 
+    def get_plan(self, steps, order, skip_type, method, t_T, t_0, lower_order_final=True, solver_type='dpmsolver',
+                 device=None, dtype=torch.float32):
+        """
+        Return the `SolverPlan` of the sampling configuration, built at the first call and read from `self.plan_cache` afterwards.
+        """
+        key = (id(self.noise_schedule), self.algorithm_type, steps, order, skip_type, method, float(t_T), float(t_0),
+               lower_order_final, solver_type, torch.device(device), dtype)
+        if key not in self.plan_cache:
+            self.plan_cache[key] = SolverPlan(self, steps=steps, order=order, skip_type=skip_type, method=method,
+                t_T=t_T, t_0=t_0, lower_order_final=lower_order_final, solver_type=solver_type, device=device, dtype=dtype)
+        return self.plan_cache[key]
+
     def denoise_to_zero_fn(self, x, s):
         """
         Denoise at the final step, which is equivalent to solve the ODE from lambda_s to infty by first-order discretization. 
@@ -587,11 +712,9 @@ class DPM_Solver:
         """
         ns = self.noise_schedule
         dims = x.dim()
-        lambda_s, lambda_t = ns.marginal_lambda(s), ns.marginal_lambda(t)
+        log_alpha_s, _, sigma_s, lambda_s = ns.marginal(s)
+        log_alpha_t, alpha_t, sigma_t, lambda_t = ns.marginal(t)
         h = lambda_t - lambda_s
-        log_alpha_s, log_alpha_t = ns.marginal_log_mean_coeff(s), ns.marginal_log_mean_coeff(t)
-        sigma_s, sigma_t = ns.marginal_std(s), ns.marginal_std(t)
-        alpha_t = torch.exp(log_alpha_t)
 
         if self.algorithm_type == "dpmsolver++":
             phi_1 = torch.expm1(-h)
@@ -640,13 +763,12 @@ class DPM_Solver:
         if r1 is None:
             r1 = 0.5
         ns = self.noise_schedule
-        lambda_s, lambda_t = ns.marginal_lambda(s), ns.marginal_lambda(t)
+        log_alpha_s, _, sigma_s, lambda_s = ns.marginal(s)
+        log_alpha_t, alpha_t, sigma_t, lambda_t = ns.marginal(t)
         h = lambda_t - lambda_s
         lambda_s1 = lambda_s + r1 * h
         s1 = ns.inverse_lambda(lambda_s1)
-        log_alpha_s, log_alpha_s1, log_alpha_t = ns.marginal_log_mean_coeff(s), ns.marginal_log_mean_coeff(s1), ns.marginal_log_mean_coeff(t)
-        sigma_s, sigma_s1, sigma_t = ns.marginal_std(s), ns.marginal_std(s1), ns.marginal_std(t)
-        alpha_s1, alpha_t = torch.exp(log_alpha_s1), torch.exp(log_alpha_t)
+        log_alpha_s1, alpha_s1, sigma_s1, _ = ns.marginal(s1)
 
         if self.algorithm_type == "dpmsolver++":
             phi_11 = torch.expm1(-r1 * h)
@@ -726,15 +848,15 @@ class DPM_Solver:
         if r2 is None:
             r2 = 2. / 3.
         ns = self.noise_schedule
-        lambda_s, lambda_t = ns.marginal_lambda(s), ns.marginal_lambda(t)
+        log_alpha_s, _, sigma_s, lambda_s = ns.marginal(s)
+        log_alpha_t, alpha_t, sigma_t, lambda_t = ns.marginal(t)
         h = lambda_t - lambda_s
         lambda_s1 = lambda_s + r1 * h
         lambda_s2 = lambda_s + r2 * h
         s1 = ns.inverse_lambda(lambda_s1)
         s2 = ns.inverse_lambda(lambda_s2)
-        log_alpha_s, log_alpha_s1, log_alpha_s2, log_alpha_t = ns.marginal_log_mean_coeff(s), ns.marginal_log_mean_coeff(s1), ns.marginal_log_mean_coeff(s2), ns.marginal_log_mean_coeff(t)
-        sigma_s, sigma_s1, sigma_s2, sigma_t = ns.marginal_std(s), ns.marginal_std(s1), ns.marginal_std(s2), ns.marginal_std(t)
-        alpha_s1, alpha_s2, alpha_t = torch.exp(log_alpha_s1), torch.exp(log_alpha_s2), torch.exp(log_alpha_t)
+        log_alpha_s1, alpha_s1, sigma_s1, _ = ns.marginal(s1)
+        log_alpha_s2, alpha_s2, sigma_s2, _ = ns.marginal(s2)
 
         if self.algorithm_type == "dpmsolver++":
             phi_11 = torch.expm1(-r1 * h)
@@ -839,10 +961,9 @@ class DPM_Solver:
         ns = self.noise_schedule
         model_prev_1, model_prev_0 = model_prev_list[-2], model_prev_list[-1]
         t_prev_1, t_prev_0 = t_prev_list[-2], t_prev_list[-1]
-        lambda_prev_1, lambda_prev_0, lambda_t = ns.marginal_lambda(t_prev_1), ns.marginal_lambda(t_prev_0), ns.marginal_lambda(t)
-        log_alpha_prev_0, log_alpha_t = ns.marginal_log_mean_coeff(t_prev_0), ns.marginal_log_mean_coeff(t)
-        sigma_prev_0, sigma_t = ns.marginal_std(t_prev_0), ns.marginal_std(t)
-        alpha_t = torch.exp(log_alpha_t)
+        lambda_prev_1 = ns.marginal_lambda(t_prev_1)
+        log_alpha_prev_0, _, sigma_prev_0, lambda_prev_0 = ns.marginal(t_prev_0)
+        log_alpha_t, alpha_t, sigma_t, lambda_t = ns.marginal(t)
 
         h_0 = lambda_prev_0 - lambda_prev_1
         h = lambda_t - lambda_prev_0
@@ -895,10 +1016,9 @@ class DPM_Solver:
         ns = self.noise_schedule
         model_prev_2, model_prev_1, model_prev_0 = model_prev_list
         t_prev_2, t_prev_1, t_prev_0 = t_prev_list
-        lambda_prev_2, lambda_prev_1, lambda_prev_0, lambda_t = ns.marginal_lambda(t_prev_2), ns.marginal_lambda(t_prev_1), ns.marginal_lambda(t_prev_0), ns.marginal_lambda(t)
-        log_alpha_prev_0, log_alpha_t = ns.marginal_log_mean_coeff(t_prev_0), ns.marginal_log_mean_coeff(t)
-        sigma_prev_0, sigma_t = ns.marginal_std(t_prev_0), ns.marginal_std(t)
-        alpha_t = torch.exp(log_alpha_t)
+        lambda_prev_2, lambda_prev_1 = ns.marginal_lambda(t_prev_2), ns.marginal_lambda(t_prev_1)
+        log_alpha_prev_0, _, sigma_prev_0, lambda_prev_0 = ns.marginal(t_prev_0)
+        log_alpha_t, alpha_t, sigma_t, lambda_t = ns.marginal(t)
 
         h_1 = lambda_prev_1 - lambda_prev_2
         h_0 = lambda_prev_0 - lambda_prev_1
@@ -1046,7 +1166,7 @@ class DPM_Solver:
         Returns:
             xt with shape `(t_size, batch_size, *shape)`.
         """
-        alpha_t, sigma_t = self.noise_schedule.marginal_alpha(t), self.noise_schedule.marginal_std(t)
+        _, alpha_t, sigma_t, _ = self.noise_schedule.marginal(t)
         if noise is None:
             noise = torch.randn((t.shape[0], *x.shape), device=x.device)
         x = x.reshape((-1, *x.shape))
@@ -1073,7 +1193,7 @@ class DPM_Solver:
 
     def sample(self, x, steps=20, t_start=None, t_end=None, order=2, skip_type='time_uniform',
         method='multistep', lower_order_final=True, denoise_to_zero=False, solver_type='dpmsolver',
-        atol=0.0078, rtol=0.05, return_intermediate=False,
+        atol=0.0078, rtol=0.05, return_intermediate=False, early_stop_tol=None, early_stop_patience=2,
     ):
         """
         Compute the sample at time `t_end` by DPM-Solver, given the initial `x` at time `t_start`.
@@ -1179,6 +1299,12 @@ class DPM_Solver:
             rtol: A `float`. The relative tolerance of the adaptive step size solver. Valid when `method` == 'adaptive'.
             return_intermediate: A `bool`. Whether to save the xt at each step.
                 When set to `True`, method returns a tuple (x0, intermediates); when set to False, method returns only x0.
+            early_stop_tol: A `float` or None. If set, a sample is retired from the batch once its data prediction x0,
+                binarized at 0, has changed in at most `early_stop_tol` of its pixels for `early_stop_patience`
+                consecutive steps, and its x0 is returned. The later steps run on the remaining samples only.
+                Only valid for `method=multistep` and `algorithm_type="dpmsolver++"`. The batch-dependent inputs
+                of the model are narrowed by `select_batch_fn`.
+            early_stop_patience: A `int`. The number of consecutive converged steps to retire a sample.
         Returns:
             x_end: A pytorch tensor. The approximated solution at time `t_end`.
 
@@ -1190,6 +1316,14 @@ class DPM_Solver:
             assert method in ['multistep', 'singlestep', 'singlestep_fixed'], "Cannot use adaptive solver when saving intermediate values"
         if self.correcting_xt_fn is not None:
             assert method in ['multistep', 'singlestep', 'singlestep_fixed'], "Cannot use adaptive solver when correcting_xt_fn is not None"
+        if early_stop_tol is not None:
+            assert method == 'multistep' and self.algorithm_type == "dpmsolver++", "Early termination needs the multistep DPM-Solver++"
+            assert not return_intermediate, "Cannot save intermediate values with early termination"
+            # The outputs of all the samples, and the rows of them which are still in `x`.
+            x_out = torch.empty_like(x)
+            active = torch.arange(x.shape[0], device=x.device)
+            x0_binary_prev = None
+            num_stable_steps = torch.zeros(x.shape[0], dtype=torch.long, device=x.device)
         device = x.device
         intermediates = []
         with torch.no_grad():
@@ -1197,13 +1331,13 @@ class DPM_Solver:
                 x = self.dpm_solver_adaptive(x, order=order, t_T=t_T, t_0=t_0, atol=atol, rtol=rtol, solver_type=solver_type)
             elif method == 'multistep':
                 assert steps >= order
-                timesteps = self.get_time_steps(skip_type=skip_type, t_T=t_T, t_0=t_0, N=steps, device=device)
-                assert timesteps.shape[0] - 1 == steps
+                plan = self.get_plan(steps=steps, order=order, skip_type=skip_type, method=method, t_T=t_T, t_0=t_0,
+                    lower_order_final=lower_order_final, solver_type=solver_type, device=device, dtype=x.dtype)
+                timesteps = plan.timesteps
                 # Init the initial values.
                 step = 0
                 t = timesteps[step]
-                t_prev_list = [t]
-                model_prev_list = [self.model_fn(x, t)]
+                model_prev_list = [self.model_fn(x, t, plan.alphas[step], plan.sigmas[step])]
                 if self.correcting_xt_fn is not None:
                     x = self.correcting_xt_fn(x, t, step)
                 if return_intermediate:
@@ -1211,48 +1345,51 @@ class DPM_Solver:
                 # Init the first `order` values by lower order multistep DPM-Solver.
                 for step in range(1, order):
                     t = timesteps[step]
-                    x = self.multistep_dpm_solver_update(x, model_prev_list, t_prev_list, t, step, solver_type=solver_type)
+                    x = plan.multistep_update(x, model_prev_list, step)
                     if self.correcting_xt_fn is not None:
                         x = self.correcting_xt_fn(x, t, step)
                     if return_intermediate:
                         intermediates.append(x)
-                    t_prev_list.append(t)
-                    model_prev_list.append(self.model_fn(x, t))
+                    model_prev_list.append(self.model_fn(x, t, plan.alphas[step], plan.sigmas[step]))
                 # Compute the remaining values by `order`-th order multistep DPM-Solver.
                 for step in range(order, steps + 1):
                     t = timesteps[step]
-                    # We only use lower order for steps < 10
-                    if lower_order_final and steps < 10:
-                        step_order = min(order, steps + 1 - step)
-                    else:
-                        step_order = order
-                    x = self.multistep_dpm_solver_update(x, model_prev_list, t_prev_list, t, step_order, solver_type=solver_type)
+                    x = plan.multistep_update(x, model_prev_list, step)
                     if self.correcting_xt_fn is not None:
                         x = self.correcting_xt_fn(x, t, step)
                     if return_intermediate:
                         intermediates.append(x)
                     for i in range(order - 1):
-                        t_prev_list[i] = t_prev_list[i + 1]
                         model_prev_list[i] = model_prev_list[i + 1]
-                    t_prev_list[-1] = t
                     # We do not need to evaluate the final model value.
                     if step < steps:
-                        model_prev_list[-1] = self.model_fn(x, t)
+                        model_prev_list[-1] = self.model_fn(x, t, plan.alphas[step], plan.sigmas[step])
+                    if early_stop_tol is not None and step < steps:
+                        x0_binary = model_prev_list[-1] > 0
+                        if x0_binary_prev is not None:
+                            changed = (x0_binary != x0_binary_prev).flatten(1).float().mean(1)
+                            num_stable_steps = torch.where(changed <= early_stop_tol, num_stable_steps + 1, 0)
+                        x0_binary_prev = x0_binary
+                        converged = num_stable_steps >= early_stop_patience
+                        if converged.any():
+                            # The converged samples return their x0, the others go on in a smaller batch.
+                            x_out[active[converged]] = model_prev_list[-1][converged]
+                            keep = (~converged).nonzero().squeeze(1)
+                            active = active[keep]
+                            if active.shape[0] == 0:
+                                break
+                            x = x.index_select(0, keep)
+                            model_prev_list = [model_prev.index_select(0, keep) for model_prev in model_prev_list]
+                            x0_binary_prev = x0_binary_prev.index_select(0, keep)
+                            num_stable_steps = num_stable_steps.index_select(0, keep)
+                            if self.select_batch_fn is not None:
+                                self.select_batch_fn(keep)
             elif method in ['singlestep', 'singlestep_fixed']:
-                if method == 'singlestep':
-                    timesteps_outer, orders = self.get_orders_and_timesteps_for_singlestep_solver(steps=steps, order=order, skip_type=skip_type, t_T=t_T, t_0=t_0, device=device)
-                elif method == 'singlestep_fixed':
-                    K = steps // order
-                    orders = [order,] * K
-                    timesteps_outer = self.get_time_steps(skip_type=skip_type, t_T=t_T, t_0=t_0, N=K, device=device)
-                for step, order in enumerate(orders):
-                    s, t = timesteps_outer[step], timesteps_outer[step + 1]
-                    timesteps_inner = self.get_time_steps(skip_type=skip_type, t_T=s.item(), t_0=t.item(), N=order, device=device)
-                    lambda_inner = self.noise_schedule.marginal_lambda(timesteps_inner)
-                    h = lambda_inner[-1] - lambda_inner[0]
-                    r1 = None if order <= 1 else (lambda_inner[1] - lambda_inner[0]) / h
-                    r2 = None if order <= 2 else (lambda_inner[2] - lambda_inner[0]) / h
-                    x = self.singlestep_dpm_solver_update(x, s, t, order, solver_type=solver_type, r1=r1, r2=r2)
+                plan = self.get_plan(steps=steps, order=order, skip_type=skip_type, method=method, t_T=t_T, t_0=t_0,
+                    lower_order_final=lower_order_final, solver_type=solver_type, device=device, dtype=x.dtype)
+                for step, order in enumerate(plan.orders):
+                    s, t = plan.timesteps[step], plan.timesteps[step + 1]
+                    x = self.singlestep_dpm_solver_update(x, s, t, order, solver_type=solver_type, r1=plan.r1s[step], r2=plan.r2s[step])
                     if self.correcting_xt_fn is not None:
                         x = self.correcting_xt_fn(x, t, step)
                     if return_intermediate:
@@ -1266,6 +1403,10 @@ class DPM_Solver:
                     x = self.correcting_xt_fn(x, t, step + 1)
                 if return_intermediate:
                     intermediates.append(x)
+            if early_stop_tol is not None:
+                if active.shape[0] > 0:
+                    x_out[active] = x
+                x = x_out
         if return_intermediate:
             return x, intermediates
         else:
@@ -1273,6 +1414,83 @@ class DPM_Solver:
 
 
 
+class SolverPlan:
+    """
+    The time steps, the orders and the update coefficients of one fixed-step sampling configuration of `DPM_Solver`,
+    which are the same for every `DPM_Solver.sample` call with the same (steps, order, skip_type, method,
+    algorithm_type, device, dtype). They are computed once, so the repeated calls do no schedule math and
+    no host-device copies.
+
+    For `method='multistep'`, every update is linear in `x` and the previous model values:
+        x_t = coeffs[step, 0] * x + sum_j coeffs[step, j + 1] * model_prev_list[-orders[step] + j],
+    whose coefficients are found by running `DPM_Solver.multistep_dpm_solver_update` once on the unit vectors.
+    `alphas` and `sigmas` are the marginal alpha and sigma at the time steps for the data prediction model.
+
+    For `method='singlestep'` or `'singlestep_fixed'`, `timesteps` are the outer time steps and `orders` the
+    order of each outer step, and `r1s` and `r2s` are the ratios of the intermediate time steps.
+    """
+    def __init__(self, dpm_solver, steps, order, skip_type, method, t_T, t_0, lower_order_final=True,
+                 solver_type='dpmsolver', device=None, dtype=torch.float32):
+        ns = dpm_solver.noise_schedule
+        self.method = method
+        with torch.no_grad():
+            if method == 'multistep':
+                timesteps = dpm_solver.get_time_steps(skip_type=skip_type, t_T=t_T, t_0=t_0, N=steps, device=device)
+                assert timesteps.shape[0] - 1 == steps
+                # The first `order` steps are initialized by the lower order multistep DPM-Solver.
+                orders = [0] + list(range(1, order))
+                for step in range(order, steps + 1):
+                    # We only use lower order for steps < 10
+                    if lower_order_final and steps < 10:
+                        orders.append(min(order, steps + 1 - step))
+                    else:
+                        orders.append(order)
+                coeffs = torch.zeros((steps + 1, order + 1), device=device)
+                for step in range(1, steps + 1):
+                    step_order = orders[step]
+                    prev_steps = range(max(step - order, 0), step)[-step_order:]
+                    unit = torch.eye(step_order + 1, device=device)
+                    coeffs[step, :step_order + 1] = dpm_solver.multistep_dpm_solver_update(
+                        unit[0], list(unit[1:]), [timesteps[i] for i in prev_steps], timesteps[step],
+                        step_order, solver_type=solver_type)
+                self.timesteps = timesteps
+                self.orders = orders
+                self.coeffs = coeffs.to(dtype)
+                _, alphas, sigmas, _ = ns.marginal(timesteps)
+                self.alphas = alphas.to(dtype)
+                self.sigmas = sigmas.to(dtype)
+            elif method in ['singlestep', 'singlestep_fixed']:
+                if method == 'singlestep':
+                    timesteps_outer, orders = dpm_solver.get_orders_and_timesteps_for_singlestep_solver(steps=steps, order=order, skip_type=skip_type, t_T=t_T, t_0=t_0, device=device)
+                else:
+                    K = steps // order
+                    orders = [order,] * K
+                    timesteps_outer = dpm_solver.get_time_steps(skip_type=skip_type, t_T=t_T, t_0=t_0, N=K, device=device)
+                self.r1s, self.r2s = [], []
+                for step, step_order in enumerate(orders):
+                    s, t = timesteps_outer[step], timesteps_outer[step + 1]
+                    timesteps_inner = dpm_solver.get_time_steps(skip_type=skip_type, t_T=s.item(), t_0=t.item(), N=step_order, device=device)
+                    lambda_inner = ns.marginal_lambda(timesteps_inner)
+                    h = lambda_inner[-1] - lambda_inner[0]
+                    self.r1s.append(None if step_order <= 1 else (lambda_inner[1] - lambda_inner[0]) / h)
+                    self.r2s.append(None if step_order <= 2 else (lambda_inner[2] - lambda_inner[0]) / h)
+                self.timesteps = timesteps_outer
+                self.orders = orders
+            else:
+                raise ValueError("Cannot plan the method {}".format(method))
+
+    def multistep_update(self, x, model_prev_list, step):
+        """
+        The multistep DPM-Solver update to `timesteps[step]`, from `x` and the model values at the previous time steps.
+        """
+        step_order = self.orders[step]
+        coeffs = self.coeffs[step]
+        x_t = coeffs[0] * x
+        for coeff, model_prev in zip(coeffs[1:step_order + 1], model_prev_list[-step_order:]):
+            x_t = torch.addcmul(x_t, coeff, model_prev)
+        return x_t
+
+
 #############################################################
 # other utility functions
 #############################################################
@@ -1319,6 +1537,56 @@ def interpolate_fn(x, xp, yp):
     return cand
 
 
+def lookup_fn(x, xp, yp, slopes):
+    """
+    The same piecewise linear function as `interpolate_fn` for C = 1, by a binary search of the segments of the
+    ascending keypoints `xp` and the precomputed `slopes` of the segments.
+
+    Args:
+        x: PyTorch tensor with shape [N].
+        xp: PyTorch tensor with shape [K], ascending.
+        yp: PyTorch tensor with shape [K].
+        slopes: PyTorch tensor with shape [K - 1], (yp[1:] - yp[:-1]) / (xp[1:] - xp[:-1]).
+    Returns:
+        The function values f(x), with shape [N].
+    """
+    # For x beyond the bounds of xp, the outmost segments are extended.
+    idx = (torch.searchsorted(xp, x.contiguous()) - 1).clamp(0, xp.shape[0] - 2)
+    return yp[idx] + (x - xp[idx]) * slopes[idx]
+
+
+def select_condition(condition, indices):
+    """
+    Select the `indices` rows of the condition along the batch dimension.
+
+    Args:
+        `condition`: a PyTorch tensor, a precomputed condition feature (such as `ContentFeatures` or
+            `StyleFeatures`) which provides an `index_select` method, or a list of them.
+    Returns:
+        the selected condition.
+    """
+    if torch.is_tensor(condition):
+        return condition.index_select(0, indices)
+    if isinstance(condition, (list, tuple)):
+        return [select_condition(c, indices) for c in condition]
+    return condition.index_select(indices)
+
+
+def cat_condition(conditions):
+    """
+    Concatenate the conditions along the batch dimension.
+
+    Args:
+        `conditions`: a list of PyTorch tensors, or a list of precomputed condition features
+            (such as `ContentFeatures` or `StyleFeatures`) which provide a `cat` classmethod.
+    Returns:
+        the concatenated condition.
+    """
+    if torch.is_tensor(conditions[0]):
+        return torch.cat(conditions, dim=0)
+    return type(conditions[0]).cat(conditions)
+
+
 def expand_dims(v, dims):
     """
     Expand the tensor `v` to the dim `dims`.
@@ -1,9 +1,26 @@
+import os
+import itertools
+import contextlib
+from unittest import mock
+
 import torch
 from PIL import Image
 
 from .dpm_solver_pytorch import (NoiseScheduleVP, 
                                 model_wrapper, 
                                 DPM_Solver)
+from ..model import (DeepCache,
+                     pad_batch)
+from ..style_registry import (StyleHandle,
+                              StyleRegistry)
+
+
+def glyph_seed(seed, codepoint):
+    """The noise seed of the glyph `codepoint` in a job of the base `seed`. Every (seed, codepoint) \
+        has its own seed, as the codepoints are below 2**21.
+    """
+    return (seed << 21) + codepoint
+
 
 class FontDiffuserDPMPipeline():
     """FontDiffuser pipeline with DPM_Solver scheduler.
@@ -16,19 +33,152 @@ class FontDiffuserDPMPipeline():
         version="V3",
         model_type="noise",
         guidance_type="classifier-free",
-        guidance_scale=7.5
+        guidance_scale=7.5,
+        content_feature_store=None,
+        style_registry_max_memory_bytes=256 * 2**20,
+        style_registry_spill_dir=None,
     ):
         super().__init__()
         self.model = model
         self.train_scheduler_betas = ddpm_train_scheduler.betas
         # Define the noise schedule
         self.noise_schedule = NoiseScheduleVP(schedule='discrete', betas=self.train_scheduler_betas)
+        # The SolverPlans of the sampling configurations, shared by the DPM_Solver of every call.
+        self.solver_plans = {}
+        # (SolverPlan, UNet autocast dtype) -> TimestepEmbeddingTable of its steps, shared by every call.
+        self.time_embedding_tables = {}
 
         self.version = version
         self.model_type = model_type
         self.guidance_type = guidance_type
         self.guidance_scale = guidance_scale
 
+        # The unconditional (all-ones) images are constant, so their features are
+        # computed once per (encoder weights, resolution, device, dtype).
+        self.uncond_features_cache = {}
+        # The precomputed ContentFeatureStore of the charset, which replaces the rendering
+        # and the content encoder when characters are given to `generate_many`.
+        self.content_feature_store = content_feature_store
+        # The features of every style image are encoded once and cached by its content hash.
+        self.style_registry = StyleRegistry(max_memory_bytes=style_registry_max_memory_bytes,
+                                            spill_dir=style_registry_spill_dir)
+
+        # Set by `enable_cpu_inference`.
+        self.channels_last = False
+        self.unet_autocast_dtype = None
+        # Set by `enable_compile`.
+        self.compile_batch_sizes = None
+        self.compile_cache_dir = None
+
+    def enable_cpu_inference(self, channels_last=True, unet_autocast_dtype=None, num_threads=None):
+        """Tune the pipeline for the CPU inference.
+
+        Args:
+            channels_last: Convert the UNet and the encoders to channels_last, whose convolutions \
+                are faster with oneDNN on CPU.
+            unet_autocast_dtype: If set (e.g. torch.bfloat16), the UNet runs under autocast of this \
+                dtype, while the encoders and the DPM-Solver math stay in fp32.
+            num_threads: The intra-op threads. If None, the PyTorch default (the physical cores) is kept.
+        """
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+        # The model has no inter-op parallelism, so the inter-op threads would only compete
+        # with the intra-op ones. It can only be set before any inter-op work has started.
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+
+        if channels_last:
+            self.model.to(memory_format=torch.channels_last)
+        self.channels_last = channels_last
+        self.unet_autocast_dtype = unet_autocast_dtype
+
+    def enable_compile(self, batch_sizes=(1, 2, 4, 8), cache_dir=None, mode=None):
+        """Compile the UNet by torch.compile for the static shapes of the sampling.
+
+        Every UNet input is static except the batch, so the batches are padded up to the \
+            smallest of `batch_sizes` and the UNet is compiled once per bucket instead of \
+            once per batch size. Larger batches are compiled for their own size.
+
+        The compiled UNet is not faster than the eager one on every host (e.g. x0.79 on a 1-core \
+            CPU), so measure it with `benchmarks.compiled_unet` first. It runs without the time \
+            embedding table and cannot sample with the early termination, whose shrinking batches \
+            fall out of the buckets. The dynamo and inductor settings below are only applied \
+            during the sampling of this pipeline, so the other compiled models of the process keep theirs.
+
+        Args:
+            batch_sizes: The batch size buckets of `generate` (the UNet batch is doubled by \
+                the classifier-free guidance).
+            cache_dir: If set, the compiled kernels are cached in this directory by inductor, \
+                so a restarted process only traces the UNet again instead of recompiling it.
+            mode: The torch.compile mode, e.g. "max-autotune".
+        """
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.compile_cache_dir = os.path.abspath(cache_dir)
+
+        # The compiled forward is set on the module itself, so its state_dict keeps the same keys.
+        self.model.unet.compile(dynamic=False, mode=mode)
+        self.compile_batch_sizes = sorted(batch_sizes)
+
+    def _compile_context(self):
+        """The dynamo and inductor settings of the compiled UNet, which are global in torch, \
+            patched for the duration of a sampling run only.
+        """
+        stack = contextlib.ExitStack()
+        if self.compile_batch_sizes is None:
+            return stack
+        import torch._dynamo
+        import torch._inductor.config
+
+        # One graph for every bucket, with both the guided and the unguided UNet batches.
+        stack.enter_context(torch._dynamo.config.patch(
+            cache_size_limit=max(torch._dynamo.config.cache_size_limit, 2 * len(self.compile_batch_sizes))))
+        stack.enter_context(torch._inductor.config.patch(fx_graph_cache=True))
+        if self.compile_cache_dir is not None:
+            # Inductor reads its cache directory from the environment only.
+            stack.enter_context(mock.patch.dict(os.environ, {"TORCHINDUCTOR_CACHE_DIR": self.compile_cache_dir}))
+        return stack
+
+    def warmup_compile(self, content_encoder_downsample_size, dm_size=(96, 96), batch_sizes=None):
+        """Compile the UNet for the `batch_sizes` buckets (all of them by default) before \
+            the first request, by sampling one step of all-ones images.
+        """
+        batch_sizes = self.compile_batch_sizes if batch_sizes is None else batch_sizes
+        style_images = torch.ones((1, 3, *dm_size), device=self.model.device)
+        with torch.no_grad():
+            style_features = self.model.encode_style(style_images)
+            for batch_size in batch_sizes:
+                content_images = torch.ones((batch_size, 3, *dm_size), device=self.model.device)
+                cond = [self.model.encode_content(content_images), style_features.expand(batch_size)]
+                uncond = self.get_uncond_condition(content_images, style_images, batch_size=batch_size)
+                self.sample(
+                    model=self.model.denoise,
+                    cond=cond,
+                    uncond=uncond,
+                    batch_size=batch_size,
+                    order=1,
+                    num_inference_step=1,
+                    content_encoder_downsample_size=content_encoder_downsample_size,
+                    dm_size=dm_size)
+
+    def _padded_batch_size(self, batch_size):
+        if self.compile_batch_sizes is None:
+            return batch_size
+        return next((size for size in self.compile_batch_sizes if size >= batch_size), batch_size)
+
+    def _autocast_model(self, model):
+        if self.unet_autocast_dtype is None:
+            return model
+
+        def autocast_model(x_t, *args, **kwargs):
+            with torch.autocast(device_type=self.model.device.type, dtype=self.unet_autocast_dtype):
+                noise_pred = model(x_t, *args, **kwargs)
+            return noise_pred.to(x_t.dtype)
+
+        return autocast_model
+
     def numpy_to_pil(self, images):
         """Convert a numpy image or a batch of images to a PIL image.
         """
@@ -39,6 +189,70 @@ class FontDiffuserDPMPipeline():
 
         return pil_images
 
+    def quantize_images(self, x_sample, grayscale=False):
+        """Quantize the [B, 3, H, W] sample in [-1, 1] to a [B, C, H, W] uint8 tensor on its device, \
+            with C = 1 if `grayscale` (the glyphs are gray, so the channels are averaged).
+        """
+        x_sample = (x_sample / 2 + 0.5).clamp(0, 1)
+        if grayscale:
+            x_sample = x_sample.mean(dim=1, keepdim=True)
+        return (x_sample * 255).round().to(torch.uint8)
+
+    def encode_condition(self, content_images, style_images):
+        """Encode the content and style images into the [ContentFeatures, StyleFeatures] \
+            condition consumed by `model.denoise`.
+        """
+        return [self.model.encode_content(content_images),
+                self.model.encode_style(style_images)]
+
+    def register_style(self, style_images):
+        """Encode the style images into the style registry and return their StyleHandle, \
+            which can be passed as `style_images` to `generate` and `generate_many`.
+        """
+        handle = self.style_registry.make_handle(style_images)
+        self.get_style_features(handle)
+        return handle
+
+    def get_style_features(self, handle):
+        """Return the StyleFeatures of the StyleHandle, encoding them only on a registry miss.
+        """
+        weights_fingerprint = self.model.encoder_weights_fingerprint()
+        style_features = self.style_registry.get(handle.key, weights_fingerprint, device=self.model.device)
+        if style_features is None:
+            with torch.no_grad():
+                style_features = self.model.encode_style(handle.style_images.to(self.model.device))
+            self.style_registry.put(handle.key, weights_fingerprint, style_features)
+        return style_features
+
+    def get_uncond_condition(self, content_images, style_images, batch_size=None):
+        """Return the [ContentFeatures, StyleFeatures] of the all-ones unconditional \
+            images, broadcast to `batch_size` (the batch size of `content_images` by default). \
+            If `content_images` is None, the content image shape of the content feature store is used \
+            and `batch_size` must be given.
+        """
+        if content_images is None:
+            if batch_size is None:
+                raise ValueError("The batch_size is needed when the content_images are None.")
+            content_image_shape = self.content_feature_store.image_shape
+        else:
+            content_image_shape = tuple(content_images.shape[1:])
+            batch_size = content_images.shape[0] if batch_size is None else batch_size
+        weights_version = self.model.encoder_weights_version()
+        uncond = []
+        for encode, image_shape in [(self.model.encode_content, content_image_shape), 
+                                    (self.model.encode_style, tuple(style_images.shape[1:]))]:
+            key = (encode.__name__, weights_version, image_shape, self.model.device, style_images.dtype)
+            if key not in self.uncond_features_cache:
+                # Drop the features computed with the stale weights.
+                self.uncond_features_cache = {k: v for k, v in self.uncond_features_cache.items() \
+                                              if k[1] == weights_version}
+                uncond_images = torch.ones((1, *image_shape), device=self.model.device, dtype=style_images.dtype)
+                with torch.no_grad():
+                    self.uncond_features_cache[key] = encode(uncond_images)
+            uncond.append(self.uncond_features_cache[key].expand(batch_size))
+
+        return uncond
+
     def generate(
         self,
         content_images,
@@ -55,63 +269,266 @@ class FontDiffuserDPMPipeline():
         method="multistep",
         correcting_x0_fn=None,
         generator=None,
+        seeds=None,
+        style_features=None,
+        content_features=None,
+        guidance_interval=None,
+        reuse_uncond=False,
+        deep_cache_interval=1,
+        deep_cache_depth=1,
+        early_stop_tol=None,
+        early_stop_patience=2,
+        output_type="pil",
+        grayscale=False,
     ):
+        """Generate the glyphs of `content_images` in the style of `style_images`.
+
+        The glyphs are returned as a list of PIL images if `output_type` is "pil", or quantized to \
+            uint8 on the device as a [B, H, W, C] numpy array if "np" or a [B, C, H, W] tensor if "pt". \
+            With `grayscale`, C = 1 and the numpy array is [B, H, W].
+        """
+        assert output_type in ["pil", "np", "pt"], f"Unsupported output_type {output_type}."
+        # 1. Encode the conditions once, they stay the same for every sampling step.
+        # The `style_features` encoded before can be shared by several calls, and the
+        # `content_features` can be read from the content feature store instead of `content_images`.
+        # The `style_images` are looked up in the style registry, so the same style is encoded only once.
+        if style_features is None:
+            if not isinstance(style_images, StyleHandle):
+                style_images = self.style_registry.make_handle(style_images)
+            style_features = self.get_style_features(style_images)
+        if isinstance(style_images, StyleHandle):
+            style_images = style_images.style_images
+        if content_features is None:
+            content_features = self.model.encode_content(content_images)
+        cond = [content_features, style_features.expand(batch_size)]
+
+        uncond = self.get_uncond_condition(content_images, style_images, batch_size=batch_size)
+
+        x_sample = self.sample(
+            model=self.model.denoise,
+            cond=cond,
+            uncond=uncond,
+            batch_size=batch_size,
+            order=order,
+            num_inference_step=num_inference_step,
+            content_encoder_downsample_size=content_encoder_downsample_size,
+            dm_size=dm_size,
+            algorithm_type=algorithm_type,
+            skip_type=skip_type,
+            method=method,
+            correcting_x0_fn=correcting_x0_fn,
+            generator=generator,
+            seeds=seeds,
+            guidance_interval=guidance_interval,
+            reuse_uncond=reuse_uncond,
+            deep_cache_interval=deep_cache_interval,
+            deep_cache_depth=deep_cache_depth,
+            early_stop_tol=early_stop_tol,
+            early_stop_patience=early_stop_patience)
+
+        if output_type == "pt":
+            return self.quantize_images(x_sample, grayscale=grayscale)
+        if output_type == "np":
+            x_images = self.quantize_images(x_sample, grayscale=grayscale).permute(0, 2, 3, 1).cpu().numpy()
+            return x_images[..., 0] if grayscale else x_images
+
+        x_sample = (x_sample / 2 + 0.5).clamp(0, 1)
+        x_sample = x_sample.cpu().permute(0, 2, 3, 1).numpy()
+    
+        x_images = self.numpy_to_pil(x_sample)
+
+        return x_images
+
+    def generate_many(
+        self,
+        content_images,
+        style_images,
+        batch_size,
+        seeds=None,
+        **generate_kwargs,
+    ):
+        """Generate one glyph for every content image in the style of the single style image \
+            (or its StyleHandle).
+
+        The content images are stacked into UNet batches of `batch_size`, and the style image is
+        encoded only once and shared by all the batches. `content_images` can be a [N, C, H, W]
+        tensor or any iterable of [C, H, W] tensors (e.g. a generator rendering the glyphs lazily),
+        and the PIL images are yielded in the same order as soon as their batch finishes. If the
+        pipeline has a content feature store, `content_images` can also be the characters themselves,
+        whose content features are then read from the store. The glyphs are PIL images, or with the
+        `output_type` "np" or "pt" of `generate`, the rows of its uint8 batch. `seeds` are the noise seeds of the content
+        images in the same order (e.g. by `glyph_seed`), so a glyph is the same whatever batch it is in.
+        """
+        if not isinstance(style_images, StyleHandle):
+            style_images = self.style_registry.make_handle(style_images[:1])
+        style_features = self.get_style_features(style_images)
+
+        if seeds is not None:
+            seeds = iter(seeds)
+        batch = []
+        for content_image in content_images:
+            batch.append(content_image)
+            if len(batch) == batch_size:
+                yield from self._generate_batch(batch, style_images, style_features, seeds, generate_kwargs)
+                batch = []
+        if len(batch) > 0:
+            yield from self._generate_batch(batch, style_images, style_features, seeds, generate_kwargs)
+
+    def _generate_batch(self, batch, style_images, style_features, seeds, generate_kwargs):
+        if isinstance(batch[0], str):
+            content_images = None
+            content_features = self.content_feature_store.get(batch, device=self.model.device,
+                                                              dtype=style_features.img_feature.dtype)
+        else:
+            content_images = torch.stack(batch).to(self.model.device)
+            content_features = None
+        return self.generate(
+            content_images=content_images,
+            style_images=style_images,
+            batch_size=len(batch),
+            style_features=style_features,
+            content_features=content_features,
+            seeds=None if seeds is None else list(itertools.islice(seeds, len(batch))),
+            **generate_kwargs)
+
+    def sample(
+        self,
+        model,
+        cond,
+        uncond,
+        batch_size,
+        order,
+        num_inference_step,
+        content_encoder_downsample_size,
+        dm_size=(96, 96),
+        algorithm_type="dpmsolver++",
+        skip_type="time_uniform",
+        method="multistep",
+        correcting_x0_fn=None,
+        generator=None,
+        seeds=None,
+        guidance_interval=None,
+        reuse_uncond=False,
+        deep_cache_interval=1,
+        deep_cache_depth=1,
+        early_stop_tol=None,
+        early_stop_patience=2,
+    ):
+        """Run the DPM-Solver loop and return the sample in [-1, 1]. `model` is called as \
+            `model(x, t, cond, **model_kwargs)`, e.g. `self.model.denoise` with the encoded \
+            condition or `self.model` with the raw [content_images, style_images].
+
+        The classifier-free guidance doubles the UNet batch. It is only applied within the \
+            (t_min, t_max) `guidance_interval` of the model input time (0 to 999) if given, and \
+            with `reuse_uncond` the unconditional output is only evaluated at every other guided step.
+
+        If `deep_cache_interval` > 1, the deep UNet path below the first `deep_cache_depth` \
+            down/up blocks only runs every `deep_cache_interval` UNet calls and is reused from \
+            the last full call in between (DeepCache), which needs `model` to accept `deep_cache`.
+
+        The initial noise is drawn by `generator` for the whole batch, or if `seeds` are given, by \
+            a generator of its own seed for every sample, so the noise of a sample does not depend on \
+            the batch size or its position in the batch.
+
+        If `early_stop_tol` is set, every glyph whose binarized x0 prediction has changed in at \
+            most `early_stop_tol` of its pixels for `early_stop_patience` steps is retired from the \
+            batch with its x0, and the later steps run on the remaining glyphs only.
+        """
+        assert early_stop_tol is None or self.compile_batch_sizes is None, \
+            "The early termination shrinks the UNet batch out of the compiled batch size buckets."
+
+        # The compiled UNet only runs the bucketed batch sizes, the padded rows are dropped at the end.
+        padded_batch_size = self._padded_batch_size(batch_size)
+        if padded_batch_size != batch_size:
+            cond = [self._pad_condition(c, padded_batch_size) for c in cond]
+            if uncond is not None:
+                uncond = [self._pad_condition(c, padded_batch_size) for c in uncond]
+
         model_kwargs = {}
         model_kwargs["version"] = self.version
         model_kwargs["content_encoder_downsample_size"] = content_encoder_downsample_size
-
-        cond = []
-        cond.append(content_images)
-        cond.append(style_images)
-
-        uncond = []
-        uncond_content_images = torch.ones_like(content_images).to(self.model.device)
-        uncond_style_images = torch.ones_like(style_images).to(self.model.device)
-        uncond.append(uncond_content_images)
-        uncond.append(uncond_style_images)
+        if deep_cache_interval > 1:
+            model_kwargs["deep_cache"] = DeepCache(depth=deep_cache_depth, interval=deep_cache_interval)
 
         # 2.Convert the discrete-time model to the continuous-time
         model_fn = model_wrapper(
-            model=self.model,
+            model=self._autocast_model(model),
             noise_schedule=self.noise_schedule,
             model_type=self.model_type,
             model_kwargs=model_kwargs,
             guidance_type=self.guidance_type,
             condition=cond, 
             unconditional_condition=uncond,
-            guidance_scale=self.guidance_scale
+            guidance_scale=self.guidance_scale,
+            guidance_interval=guidance_interval,
+            reuse_uncond=reuse_uncond,
         )
 
         # 3. Define dpm-solver and sample by multistep DPM-Solver.
         # (We recommend multistep DPM-Solver for conditional sampling)
         # You can adjust the `steps` to balance the computation costs and the sample quality.
+        deep_cache = model_kwargs.get("deep_cache")
+
+        def select_batch(indices):
+            model_fn.select_batch(indices)
+            if deep_cache is not None:
+                # The cached deep features are of the old batch, so the next call runs the full UNet.
+                deep_cache.clear()
+
         dpm_solver = DPM_Solver(
             model_fn=model_fn,
             noise_schedule=self.noise_schedule,
             algorithm_type=algorithm_type,
-            correcting_x0_fn=correcting_x0_fn
+            correcting_x0_fn=correcting_x0_fn,
+            select_batch_fn=select_batch,
+            plan_cache=self.solver_plans,
         )
         # If the DPM is defined on pixel-space images, you can further set `correcting_x0_fn="dynamic_thresholding"
 
         # 4. Generate
         # Sample gaussian noise to begin loop => [batch, 3, height, width]
-        x_T = torch.randn(
-            (batch_size, 3, dm_size[0], dm_size[1]),
-            generator=generator,
-        )
-        x_T = x_T.to(self.model.device)
+        if seeds is not None:
+            assert len(seeds) == batch_size, "Every sample needs a seed."
+            x_T = torch.stack([torch.randn(
+                (3, dm_size[0], dm_size[1]),
+                generator=torch.Generator().manual_seed(seed),
+            ) for seed in seeds])
+        else:
+            x_T = torch.randn(
+                (batch_size, 3, dm_size[0], dm_size[1]),
+                generator=generator,
+            )
+        x_T = pad_batch(x_T, padded_batch_size).to(self.model.device)
+        if self.channels_last:
+            x_T = x_T.contiguous(memory_format=torch.channels_last)
 
-        x_sample = dpm_solver.sample(
-            x=x_T,
-            steps=num_inference_step,
-            order=order,
-            skip_type=skip_type,
-            method=method,
-        )
+        # The time embeddings of the planned steps are computed once per plan and looked up at every
+        # step. The compiled UNet runs without the table, whose lookups would break its graph.
+        if method != "adaptive" and self.compile_batch_sizes is None and hasattr(self.model, "unet"):
+            plan = dpm_solver.get_plan(steps=num_inference_step, order=order, skip_type=skip_type, method=method,
+                                       t_T=self.noise_schedule.T, t_0=1. / self.noise_schedule.total_N,
+                                       device=x_T.device, dtype=x_T.dtype)
+            key = (plan, self.unet_autocast_dtype)
+            if key not in self.time_embedding_tables:
+                self.time_embedding_tables[key] = self.model.unet.prepare_time_embedding_table(
+                    model_fn.get_model_input_time(plan.timesteps))
+            model_kwargs["time_embedding_table"] = self.time_embedding_tables[key]
 
-        x_sample = (x_sample / 2 + 0.5).clamp(0, 1)
-        x_sample = x_sample.cpu().permute(0, 2, 3, 1).numpy()
-    
-        x_images = self.numpy_to_pil(x_sample)
+        with self._compile_context():
+            x_sample = dpm_solver.sample(
+                x=x_T,
+                steps=num_inference_step,
+                order=order,
+                skip_type=skip_type,
+                method=method,
+                early_stop_tol=early_stop_tol,
+                early_stop_patience=early_stop_patience,
+            )
 
-        return x_images
+        return x_sample[:batch_size]
+
+    @staticmethod
+    def _pad_condition(condition, batch_size):
+        if torch.is_tensor(condition):
+            return pad_batch(condition, batch_size)
+        return condition.pad(batch_size)
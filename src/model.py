@@ -1,4 +1,9 @@
 import math
+import hashlib
+import itertools
+from dataclasses import dataclass, field
+from typing import List, Optional
+
 import torch
 import torch.nn as nn
 
@@ -6,6 +11,148 @@ from diffusers import ModelMixin
 from diffusers.configuration_utils import (ConfigMixin, 
                                            register_to_config)
 
+
+_weights_generations = itertools.count(1)
+
+
+def bump_weights_generation(module, incompatible_keys=None):
+    """Give `module` a new weights generation, which tells the features cached with its former \
+        weights are stale. It is also the load_state_dict post hook of the encoders.
+    """
+    module.weights_generation = next(_weights_generations)
+
+
+def state_dict_fingerprint(modules):
+    """The sha256 of the state_dicts of `modules`, the same in every process loading the same weights.
+    """
+    sha = hashlib.sha256()
+    for module in modules:
+        for name, tensor in module.state_dict().items():
+            tensor = tensor.detach().cpu().contiguous()
+            sha.update(f"{name}:{tensor.dtype}:{tuple(tensor.shape)}".encode())
+            sha.update(tensor.reshape(-1).view(torch.uint8).numpy().tobytes())
+    return sha.hexdigest()
+
+
+def pad_batch(tensor, batch_size):
+    """Pad the batch of `tensor` to `batch_size` by repeating its last row.
+    """
+    if tensor.shape[0] == batch_size:
+        return tensor
+    padding = tensor[-1:].expand(batch_size - tensor.shape[0], *tensor.shape[1:])
+    return torch.cat([tensor, padding], dim=0)
+
+
+@dataclass
+class ContentFeatures:
+    """Content encoder outputs of the content images, which stay the same \
+        for every sampling step.
+    """
+    residual_features: List[torch.Tensor]
+
+    @classmethod
+    def cat(cls, features_list):
+        residual_features = [torch.cat(features, dim=0) for features in \
+                             zip(*[f.residual_features for f in features_list])]
+        return cls(residual_features=residual_features)
+
+    def expand(self, batch_size):
+        """Broadcast a batch-1 feature to `batch_size` without recomputation or copy.
+        """
+        return ContentFeatures(
+            residual_features=[f.expand(batch_size, *f.shape[1:]) for f in self.residual_features])
+
+    def pad(self, batch_size):
+        """Pad the batch to `batch_size` by repeating the last row.
+        """
+        return ContentFeatures(residual_features=[pad_batch(f, batch_size) for f in self.residual_features])
+
+    def index_select(self, indices):
+        return ContentFeatures(residual_features=[f.index_select(0, indices) for f in self.residual_features])
+
+
+@dataclass
+class StyleFeatures:
+    """Style encoder and content encoder outputs of the style images, which \
+        stay the same for every sampling step.
+    """
+    img_feature: torch.Tensor
+    hidden_states: torch.Tensor
+    content_res_features: List[torch.Tensor]
+    # The UNet context prepared from these features, filled by `FontDiffuserModelDPM.denoise`
+    unet_context: Optional[dict] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def cat(cls, features_list):
+        content_res_features = [torch.cat(features, dim=0) for features in \
+                                zip(*[f.content_res_features for f in features_list])]
+        return cls(
+            img_feature=torch.cat([f.img_feature for f in features_list], dim=0),
+            hidden_states=torch.cat([f.hidden_states for f in features_list], dim=0),
+            content_res_features=content_res_features)
+
+    def expand(self, batch_size):
+        """Broadcast a batch-1 feature to `batch_size` without recomputation or copy.
+        """
+        return StyleFeatures(
+            img_feature=self.img_feature.expand(batch_size, *self.img_feature.shape[1:]),
+            hidden_states=self.hidden_states.expand(batch_size, *self.hidden_states.shape[1:]),
+            content_res_features=[f.expand(batch_size, *f.shape[1:]) for f in self.content_res_features])
+
+    def pad(self, batch_size):
+        """Pad the batch to `batch_size` by repeating the last row.
+        """
+        return StyleFeatures(
+            img_feature=pad_batch(self.img_feature, batch_size),
+            hidden_states=pad_batch(self.hidden_states, batch_size),
+            content_res_features=[pad_batch(f, batch_size) for f in self.content_res_features])
+
+    def index_select(self, indices):
+        return StyleFeatures(
+            img_feature=self.img_feature.index_select(0, indices),
+            hidden_states=self.hidden_states.index_select(0, indices),
+            content_res_features=[f.index_select(0, indices) for f in self.content_res_features])
+
+    def to(self, device):
+        return StyleFeatures(
+            img_feature=self.img_feature.to(device),
+            hidden_states=self.hidden_states.to(device),
+            content_res_features=[f.to(device) for f in self.content_res_features])
+
+
+@dataclass
+class DeepCache:
+    """The deep UNet features cached across the sampling steps of one `FontDiffuserDPMPipeline.sample`.
+
+    The deep path of the UNet below the first `depth` down/up blocks changes slowly between \
+        adjacent steps, so it only runs at every `interval` UNet calls of a batch size, and the \
+        other calls of that batch size reuse its last output.
+    """
+    depth: int = 1
+    interval: int = 3
+    # The guided and the unguided calls have different batches and are interleaved irregularly
+    # (guidance_interval, reuse_uncond), so every batch size has its own calls and features.
+    # batch size -> number of UNet calls
+    num_calls: dict = field(default_factory=dict)
+    # batch size -> deep path output
+    features: dict = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        if self.depth < 1:
+            raise ValueError(f"The DeepCache depth should be at least 1, but got {self.depth}.")
+        if self.interval < 1:
+            raise ValueError(f"The DeepCache interval should be at least 1, but got {self.interval}.")
+
+    def is_full_step(self, batch_size):
+        return self.num_calls.get(batch_size, 0) % self.interval == 0
+
+    def clear(self):
+        """Drop the cached features, so the next call of every batch size runs the full UNet.
+        """
+        self.num_calls.clear()
+        self.features.clear()
+
+
 class FontDiffuserModel(ModelMixin, ConfigMixin):
     """Forward function for FontDiffuer with content encoder \
         style encoder and unet.
@@ -73,38 +220,124 @@ class FontDiffuserModelDPM(ModelMixin, ConfigMixin):
         self.unet = unet
         self.style_encoder = style_encoder
         self.content_encoder = content_encoder
+        bump_weights_generation(self)
+        for encoder in [self.style_encoder, self.content_encoder]:
+            bump_weights_generation(encoder)
+            encoder.register_load_state_dict_post_hook(bump_weights_generation)
+        # (encoder weights version, fingerprint) of the last fingerprint computed.
+        self.encoder_fingerprint = (None, None)
     
-    def forward(
-        self, 
-        x_t, 
-        timesteps, 
-        cond,
-        content_encoder_downsample_size,
-        version,
-    ):
-        content_images = cond[0]
-        style_images = cond[1]
+    def encoder_weights_version(self):
+        """The weights generations of the encoders, bumped by load_state_dict and bake_spectral_norm, \
+            and their tensor version counters, bumped by the other in-place updates (e.g. an optimizer \
+            step), which tell whether the features cached before are stale.
+        """
+        encoders = [self.content_encoder, self.style_encoder]
+        return (tuple(module.weights_generation for module in [self] + encoders),
+                sum(t._version for encoder in encoders \
+                    for t in list(encoder.parameters()) + list(encoder.buffers())))
+
+    def encoder_weights_fingerprint(self):
+        """The `state_dict_fingerprint` of the encoders, which keys the features kept across processes. \
+            It is only hashed again when the `encoder_weights_version` changed.
+        """
+        weights_version = self.encoder_weights_version()
+        if self.encoder_fingerprint[0] != weights_version:
+            self.encoder_fingerprint = (weights_version,
+                                        state_dict_fingerprint([self.content_encoder, self.style_encoder]))
+        return self.encoder_fingerprint[1]
 
-        style_img_feature, _, style_residual_features = self.style_encoder(style_images)
+    def encode_content(self, content_images):
+        # In train mode the spectral norm layers update their u/sv buffers at every forward,
+        # so the cached features would never match the weights again.
+        assert not self.training, "The features are encoded for the caches in eval mode only."
+        content_img_feture, content_residual_features = self.content_encoder(content_images)
+        content_residual_features.append(content_img_feture)
+        return ContentFeatures(residual_features=content_residual_features)
+
+    def encode_style(self, style_images):
+        assert not self.training, "The features are encoded for the caches in eval mode only."
+        style_img_feature, _, _ = self.style_encoder(style_images)
         
         batch_size, channel, height, width = style_img_feature.shape
         style_hidden_states = style_img_feature.permute(0, 2, 3, 1).reshape(batch_size, height*width, channel)
-        
-        # Get content feature
-        content_img_feture, content_residual_features = self.content_encoder(content_images)
-        content_residual_features.append(content_img_feture)
+
         # Get the content feature from reference image
         style_content_feature, style_content_res_features = self.content_encoder(style_images)
         style_content_res_features.append(style_content_feature)
 
-        input_hidden_states = [style_img_feature, content_residual_features, style_hidden_states, style_content_res_features]
+        return StyleFeatures(
+            img_feature=style_img_feature,
+            hidden_states=style_hidden_states,
+            content_res_features=style_content_res_features)
+
+    def denoise(
+        self, 
+        x_t, 
+        timesteps, 
+        cond,
+        content_encoder_downsample_size,
+        version=None,
+        deep_cache=None,
+        time_embedding_table=None,
+    ):
+        """UNet-only forward with the precomputed [ContentFeatures, StyleFeatures] \
+            condition, so the encoders are not run again at every sampling step. With the \
+            DeepCache `deep_cache`, the deep path of the UNet is skipped at the cheap steps. \
+            With the TimestepEmbeddingTable `time_embedding_table`, the time embeddings are looked up.
+        """
+        content_features = cond[0]
+        style_features = cond[1]
+
+        input_hidden_states = [style_features.img_feature, content_features.residual_features, \
+                               style_features.hidden_states, style_features.content_res_features]
+
+        # The style-only parts of the UNet are computed at the first step and reused afterwards.
+        if style_features.unet_context is None:
+            style_features.unet_context = self.unet.prepare_context(input_hidden_states)
+
+        unet_deep_cache = None
+        if deep_cache is not None:
+            batch_size = x_t.shape[0]
+            unet_deep_cache = {"depth": deep_cache.depth, "feature": None}
+            if not deep_cache.is_full_step(batch_size):
+                unet_deep_cache["feature"] = deep_cache.features.get(batch_size)
+            deep_cache.num_calls[batch_size] = deep_cache.num_calls.get(batch_size, 0) + 1
 
         out = self.unet(
             x_t, 
             timesteps, 
             encoder_hidden_states=input_hidden_states,
             content_encoder_downsample_size=content_encoder_downsample_size,
+            prepared_context=style_features.unet_context,
+            deep_cache=unet_deep_cache,
+            time_embedding_table=time_embedding_table,
         )
         noise_pred = out[0]
+
+        if deep_cache is not None:
+            deep_cache.features[batch_size] = unet_deep_cache["feature"]
         
         return noise_pred
+
+    def forward(
+        self, 
+        x_t, 
+        timesteps, 
+        cond,
+        content_encoder_downsample_size,
+        version,
+        time_embedding_table=None,
+    ):
+        content_images = cond[0]
+        style_images = cond[1]
+
+        cond_features = [self.encode_content(content_images), self.encode_style(style_images)]
+
+        return self.denoise(
+            x_t, 
+            timesteps, 
+            cond_features, 
+            content_encoder_downsample_size=content_encoder_downsample_size,
+            version=version,
+            time_embedding_table=time_embedding_table)
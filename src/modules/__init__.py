@@ -1,4 +1,11 @@
 from .content_encoder import ContentEncoder
 from .style_encoder import StyleEncoder
 from .unet import UNet
-from .scr import SCR
\ No newline at end of file
+
+
+def __getattr__(name):
+    # The SCR is only used by the training and imports kornia and info_nce.
+    if name == "SCR":
+        from .scr import SCR
+        return SCR
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
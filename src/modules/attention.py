@@ -5,6 +5,15 @@ from torch import nn
 import torch.nn.functional as F
 
 
+# The attention backends of CrossAttention: "sdpa" runs the fused F.scaled_dot_product_attention
+# (PyTorch >= 2.0), which never materializes the score matrix, and "math" the explicit
+# matmul -> softmax -> matmul. The modules keep "math", the sampling selects "sdpa" by
+# `set_attention_backend` when it is available.
+ATTENTION_BACKENDS = ("sdpa", "math")
+SDPA_AVAILABLE = hasattr(F, "scaled_dot_product_attention")
+DEFAULT_ATTENTION_BACKEND = "math"
+
+
 class SpatialTransformer(nn.Module):
     """
     Transformer block for image-like data. First, project the input (aka embedding) and reshape to b, t, d. Then apply
@@ -51,7 +60,13 @@ class SpatialTransformer(nn.Module):
         for block in self.transformer_blocks:
             block._set_attention_slice(slice_size)
 
-    def forward(self, hidden_states, context=None):
+    def prepare_context(self, context):
+        """Precompute the context-only part of every transformer block, which can be \
+            reused through `prepared_context` while the context stays the same.
+        """
+        return [block.prepare_context(context) for block in self.transformer_blocks]
+
+    def forward(self, hidden_states, context=None, prepared_context=None):
         # note: if no context is given, cross-attention defaults to self-attention
         batch, channel, height, weight = hidden_states.shape
         residual = hidden_states
@@ -59,8 +74,10 @@ class SpatialTransformer(nn.Module):
         hidden_states = self.proj_in(hidden_states)
         inner_dim = hidden_states.shape[1]
         hidden_states = hidden_states.permute(0, 2, 3, 1).reshape(batch, height * weight, inner_dim)  # here change the shape torch.Size([1, 4096, 128])
-        for block in self.transformer_blocks:
-            hidden_states = block(hidden_states, context=context)  # hidden_states: torch.Size([1, 4096, 128])
+        if prepared_context is None:
+            prepared_context = [None] * len(self.transformer_blocks)
+        for block, block_context in zip(self.transformer_blocks, prepared_context):
+            hidden_states = block(hidden_states, context=context, prepared_context=block_context)  # hidden_states: torch.Size([1, 4096, 128])
         hidden_states = hidden_states.reshape(batch, height, weight, inner_dim).permute(0, 3, 1, 2)   # torch.Size([1, 128, 64, 64])
         hidden_states = self.proj_out(hidden_states)
         return hidden_states + residual
@@ -107,10 +124,13 @@ class BasicTransformerBlock(nn.Module):
         self.attn1._slice_size = slice_size
         self.attn2._slice_size = slice_size
 
-    def forward(self, hidden_states, context=None):
+    def prepare_context(self, context):
+        return self.attn2.prepare_key_value(context)
+
+    def forward(self, hidden_states, context=None, prepared_context=None):
         hidden_states = hidden_states.contiguous() if hidden_states.device.type == "mps" else hidden_states
         hidden_states = self.attn1(self.norm1(hidden_states)) + hidden_states   # hidden_states: torch.Size([1, 4096, 128])
-        hidden_states = self.attn2(self.norm2(hidden_states), context=context) + hidden_states
+        hidden_states = self.attn2(self.norm2(hidden_states), context=context, key_value=prepared_context) + hidden_states
         hidden_states = self.ff(self.norm3(hidden_states)) + hidden_states
         return hidden_states
 
@@ -185,6 +205,8 @@ class CrossAttention(nn.Module):
         # is split across the batch axis to save memory
         # You can set slice_size with `set_attention_slice`
         self._slice_size = None
+        # You can set the backend with `set_attention_backend`
+        self.attention_backend = DEFAULT_ATTENTION_BACKEND
 
         self.to_q = nn.Linear(query_dim, inner_dim, bias=False)
         self.to_k = nn.Linear(context_dim, inner_dim, bias=False)
@@ -192,7 +214,16 @@ class CrossAttention(nn.Module):
 
         self.to_out = nn.Sequential(nn.Linear(inner_dim, query_dim), nn.Dropout(dropout))
 
+    def set_attention_backend(self, backend):
+        if backend not in ATTENTION_BACKENDS:
+            raise ValueError(f"Unsupported attention backend {backend}, need to be one of {ATTENTION_BACKENDS}")
+        if backend == "sdpa" and not SDPA_AVAILABLE:
+            raise ValueError("The sdpa attention backend needs torch.nn.functional.scaled_dot_product_attention (PyTorch >= 2.0)")
+        self.attention_backend = backend
+
     def reshape_heads_to_batch_dim(self, tensor):
+        if self.heads == 1:
+            return tensor
         batch_size, seq_len, dim = tensor.shape
         head_size = self.heads
         tensor = tensor.reshape(batch_size, seq_len, head_size, dim // head_size)
@@ -200,25 +231,36 @@ class CrossAttention(nn.Module):
         return tensor
 
     def reshape_batch_dim_to_heads(self, tensor):
+        if self.heads == 1:
+            return tensor
         batch_size, seq_len, dim = tensor.shape
         head_size = self.heads
         tensor = tensor.reshape(batch_size // head_size, head_size, seq_len, dim)
         tensor = tensor.permute(0, 2, 1, 3).reshape(batch_size // head_size, seq_len, dim * head_size)
         return tensor
 
-    def forward(self, hidden_states, context=None, mask=None):
-        batch_size, sequence_length, _ = hidden_states.shape
+    def prepare_query(self, hidden_states):
+        return self.reshape_heads_to_batch_dim(self.to_q(hidden_states))
 
-        query = self.to_q(hidden_states)
-        context = context if context is not None else hidden_states
-        key = self.to_k(context)
-        value = self.to_v(context)
+    def prepare_key_value(self, context):
+        key = self.reshape_heads_to_batch_dim(self.to_k(context))
+        value = self.reshape_heads_to_batch_dim(self.to_v(context))
+        return key, value
 
-        dim = query.shape[-1]
+    def forward(self, hidden_states, context=None, mask=None, query=None, key_value=None):
+        """`query` and `key_value` are the outputs of `prepare_query` and `prepare_key_value`, \
+            which can be passed instead of being recomputed when their inputs do not change.
+        """
+        batch_size, sequence_length, _ = hidden_states.shape
+
+        if query is None:
+            query = self.prepare_query(hidden_states)
+        if key_value is None:
+            context = context if context is not None else hidden_states
+            key_value = self.prepare_key_value(context)
+        key, value = key_value
 
-        query = self.reshape_heads_to_batch_dim(query)
-        key = self.reshape_heads_to_batch_dim(key)
-        value = self.reshape_heads_to_batch_dim(value)
+        dim = query.shape[-1] * self.heads
 
         # TODO(PVP) - mask is currently never used. Remember to re-implement when used
 
@@ -232,6 +274,10 @@ class CrossAttention(nn.Module):
         return self.to_out(hidden_states)
 
     def _attention(self, query, key, value):
+        if self.attention_backend == "sdpa":
+            # The default scale of sdpa is 1 / sqrt(dim_head), the same as `self.scale`.
+            hidden_states = F.scaled_dot_product_attention(query, key, value)
+            return self.reshape_batch_dim_to_heads(hidden_states)
         # TODO: use baddbmm for better performance
         attention_scores = torch.matmul(query, key.transpose(-1, -2)) * self.scale
         attention_probs = attention_scores.softmax(dim=-1)
@@ -298,9 +344,11 @@ class OffsetRefStrucInter(nn.Module):
         self.gnorm_out = torch.nn.GroupNorm(num_groups=num_groups, num_channels=style_feat_in_channels, eps=1e-6, affine=True)
         self.proj_out = nn.Conv2d(style_feat_in_channels, 1*2*3*3, kernel_size=1, stride=1, padding=0)
 
-    def forward(self, res_hidden_states, style_content_hidden_states):
-        batch, c_channel, height, width = res_hidden_states.shape
-        _, s_channel, _, _ = style_content_hidden_states.shape
+    def prepare_style(self, style_content_hidden_states):
+        """The style projecter and the attention query only depend on the style \
+            image, so they can be computed once and passed as `prepared_style`.
+        """
+        batch, s_channel, height, width = style_content_hidden_states.shape
         # style projecter
         style_content_hidden_states = self.gnorm_s(style_content_hidden_states)
         style_content_hidden_states = self.style_proj_in(style_content_hidden_states)
@@ -308,6 +356,16 @@ class OffsetRefStrucInter(nn.Module):
         style_content_hidden_states = style_content_hidden_states.permute(0, 2, 3, 1).reshape(batch, height*width, s_channel)
         style_content_hidden_states = self.ln_s(style_content_hidden_states)
 
+        query = self.cross_attention.prepare_query(style_content_hidden_states)
+
+        return style_content_hidden_states, query
+
+    def forward(self, res_hidden_states, style_content_hidden_states, prepared_style=None):
+        batch, c_channel, height, width = res_hidden_states.shape
+        if prepared_style is None:
+            prepared_style = self.prepare_style(style_content_hidden_states)
+        style_content_hidden_states, query = prepared_style
+
         # content projecter
         res_hidden_states = self.gnorm_c(res_hidden_states)
         res_hidden_states = self.content_proj_in(res_hidden_states)
@@ -316,7 +374,7 @@ class OffsetRefStrucInter(nn.Module):
         res_hidden_states = self.ln_c(res_hidden_states)
 
         # style and content cross-attention
-        hidden_states = self.cross_attention(style_content_hidden_states, context=res_hidden_states)
+        hidden_states = self.cross_attention(style_content_hidden_states, context=res_hidden_states, query=query)
 
         # ffn
         hidden_states = self.ff(self.ln_ff(hidden_states)) + hidden_states
@@ -134,7 +134,7 @@ class SN(object):
         return [getattr(self, 'sv%d' % i) for i in range(self.num_svs)]
 
     def W_(self):
-        W_mat = self.weight.view(self.weight.size(0), -1)
+        W_mat = self.weight.reshape(self.weight.size(0), -1)
         if self.transpose:
             W_mat = W_mat.t()
         for _ in range(self.num_itrs):
@@ -194,9 +194,9 @@ class Attention(nn.Module):
         phi = F.max_pool2d(self.phi(x), [2,2])
         g = F.max_pool2d(self.g(x), [2,2])
         
-        theta = theta.view(-1, self. ch // 8, x.shape[2] * x.shape[3])
-        phi = phi.view(-1, self. ch // 8, x.shape[2] * x.shape[3] // 4)
-        g = g.view(-1, self. ch // 2, x.shape[2] * x.shape[3] // 4)
+        theta = theta.reshape(-1, self. ch // 8, x.shape[2] * x.shape[3])
+        phi = phi.reshape(-1, self. ch // 8, x.shape[2] * x.shape[3] // 4)
+        g = g.reshape(-1, self. ch // 2, x.shape[2] * x.shape[3] // 4)
         
         beta = F.softmax(torch.bmm(theta.transpose(1, 2), phi), -1)
         
@@ -0,0 +1,110 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.nn.modules.utils import _pair
+
+# The implementations of the deformable convs of the StyleRSIUpBlock2D: the torchvision kernel, or
+# the grid_sample decomposition, which is also the one exportable to ONNX and faster on CPU.
+DEFORM_CONV_BACKENDS = ("torchvision", "grid_sample")
+
+
+def deform_conv2d_grid_sample(input, offset, weight, bias=None, stride=1, padding=0, dilation=1):
+    """`torchvision.ops.deform_conv2d` (without mask) decomposed into `grid_sample` and a matmul, \
+        which are exportable to ONNX (GridSample, opset >= 16).
+
+    Every kernel tap is bilinearly sampled at its offset position with zero padding, the same \
+        sampling as torchvision, and the [B, C * K, H_out * W_out] columns are multiplied by the \
+        [C_out, C * K] weight.
+    """
+    stride_h, stride_w = _pair(stride)
+    pad_h, pad_w = _pair(padding)
+    dil_h, dil_w = _pair(dilation)
+    batch_size, in_channels, height, width = input.shape
+    out_channels, _, kernel_h, kernel_w = weight.shape
+    num_taps = kernel_h * kernel_w
+    offset_groups = offset.shape[1] // (2 * num_taps)
+    out_h, out_w = offset.shape[2], offset.shape[3]
+
+    # The [K, H_out, W_out] sampling positions without offset.
+    ys = torch.arange(out_h, device=input.device, dtype=input.dtype) * stride_h - pad_h
+    xs = torch.arange(out_w, device=input.device, dtype=input.dtype) * stride_w - pad_w
+    kernel_ys = torch.arange(kernel_h, device=input.device, dtype=input.dtype) * dil_h
+    kernel_xs = torch.arange(kernel_w, device=input.device, dtype=input.dtype) * dil_w
+    kernel_ys, kernel_xs = torch.meshgrid(kernel_ys, kernel_xs, indexing="ij")
+    base_y = kernel_ys.reshape(num_taps, 1, 1) + ys.reshape(1, out_h, 1)
+    base_x = kernel_xs.reshape(num_taps, 1, 1) + xs.reshape(1, 1, out_w)
+
+    # The offsets are (dy, dx) pairs of every offset group and kernel tap.
+    offset = offset.reshape(batch_size * offset_groups, num_taps, 2, out_h, out_w)
+    sample_y = base_y + offset[:, :, 0]
+    sample_x = base_x + offset[:, :, 1]
+    # align_corners=True maps -1 and 1 to the centers of the border pixels.
+    grid = torch.stack([sample_x * (2 / max(width - 1, 1)) - 1,
+                        sample_y * (2 / max(height - 1, 1)) - 1], dim=-1)
+    grid = grid.reshape(batch_size * offset_groups, num_taps * out_h, out_w, 2)
+
+    input = input.reshape(batch_size * offset_groups, in_channels // offset_groups, height, width)
+    columns = F.grid_sample(input, grid, mode="bilinear", padding_mode="zeros", align_corners=True)
+    # [B, C, K, H_out * W_out] -> [B, C * K, H_out * W_out], in the (C, kh, kw) order of the weight.
+    columns = columns.reshape(batch_size, in_channels * num_taps, out_h * out_w)
+
+    out = torch.matmul(weight.reshape(out_channels, -1), columns)
+    if bias is not None:
+        out = out + bias.reshape(1, out_channels, 1)
+    return out.reshape(batch_size, out_channels, out_h, out_w)
+
+
+class GridSampleDeformConv2d(nn.Module):
+    """Drop-in replacement of a `torchvision.ops.DeformConv2d` sharing its weight, \
+        computed by `deform_conv2d_grid_sample`.
+    """
+
+    def __init__(self, deform_conv):
+        super().__init__()
+        self.weight = deform_conv.weight
+        self.bias = deform_conv.bias
+        self.stride = deform_conv.stride
+        self.padding = deform_conv.padding
+        self.dilation = deform_conv.dilation
+        assert deform_conv.groups == 1, "Only the DeformConv2d of groups=1 is supported."
+
+    def to_deform_conv(self):
+        """The `torchvision.ops.DeformConv2d` sharing the weight of this conv.
+        """
+        from torchvision.ops import DeformConv2d
+
+        out_channels, in_channels, kernel_h, kernel_w = self.weight.shape
+        deform_conv = DeformConv2d(in_channels, out_channels, (kernel_h, kernel_w), stride=self.stride,
+                                   padding=self.padding, dilation=self.dilation, bias=self.bias is not None)
+        deform_conv.weight = self.weight
+        deform_conv.bias = self.bias
+        return deform_conv
+
+    def forward(self, input, offset):
+        return deform_conv2d_grid_sample(input, offset, self.weight, self.bias,
+                                         stride=self.stride, padding=self.padding, dilation=self.dilation)
+
+
+def set_deform_conv_backend(module, backend):
+    """Run every deformable conv in `module` by `backend` in place (see `DEFORM_CONV_BACKENDS`): \
+        "torchvision" for `torchvision.ops.DeformConv2d` or "grid_sample" for GridSampleDeformConv2d.
+
+    Both share the weight and bias parameters, so the state_dict is the same for either backend.
+    """
+    assert backend in DEFORM_CONV_BACKENDS, f"Unsupported deformable conv backend {backend}."
+    from torchvision.ops import DeformConv2d
+
+    for name, child in module.named_children():
+        if backend == "grid_sample" and isinstance(child, DeformConv2d):
+            setattr(module, name, GridSampleDeformConv2d(child))
+        elif backend == "torchvision" and isinstance(child, GridSampleDeformConv2d):
+            setattr(module, name, child.to_deform_conv())
+        else:
+            set_deform_conv_backend(child, backend)
+    return module
+
+
+def replace_deform_convs(module):
+    """Replace every `torchvision.ops.DeformConv2d` in `module` by a GridSampleDeformConv2d in place.
+    """
+    return set_deform_conv_backend(module, "grid_sample")
@@ -82,3 +82,37 @@ class Timesteps(nn.Module):
             downscale_freq_shift=self.downscale_freq_shift,
         )
         return t_emb
+
+
+class TimestepEmbeddingTable:
+    """The time embeddings `emb` of the UNet for a fixed set of timesteps, e.g. the model input \
+        times of a solver plan, computed in one batch at the first lookup and then served as rows, \
+        instead of the sinusoidal projection and the TimestepEmbedding MLP at every UNet call.
+
+    A timestep which is not in the table (e.g. the intermediate times of the singlestep solver) \
+        is embedded at its first lookup and kept. The rows are recomputed when `version`, the \
+        version of the embedding weights, changes.
+    """
+
+    def __init__(self, timesteps):
+        self.timesteps = timesteps.reshape(-1)
+        self.version = None
+        # timestep value -> [1, D] embedding, None before the first lookup.
+        self.rows = None
+
+    def lookup(self, timesteps, embed_fn, version=None):
+        """The [N, D] embeddings of the 1-d `timesteps`, `embed_fn(timesteps)` computing the missing ones.
+        """
+        if self.rows is None or version != self.version:
+            embeddings = embed_fn(self.timesteps.to(timesteps.device))
+            self.rows = {t: embeddings[i:i + 1] for i, t in enumerate(self.timesteps.tolist())}
+            self.version = version
+        values = timesteps.tolist()
+        missing = list(dict.fromkeys(t for t in values if t not in self.rows))
+        if len(missing) > 0:
+            embeddings = embed_fn(torch.tensor(missing, dtype=timesteps.dtype, device=timesteps.device))
+            self.rows.update({t: embeddings[i:i + 1] for i, t in enumerate(missing)})
+        if all(t == values[0] for t in values):
+            # The solver steps share one time across the batch.
+            return self.rows[values[0]].expand(len(values), -1)
+        return torch.cat([self.rows[t] for t in values], dim=0)
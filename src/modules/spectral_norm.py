@@ -0,0 +1,53 @@
+import torch
+import torch.nn as nn
+
+from . import content_encoder, style_encoder
+from ..model import bump_weights_generation
+
+SN_LAYERS = (content_encoder.SN, style_encoder.SN)
+
+
+def _baked_layer(layer):
+    # The normalized weight of eval mode: one power iteration on the frozen u, without updating it.
+    training = layer.training
+    layer.eval()
+    weight = layer.W_()
+    layer.train(training)
+    bias = layer.bias is not None
+    factory_kwargs = {"device": weight.device, "dtype": weight.dtype}
+    if isinstance(layer, nn.Conv2d):
+        baked = nn.Conv2d(layer.in_channels, layer.out_channels, layer.kernel_size, stride=layer.stride,
+                          padding=layer.padding, dilation=layer.dilation, groups=layer.groups, bias=bias,
+                          padding_mode=layer.padding_mode, **factory_kwargs)
+    elif isinstance(layer, nn.Linear):
+        baked = nn.Linear(layer.in_features, layer.out_features, bias=bias, **factory_kwargs)
+    else:
+        raise TypeError(f"No plain layer of the spectral norm layer {type(layer).__name__}.")
+    baked.weight.copy_(weight)
+    if bias:
+        baked.bias.copy_(layer.bias)
+    baked.train(training)
+    return baked
+
+
+@torch.no_grad()
+def bake_spectral_norm(module):
+    """Replace every SNConv2d/SNLinear of the content and style encoders in `module` by a plain \
+        nn.Conv2d/nn.Linear in place, whose weight is the normalized weight `W_()` of eval mode.
+
+    The baked layers compute the eval outputs of the SN layers without the power iteration of \
+        every forward, but they drop the u/sv buffers, so they are for inference only and their \
+        state_dict no longer loads into the SN encoders. The weights generation of `module` is \
+        bumped, so the features cached with the SN layers are encoded again.
+    """
+    _bake_spectral_norm(module)
+    bump_weights_generation(module)
+    return module
+
+
+def _bake_spectral_norm(module):
+    for name, child in module.named_children():
+        if isinstance(child, SN_LAYERS):
+            setattr(module, name, _baked_layer(child))
+        else:
+            _bake_spectral_norm(child)
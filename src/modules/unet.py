@@ -10,7 +10,9 @@ from diffusers.configuration_utils import (ConfigMixin,
                                            register_to_config)
 from diffusers.utils import BaseOutput, logging
 
-from .embeddings import TimestepEmbedding, Timesteps
+from .embeddings import TimestepEmbedding, Timesteps, TimestepEmbeddingTable
+from .attention import CrossAttention
+from .deform_conv import set_deform_conv_backend
 from .unet_blocks import (DownBlock2D,
                           UNetMidMCABlock2D,
                           UpBlock2D,
@@ -189,10 +191,72 @@ class UNet(ModelMixin, ConfigMixin):
             if hasattr(block, "attentions") and block.attentions is not None:
                 block.set_attention_slice(slice_size)
 
+    def set_attention_backend(self, backend):
+        """Run every CrossAttention of the transformers and the offset interpreters by `backend`, \
+            "sdpa" or "math" (see `ATTENTION_BACKENDS`).
+        """
+        for module in self.modules():
+            if isinstance(module, CrossAttention):
+                module.set_attention_backend(backend)
+
+    def set_deform_conv_backend(self, backend):
+        """Run the deformable convs of the StyleRSIUpBlock2Ds by `backend`, "torchvision" or \
+            "grid_sample" (see `DEFORM_CONV_BACKENDS`).
+        """
+        set_deform_conv_backend(self, backend)
+
+    def embed_timesteps(self, timesteps):
+        """The [N, D] time embeddings `emb` of the 1-d `timesteps`.
+        """
+        t_emb = self.time_proj(timesteps)
+
+        # timesteps does not contain any weights and will always return f32 tensors
+        # but time_embedding might actually be running in fp16. so we need to cast here.
+        # there might be better ways to encapsulate this.
+        t_emb = t_emb.to(dtype=self.dtype)
+        return self.time_embedding(t_emb)  # projection
+
+    def time_embedding_version(self):
+        # Every in-place update of the time embedding weights bumps their version counters.
+        return (id(self), sum(t._version for t in self.time_embedding.parameters()))
+
+    def prepare_time_embedding_table(self, timesteps):
+        """The TimestepEmbeddingTable of the model input `timesteps` of a sampling run, e.g. those \
+            of a solver plan, to pass to `forward` as `time_embedding_table` at every step. It is \
+            filled at the first lookup, so it can be shared by all the runs of the same plan.
+        """
+        return TimestepEmbeddingTable(timesteps)
+
     def _set_gradient_checkpointing(self, module, value=False):
         if isinstance(module, (DownBlock2D, UpBlock2D)):
             module.gradient_checkpointing = value
 
+    def prepare_context(self, encoder_hidden_states):
+        """Precompute the sub-computations that only depend on the conditions, i.e. the key/value \
+            projections of the style cross-attentions and the style branch of the offset interpreters. \
+            The result can be passed to `forward` as `prepared_context` for every sampling step \
+            with the same `encoder_hidden_states`.
+        """
+        prepared_context = {"down": [], "mid": None, "up": []}
+        for downsample_block in self.down_blocks:
+            if hasattr(downsample_block, "prepare_context"):
+                prepared_context["down"].append(downsample_block.prepare_context(encoder_hidden_states))
+            else:
+                prepared_context["down"].append(None)
+
+        if self.mid_block is not None:
+            prepared_context["mid"] = self.mid_block.prepare_context(encoder_hidden_states)
+
+        for upsample_block in self.up_blocks:
+            if hasattr(upsample_block, "prepare_context"):
+                prepared_context["up"].append(upsample_block.prepare_context(
+                    style_structure_features=encoder_hidden_states[3],
+                    encoder_hidden_states=encoder_hidden_states[2]))
+            else:
+                prepared_context["up"].append(None)
+
+        return prepared_context
+
     def forward(
         self,
         sample: torch.FloatTensor,
@@ -200,7 +264,18 @@ class UNet(ModelMixin, ConfigMixin):
         encoder_hidden_states: torch.Tensor,
         content_encoder_downsample_size: int = 4,
         return_dict: bool = False,
+        prepared_context: Optional[dict] = None,
+        deep_cache: Optional[dict] = None,
+        time_embedding_table: Optional[TimestepEmbeddingTable] = None,
     ) -> Union[UNetOutput, Tuple]:
+        """`deep_cache` is a dict {"depth": k, "feature": None or a tensor} for the cached sampling \
+            (DeepCache). The UNet is split into the shallow path, i.e. conv_in, the first k down blocks, \
+            the last k up blocks and conv_out, and the deep path of the other blocks. If "feature" is a \
+            tensor, it is used as the output of the deep path, which is skipped. Otherwise the deep path \
+            runs and its output is stored in "feature" for the next steps. \
+            If `time_embedding_table` is set (see `prepare_time_embedding_table`), the time \
+            embeddings are looked up in it instead of computed.
+        """
         # By default samples have to be AT least a multiple of the overall upsampling factor.
         # The overall upsampling factor is equal to 2 ** (# num of upsampling layears).
         # However, the upsampling interpolation output size can be forced to fit any upsampling size
@@ -226,45 +301,66 @@ class UNet(ModelMixin, ConfigMixin):
         # broadcast to batch dimension in a way that's compatible with ONNX/Core ML
         timesteps = timesteps.expand(sample.shape[0])
 
-        t_emb = self.time_proj(timesteps)
+        if time_embedding_table is None:
+            emb = self.embed_timesteps(timesteps)
+        else:
+            emb = time_embedding_table.lookup(timesteps, self.embed_timesteps,
+                                              version=self.time_embedding_version())
 
-        # timesteps does not contain any weights and will always return f32 tensors
-        # but time_embedding might actually be running in fp16. so we need to cast here.
-        # there might be better ways to encapsulate this.
-        t_emb = t_emb.to(dtype=self.dtype)
-        emb = self.time_embedding(t_emb)  # projection
+        if prepared_context is None:
+            prepared_context = self.prepare_context(encoder_hidden_states)
 
         # 2. pre-process
         sample = self.conv_in(sample)
 
+        cache_depth = None if deep_cache is None else deep_cache["depth"]
+        if cache_depth is not None and not 0 < cache_depth < len(self.down_blocks):
+            raise ValueError(f"The DeepCache depth should be in [1, {len(self.down_blocks) - 1}], but got {cache_depth}.")
+        use_cached_feature = deep_cache is not None and deep_cache["feature"] is not None
+
         # 3. down
         down_block_res_samples = (sample,)
         for index, downsample_block in enumerate(self.down_blocks):
+            if use_cached_feature and index == cache_depth:
+                break
             if (hasattr(downsample_block, "attentions") and downsample_block.attentions is not None) or hasattr(downsample_block, "content_attentions"):
                 sample, res_samples = downsample_block(
                     hidden_states=sample,
                     temb=emb,
                     encoder_hidden_states=encoder_hidden_states,
                     index=index,
+                    prepared_context=prepared_context["down"][index],
                 )
             else:
                 sample, res_samples = downsample_block(hidden_states=sample, temb=emb)   
 
             down_block_res_samples += res_samples
 
+        if use_cached_feature:
+            # Keep the residuals which the last `cache_depth` up blocks consume, dropping the
+            # downsampled output of the last shallow down block.
+            num_shallow_res = sum(len(block.resnets) for block in self.up_blocks[len(self.up_blocks) - cache_depth:])
+            down_block_res_samples = down_block_res_samples[:num_shallow_res]
+            sample = deep_cache["feature"]
+
         # 4. mid
-        if self.mid_block is not None:
+        if self.mid_block is not None and not use_cached_feature:
             sample = self.mid_block(
                 sample, 
                 emb, 
                 index=content_encoder_downsample_size,
-                encoder_hidden_states=encoder_hidden_states
+                encoder_hidden_states=encoder_hidden_states,
+                prepared_context=prepared_context["mid"],
             )
 
         # 5. up
         offset_out_sum = 0
         for i, upsample_block in enumerate(self.up_blocks):
             is_final_block = i == len(self.up_blocks) - 1
+            if deep_cache is not None and i == len(self.up_blocks) - cache_depth:
+                deep_cache["feature"] = sample
+            elif use_cached_feature and i < len(self.up_blocks) - cache_depth:
+                continue
 
             res_samples = down_block_res_samples[-len(upsample_block.resnets) :]
             down_block_res_samples = down_block_res_samples[: -len(upsample_block.resnets)]
@@ -281,6 +377,7 @@ class UNet(ModelMixin, ConfigMixin):
                     res_hidden_states_tuple=res_samples,
                     style_structure_features=encoder_hidden_states[3],
                     encoder_hidden_states=encoder_hidden_states[2],
+                    prepared_context=prepared_context["up"][i],
                 )
                 offset_out_sum += offset_out
             else:
@@ -191,15 +191,26 @@ class UNetMidMCABlock2D(nn.Module):
         self.style_attentions = nn.ModuleList(style_attentions)
         self.resnets = nn.ModuleList(resnets)
 
+    def prepare_context(self, encoder_hidden_states):
+        current_style_feature = encoder_hidden_states[0]
+        batch_size, channel, height, width = current_style_feature.shape
+        current_style_feature = current_style_feature.permute(0, 2, 3, 1).reshape(batch_size, height*width, channel)
+        return [style_attn.prepare_context(current_style_feature) for style_attn in self.style_attentions]
+
     def forward(
         self, 
         hidden_states, 
         temb=None, 
         encoder_hidden_states=None,
         index=None,
+        prepared_context=None,
     ):
+        if prepared_context is None:
+            prepared_context = self.prepare_context(encoder_hidden_states)
+
         hidden_states = self.resnets[0](hidden_states, temb)
-        for content_attn, style_attn, resnet in zip(self.content_attentions, self.style_attentions, self.resnets[1:]):
+        for content_attn, style_attn, resnet, style_context in \
+            zip(self.content_attentions, self.style_attentions, self.resnets[1:], prepared_context):
             
             # content
             current_content_feature = encoder_hidden_states[1][index]
@@ -209,10 +220,7 @@ class UNetMidMCABlock2D(nn.Module):
             hidden_states = resnet(hidden_states, temb)
 
             # style
-            current_style_feature = encoder_hidden_states[0]
-            batch_size, channel, height, width = current_style_feature.shape
-            current_style_feature = current_style_feature.permute(0, 2, 3, 1).reshape(batch_size, height*width, channel)
-            hidden_states = style_attn(hidden_states, context=current_style_feature)
+            hidden_states = style_attn(hidden_states, prepared_context=style_context)
 
         return hidden_states
 
@@ -304,16 +312,27 @@ class MCADownBlock2D(nn.Module):
 
         self.gradient_checkpointing = False
 
+    def prepare_context(self, encoder_hidden_states):
+        current_style_feature = encoder_hidden_states[0]
+        batch_size, channel, height, width = current_style_feature.shape
+        current_style_feature = current_style_feature.permute(0, 2, 3, 1).reshape(batch_size, height*width, channel)
+        return [style_attn.prepare_context(current_style_feature) for style_attn in self.style_attentions]
+
     def forward(
         self, 
         hidden_states, 
         index,
         temb=None, 
-        encoder_hidden_states=None
+        encoder_hidden_states=None,
+        prepared_context=None,
     ):
         output_states = ()
 
-        for content_attn, resnet, style_attn in zip(self.content_attentions, self.resnets, self.style_attentions):
+        if prepared_context is None:
+            prepared_context = self.prepare_context(encoder_hidden_states)
+
+        for content_attn, resnet, style_attn, style_context in \
+            zip(self.content_attentions, self.resnets, self.style_attentions, prepared_context):
             
             # content
             current_content_feature = encoder_hidden_states[1][index]
@@ -323,10 +342,7 @@ class MCADownBlock2D(nn.Module):
             hidden_states = resnet(hidden_states, temb)
 
             # style
-            current_style_feature = encoder_hidden_states[0]
-            batch_size, channel, height, width = current_style_feature.shape
-            current_style_feature = current_style_feature.permute(0, 2, 3, 1).reshape(batch_size, height*width, channel)
-            hidden_states = style_attn(hidden_states, context=current_style_feature)
+            hidden_states = style_attn(hidden_states, prepared_context=style_context)
 
             output_states += (hidden_states,)
 
@@ -531,6 +547,14 @@ class StyleRSIUpBlock2D(nn.Module):
 
         self.gradient_checkpointing = False
 
+    def prepare_context(self, style_structure_features, encoder_hidden_states):
+        style_content_feat = style_structure_features[-self.upblock_index-2]
+        return {
+            "offsets": [sc_inter_offset.prepare_style(style_content_feat) \
+                        for sc_inter_offset in self.sc_interpreter_offsets],
+            "attentions": [attn.prepare_context(encoder_hidden_states) for attn in self.attentions],
+        }
+
     def forward(
         self,
         hidden_states,
@@ -539,11 +563,18 @@ class StyleRSIUpBlock2D(nn.Module):
         temb=None,
         encoder_hidden_states=None,
         upsample_size=None,
+        prepared_context=None,
     ):
         total_offset = 0
 
         style_content_feat = style_structure_features[-self.upblock_index-2]
 
+        if prepared_context is None:
+            prepared_context = {
+                "offsets": [None] * self.num_layers,
+                "attentions": [None] * self.num_layers,
+            }
+
         for i, (sc_inter_offset, dcn_deform, resnet, attn) in \
             enumerate(zip(self.sc_interpreter_offsets, self.dcn_deforms, self.resnets, self.attentions)):
             # pop res hidden states 
@@ -551,14 +582,19 @@ class StyleRSIUpBlock2D(nn.Module):
             res_hidden_states_tuple = res_hidden_states_tuple[:-1]
             
             # Skip Style Content Interpreter by DCN
-            offset = sc_inter_offset(res_hidden_states, style_content_feat)
+            offset = sc_inter_offset(res_hidden_states, style_content_feat, 
+                                     prepared_style=prepared_context["offsets"][i])
             offset = offset.contiguous()
             # offset sum
             offset_sum = torch.mean(torch.abs(offset))
             total_offset += offset_sum
 
             res_hidden_states = res_hidden_states.contiguous()
-            res_hidden_states = dcn_deform(res_hidden_states, offset)
+            # torchvision has no low-precision deform_conv2d kernel on CPU, so under autocast
+            # the DCN runs in the dtype of its weight.
+            with torch.autocast(device_type=res_hidden_states.device.type, enabled=False):
+                res_hidden_states = dcn_deform(res_hidden_states.to(dcn_deform.weight.dtype),
+                                               offset.to(dcn_deform.weight.dtype))
             # concat as input
             hidden_states = torch.cat([hidden_states, res_hidden_states], dim=1)
 
@@ -576,7 +612,8 @@ class StyleRSIUpBlock2D(nn.Module):
                 )
             else:
                 hidden_states = resnet(hidden_states, temb)
-                hidden_states = attn(hidden_states, context=encoder_hidden_states)
+                hidden_states = attn(hidden_states, context=encoder_hidden_states, 
+                                     prepared_context=prepared_context["attentions"][i])
 
         if self.upsamplers is not None:
             for upsampler in self.upsamplers:
@@ -0,0 +1,213 @@
+import os
+import copy
+import json
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from .model import (ContentFeatures,
+                    StyleFeatures,
+                    bump_weights_generation)
+from .modules.deform_conv import replace_deform_convs
+from .modules.spectral_norm import bake_spectral_norm
+
+
+# GridSample, which the deformable convs are decomposed into, needs opset >= 16.
+ONNX_OPSET = 17
+
+
+class _ContentEncoderGraph(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, images):
+        return tuple(self.model.encode_content(images).residual_features)
+
+
+class _StyleEncoderGraph(nn.Module):
+    def __init__(self, style_encoder):
+        super().__init__()
+        self.style_encoder = style_encoder
+
+    def forward(self, images):
+        style_img_feature, _, _ = self.style_encoder(images)
+        return style_img_feature
+
+
+class _UNetGraph(nn.Module):
+    """One UNet step taking the precomputed condition features as flat inputs.
+    """
+
+    def __init__(self, unet, num_content_features, content_encoder_downsample_size):
+        super().__init__()
+        self.unet = unet
+        self.num_content_features = num_content_features
+        self.content_encoder_downsample_size = content_encoder_downsample_size
+
+    def forward(self, x_t, timesteps, style_img_feature, style_hidden_states, *features):
+        content_residual_features = list(features[:self.num_content_features])
+        style_content_res_features = list(features[self.num_content_features:])
+        encoder_hidden_states = [style_img_feature, content_residual_features,
+                                 style_hidden_states, style_content_res_features]
+        out = self.unet(x_t, timesteps, encoder_hidden_states,
+                        content_encoder_downsample_size=self.content_encoder_downsample_size)
+        return out[0]
+
+
+def _export(module, inputs, input_names, output_names, onnx_path, opset):
+    dynamic_axes = {name: {0: "batch"} for name in input_names + output_names}
+    torch.onnx.export(module, inputs, onnx_path,
+                      input_names=input_names,
+                      output_names=output_names,
+                      dynamic_axes=dynamic_axes,
+                      opset_version=opset)
+
+
+@torch.no_grad()
+def export_onnx(model, onnx_dir, content_image_size, style_image_size, content_encoder_downsample_size,
+                opset=ONNX_OPSET):
+    """Export the FontDiffuserModelDPM `model` into content_encoder.onnx, style_encoder.onnx \
+        and unet.onnx under `onnx_dir`, which `OnnxFontDiffuserModel` runs by onnxruntime.
+
+    The UNet graph is one denoising step whose condition features are explicit inputs, so \
+        the encoders run once per generate call as in the torch pipeline. The deformable convs \
+        are exported through their `grid_sample` decomposition and the spectral norm layers of the \
+        encoders as plain layers of their normalized weights.
+    """
+    os.makedirs(onnx_dir, exist_ok=True)
+    model = copy.deepcopy(model).to("cpu").eval()
+    replace_deform_convs(model.unet)
+    bake_spectral_norm(model.content_encoder)
+    bake_spectral_norm(model.style_encoder)
+
+    content_images = torch.ones((1, 3, *content_image_size))
+    style_images = torch.ones((1, 3, *style_image_size))
+    content_features = model.encode_content(content_images)
+    style_features = model.encode_style(style_images)
+    num_content_features = len(content_features.residual_features)
+    num_style_content_features = len(style_features.content_res_features)
+
+    content_names = [f"content_residual_feature_{i}" for i in range(num_content_features)]
+    _export(_ContentEncoderGraph(model), (content_images,), ["images"], content_names,
+            f"{onnx_dir}/content_encoder.onnx", opset)
+    _export(_StyleEncoderGraph(model.style_encoder), (style_images,), ["images"], ["style_img_feature"],
+            f"{onnx_dir}/style_encoder.onnx", opset)
+
+    style_content_names = [f"style_content_res_feature_{i}" for i in range(num_style_content_features)]
+    unet_input_names = ["x_t", "timesteps", "style_img_feature", "style_hidden_states"] \
+        + content_names + style_content_names
+    unet_inputs = (torch.randn((1, 3, *content_image_size)), torch.full((1,), 500.),
+                   style_features.img_feature, style_features.hidden_states,
+                   *content_features.residual_features, *style_features.content_res_features)
+    _export(_UNetGraph(model.unet, num_content_features, content_encoder_downsample_size), unet_inputs,
+            unet_input_names, ["noise_pred"], f"{onnx_dir}/unet.onnx", opset)
+
+    with open(f"{onnx_dir}/onnx_config.json", "w") as f:
+        json.dump({"opset": opset,
+                   "content_encoder_downsample_size": content_encoder_downsample_size,
+                   "content_names": content_names,
+                   "style_content_names": style_content_names}, f)
+
+
+class OnnxFontDiffuserModel():
+    """The `FontDiffuserModelDPM` interface used by `FontDiffuserDPMPipeline` (encode_content, \
+        encode_style and denoise), running the graphs of `export_onnx` by onnxruntime.
+    """
+
+    def __init__(self, onnx_dir, num_threads=None, providers=("CPUExecutionProvider",)):
+        import onnxruntime as ort
+
+        with open(f"{onnx_dir}/onnx_config.json", "r") as f:
+            self.config = json.load(f)
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads is not None:
+            session_options.intra_op_num_threads = num_threads
+        self.sessions = {name: ort.InferenceSession(f"{onnx_dir}/{name}.onnx", session_options,
+                                                    providers=list(providers)) \
+                         for name in ["content_encoder", "style_encoder", "unet"]}
+        # The exporter drops the inputs which the UNet does not use.
+        self.unet_input_names = {node.name for node in self.sessions["unet"].get_inputs()}
+        self.onnx_dir = onnx_dir
+        self.device = torch.device("cpu")
+        bump_weights_generation(self)
+        self.encoder_fingerprint = None
+        # The (data_ptr, shape, stride, version) of the condition tensors -> (the tensors, their contiguous
+        # numpy UNet inputs) of the last conditions, made at their first step and reused by the later ones.
+        # The tensors are kept so their memory is not reused by other tensors while they are cached.
+        self.condition_feeds = OrderedDict()
+
+    def encoder_weights_version(self):
+        # The weights of the graphs never change.
+        return (self.weights_generation, 0)
+
+    def encoder_weights_fingerprint(self):
+        # The sha256 of the encoder graphs, hashed at the first call.
+        if self.encoder_fingerprint is None:
+            sha = hashlib.sha256()
+            for name in ["content_encoder", "style_encoder"]:
+                with open(f"{self.onnx_dir}/{name}.onnx", "rb") as f:
+                    for chunk in iter(lambda: f.read(2**20), b""):
+                        sha.update(chunk)
+            self.encoder_fingerprint = sha.hexdigest()
+        return self.encoder_fingerprint
+
+    def _run(self, name, feeds):
+        return [torch.from_numpy(out) for out in self.sessions[name].run(None, feeds)]
+
+    def encode_content(self, content_images):
+        residual_features = self._run("content_encoder", {"images": content_images.cpu().numpy()})
+        return ContentFeatures(residual_features=residual_features)
+
+    def encode_style(self, style_images):
+        style_images = style_images.cpu().numpy()
+        style_img_feature, = self._run("style_encoder", {"images": style_images})
+        batch_size, channel, height, width = style_img_feature.shape
+        style_hidden_states = style_img_feature.permute(0, 2, 3, 1).reshape(batch_size, height*width, channel)
+        style_content_res_features = self._run("content_encoder", {"images": style_images})
+        return StyleFeatures(
+            img_feature=style_img_feature,
+            hidden_states=style_hidden_states,
+            content_res_features=style_content_res_features)
+
+    def _condition_feeds(self, content_features, style_features):
+        features = [style_features.img_feature, style_features.hidden_states] \
+            + content_features.residual_features + style_features.content_res_features
+        names = ["style_img_feature", "style_hidden_states"] \
+            + self.config["content_names"] + self.config["style_content_names"]
+        features = [(name, feature) for name, feature in zip(names, features) if name in self.unet_input_names]
+        key = tuple((feature.data_ptr(), tuple(feature.shape), feature.stride(), feature._version) \
+                    for _, feature in features)
+        if key not in self.condition_feeds:
+            self.condition_feeds[key] = (features, {name: np.ascontiguousarray(feature.detach().cpu().numpy()) \
+                                                    for name, feature in features})
+            # A sampling run has at most three conditions (the unguided and the guided ones).
+            while len(self.condition_feeds) > 4:
+                self.condition_feeds.popitem(last=False)
+        self.condition_feeds.move_to_end(key)
+        return self.condition_feeds[key][1]
+
+    def denoise(
+        self,
+        x_t,
+        timesteps,
+        cond,
+        content_encoder_downsample_size,
+        version=None,
+        deep_cache=None,
+        time_embedding_table=None,
+    ):
+        assert content_encoder_downsample_size == self.config["content_encoder_downsample_size"], \
+            "The content_encoder_downsample_size is fixed when exporting the UNet."
+        assert deep_cache is None, "The exported UNet has no DeepCache path, sample with deep_cache_interval=1."
+        # The time embedding is computed in the UNet graph, so the time_embedding_table is not used.
+
+        feeds = dict(self._condition_feeds(cond[0], cond[1]))
+        feeds["x_t"] = x_t.detach().cpu().contiguous().numpy()
+        feeds["timesteps"] = timesteps.detach().cpu().float().reshape(-1).expand(x_t.shape[0]).contiguous().numpy()
+        noise_pred, = self._run("unet", feeds)
+        return noise_pred.to(x_t.device)
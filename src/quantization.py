@@ -0,0 +1,90 @@
+import os
+import json
+
+import torch
+import torch.nn as nn
+import torch.ao.nn.quantized as nnq
+from torch.ao.quantization import (QuantWrapper,
+                                   get_default_qconfig,
+                                   prepare,
+                                   convert,
+                                   quantize_dynamic)
+
+
+# The convs whose outputs are too sensitive for int8: the input/output convs of the UNet
+# and the offset predictors of the deformable convs, whose outputs are sampling coordinates.
+DEFAULT_FP32_CONVS = ("conv_in", "conv_out", "sc_interpreter_offsets")
+
+
+def _wrap_convs(module, fp32_convs, qconfig, prefix=""):
+    """Wrap every nn.Conv2d not in `fp32_convs` by a QuantWrapper with `qconfig`, so only the \
+        convs are statically quantized and the rest of the UNet stays fp32.
+    """
+    for name, child in module.named_children():
+        full_name = f"{prefix}.{name}" if prefix else name
+        if any(fp32_name in full_name for fp32_name in fp32_convs):
+            continue
+        if type(child) is nn.Conv2d:
+            wrapper = QuantWrapper(child)
+            wrapper.qconfig = qconfig
+            setattr(module, name, wrapper)
+        else:
+            _wrap_convs(child, fp32_convs, qconfig, prefix=full_name)
+
+
+def _build_quantized_convs(module):
+    """Replace the float modules of every QuantWrapper in `module` by their int8 modules, whose \
+        weights and quantization parameters are left to be loaded from a quantized state_dict.
+    """
+    for name, child in module.named_children():
+        if isinstance(child, QuantWrapper):
+            conv = child.module
+            child.quant = nnq.Quantize(scale=1.0, zero_point=0, dtype=torch.quint8)
+            child.module = nnq.Conv2d(conv.in_channels, conv.out_channels, conv.kernel_size,
+                                      stride=conv.stride, padding=conv.padding, dilation=conv.dilation,
+                                      groups=conv.groups, bias=conv.bias is not None,
+                                      padding_mode=conv.padding_mode)
+            child.dequant = nnq.DeQuantize()
+        else:
+            _build_quantized_convs(child)
+
+
+def quantize_unet(unet, calibrate_fn=None, static_conv=True, fp32_convs=DEFAULT_FP32_CONVS, backend="x86"):
+    """Quantize the UNet in place for the CPU inference and return it.
+
+    The nn.Linear layers (attentions, feed-forwards, time embedding) are dynamically quantized \
+        to int8. If `static_conv`, the nn.Conv2d layers except `fp32_convs` are statically \
+        quantized to int8, whose activation ranges are observed while `calibrate_fn()` runs the \
+        model on the sample glyphs. Without `calibrate_fn` only the int8 structure is built, \
+        without observers, to load a quantized state_dict with strict=True.
+
+    The encoders are kept fp32: they run once per generate call, and their SN convs normalize \
+        the weight at runtime.
+    """
+    unet.eval()
+    torch.backends.quantized.engine = backend
+    if static_conv:
+        _wrap_convs(unet, fp32_convs, get_default_qconfig(backend))
+        if calibrate_fn is not None:
+            prepare(unet, inplace=True)
+            with torch.no_grad():
+                calibrate_fn()
+            convert(unet, inplace=True)
+        else:
+            _build_quantized_convs(unet)
+    quantize_dynamic(unet, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    return unet
+
+
+def save_quantization_config(ckpt_dir, static_conv=True, fp32_convs=DEFAULT_FP32_CONVS, backend="x86"):
+    with open(f"{ckpt_dir}/quantization.json", "w") as f:
+        json.dump({"static_conv": static_conv, "fp32_convs": list(fp32_convs), "backend": backend}, f)
+
+
+def load_quantization_config(ckpt_dir):
+    """Return the `quantize_unet` kwargs of an int8 checkpoint, or None for a fp32 checkpoint.
+    """
+    if not os.path.exists(f"{ckpt_dir}/quantization.json"):
+        return None
+    with open(f"{ckpt_dir}/quantization.json", "r") as f:
+        return json.load(f)
@@ -0,0 +1,113 @@
+import os
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import torch
+
+from .model import StyleFeatures
+
+
+@dataclass(frozen=True)
+class StyleHandle:
+    """Content hash of the style images, passed to the pipeline instead of the pixels.
+
+    The handle keeps the (small) preprocessed style images, so the registry can encode \
+        them again if their features were evicted or the encoder weights changed.
+    """
+    key: str
+    style_images: torch.Tensor = field(repr=False, compare=False)
+
+
+def _features_nbytes(style_features):
+    tensors = [style_features.img_feature, style_features.hidden_states, *style_features.content_res_features]
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class StyleRegistry():
+    """Memory-bounded LRU cache of the StyleFeatures, keyed by the content hash of the style images.
+
+    The least recently used features are evicted when the cached features exceed \
+        `max_memory_bytes`, and are spilled to `spill_dir` (if given) instead of being \
+        dropped, so they are loaded back rather than encoded again. The entries are validated \
+        against the fingerprint of the encoder weights, so the spilled features are also reused \
+        by the later processes loading the same weights.
+    """
+
+    def __init__(self, max_memory_bytes=256 * 2**20, spill_dir=None):
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_dir = spill_dir
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+        # key -> (encoder weights fingerprint, StyleFeatures), from the least to the most recently used.
+        self.entries = OrderedDict()
+        self.memory_bytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def make_handle(style_images):
+        """Hash the preprocessed style images into a StyleHandle.
+        """
+        style_images = style_images.detach().cpu().contiguous()
+        sha = hashlib.sha256()
+        sha.update(str((tuple(style_images.shape), style_images.dtype)).encode())
+        sha.update(style_images.numpy().tobytes())
+        return StyleHandle(key=sha.hexdigest(), style_images=style_images)
+
+    def _spill_path(self, key):
+        return f"{self.spill_dir}/{key}.pt"
+
+    def get(self, key, weights_fingerprint, device):
+        """Return the cached StyleFeatures of `key` on `device`, or None if they are missing \
+            or were encoded with other encoder weights, whose spilled features are deleted.
+        """
+        if key in self.entries:
+            entry_fingerprint, style_features = self.entries[key]
+            if entry_fingerprint == weights_fingerprint:
+                self.entries.move_to_end(key)
+                return style_features.to(device)
+            self._remove(key)
+        elif self.spill_dir is not None and os.path.exists(self._spill_path(key)):
+            spilled = torch.load(self._spill_path(key))
+            # The features loaded back are spilled again when they are evicted.
+            os.remove(self._spill_path(key))
+            if spilled.get("weights_fingerprint") == weights_fingerprint:
+                style_features = StyleFeatures(
+                    img_feature=spilled["img_feature"],
+                    hidden_states=spilled["hidden_states"],
+                    content_res_features=spilled["content_res_features"])
+                self.put(key, weights_fingerprint, style_features)
+                return style_features.to(device)
+        return None
+
+    def put(self, key, weights_fingerprint, style_features):
+        if key in self.entries:
+            self._remove(key)
+        # A fresh StyleFeatures without the UNet context memoized by `FontDiffuserModelDPM.denoise`.
+        style_features = style_features.to(style_features.img_feature.device)
+        self.entries[key] = (weights_fingerprint, style_features)
+        self.memory_bytes += _features_nbytes(style_features)
+        # Keep at least the newest entry even if it alone exceeds the memory budget.
+        while self.memory_bytes > self.max_memory_bytes and len(self.entries) > 1:
+            self._evict()
+
+    def _remove(self, key):
+        _, style_features = self.entries.pop(key)
+        self.memory_bytes -= _features_nbytes(style_features)
+
+    def _evict(self):
+        key = next(iter(self.entries))
+        entry_fingerprint, style_features = self.entries[key]
+        if self.spill_dir is not None:
+            style_features = style_features.to("cpu")
+            torch.save({"weights_fingerprint": entry_fingerprint,
+                        "img_feature": style_features.img_feature,
+                        "hidden_states": style_features.hidden_states,
+                        "content_res_features": style_features.content_res_features}, self._spill_path(key))
+        self._remove(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.memory_bytes = 0
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+from src import (DeepCache,
+                 FontDiffuserModelDPM)
+
+
+class RecordingUNet():
+    """Stands in for the UNet of `FontDiffuserModelDPM.denoise`, recording whether every call runs \
+        the deep path and checking that a reused deep feature is of the batch of the call.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, x_t, timesteps, deep_cache=None, **kwargs):
+        feature = deep_cache["feature"]
+        if feature is None:
+            self.calls.append((x_t.shape[0], "full"))
+            deep_cache["feature"] = x_t.clone()
+        else:
+            assert feature.shape == x_t.shape
+            self.calls.append((x_t.shape[0], "cached"))
+        return (x_t,)
+
+
+def denoise(unet, x_t, deep_cache):
+    model = SimpleNamespace(unet=unet)
+    cond = [SimpleNamespace(residual_features=[]),
+            SimpleNamespace(img_feature=None, hidden_states=None, content_res_features=None, unet_context=[])]
+    return FontDiffuserModelDPM.denoise(model, x_t, torch.zeros(()), cond, content_encoder_downsample_size=3,
+                                        deep_cache=deep_cache)
+
+
+def test_interleaved_batch_sizes_have_their_own_cadence():
+    # The guided calls (batch 4) interleaved with the cond-only calls (batch 2) of reuse_uncond
+    # and guidance_interval.
+    unet = RecordingUNet()
+    deep_cache = DeepCache(depth=1, interval=2)
+    batch_sizes = [4, 2, 2, 4, 2, 4, 4, 2]
+    for batch_size in batch_sizes:
+        denoise(unet, torch.randn(batch_size, 3, 8, 8), deep_cache)
+
+    for batch_size in set(batch_sizes):
+        calls = [kind for size, kind in unet.calls if size == batch_size]
+        assert calls == ["full", "cached", "full", "cached"]
+
+
+def test_clear_runs_the_next_calls_in_full():
+    unet = RecordingUNet()
+    deep_cache = DeepCache(depth=1, interval=3)
+    for _ in range(2):
+        denoise(unet, torch.randn(4, 3, 8, 8), deep_cache)
+    deep_cache.clear()
+    denoise(unet, torch.randn(4, 3, 8, 8), deep_cache)
+    assert [kind for _, kind in unet.calls] == ["full", "cached", "full"]
+
+
+@pytest.mark.parametrize("kwargs", [dict(depth=0), dict(depth=-1), dict(interval=0)])
+def test_invalid_deep_cache_raises(kwargs):
+    with pytest.raises(ValueError):
+        DeepCache(**kwargs)
@@ -0,0 +1,44 @@
+import pytest
+import torch
+import torch.nn as nn
+from torchvision.ops import DeformConv2d
+
+from src.modules.deform_conv import (GridSampleDeformConv2d,
+                                     set_deform_conv_backend)
+
+
+def make_deform_conv(channels):
+    # The DCN of the StyleRSIUpBlock2D: a 3x3 kernel, one offset group.
+    return DeformConv2d(in_channels=channels, out_channels=channels, kernel_size=(3, 3), stride=1, padding=1,
+                        dilation=1)
+
+
+@pytest.mark.parametrize("channels, size", [(256, 24), (128, 48)])
+def test_grid_sample_deform_conv_matches_torchvision(channels, size):
+    torch.manual_seed(0)
+    deform_conv = make_deform_conv(channels)
+    input = torch.randn(2, channels, size, size)
+    # Offsets of a few pixels, which also sample outside of the map.
+    offset = torch.randn(2, 2 * 3 * 3, size, size) * 3
+
+    with torch.no_grad():
+        expected = deform_conv(input, offset)
+        value = GridSampleDeformConv2d(deform_conv)(input, offset)
+
+    torch.testing.assert_close(value, expected, atol=1e-5, rtol=1e-5)
+
+
+def test_set_deform_conv_backend_round_trips_state_dict():
+    module = nn.ModuleDict({"dcn_deforms": nn.ModuleList([make_deform_conv(8), make_deform_conv(16)]),
+                            "conv": nn.Conv2d(8, 8, 3)})
+    state_dict = module.state_dict()
+
+    set_deform_conv_backend(module, "grid_sample")
+    assert all(isinstance(dcn, GridSampleDeformConv2d) for dcn in module["dcn_deforms"])
+    assert list(module.state_dict()) == list(state_dict)
+
+    set_deform_conv_backend(module, "torchvision")
+    assert all(isinstance(dcn, DeformConv2d) for dcn in module["dcn_deforms"])
+    assert list(module.state_dict()) == list(state_dict)
+    for key, tensor in module.state_dict().items():
+        torch.testing.assert_close(tensor, state_dict[key], atol=0, rtol=0)
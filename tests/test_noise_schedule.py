@@ -0,0 +1,66 @@
+import pytest
+import torch
+
+from src.dpm_solver.dpm_solver_pytorch import (NoiseScheduleVP,
+                                               interpolate_fn,
+                                               lookup_fn)
+
+
+def interpolate_marginal(ns, t):
+    # (log_alpha_t, alpha_t, sigma_t, lambda_t) by `interpolate_fn`, as the marginal functions looked them up before.
+    log_alpha_t = interpolate_fn(t.reshape((-1, 1)), ns.t_array, ns.log_alpha_array).reshape((-1))
+    return (log_alpha_t, torch.exp(log_alpha_t), torch.sqrt(1. - torch.exp(2. * log_alpha_t)),
+            log_alpha_t - 0.5 * torch.log(1. - torch.exp(2. * log_alpha_t)))
+
+
+def interpolate_inverse_lambda(ns, lamb):
+    log_alpha = -0.5 * torch.logaddexp(torch.zeros((1,), dtype=lamb.dtype), -2. * lamb)
+    t = interpolate_fn(log_alpha.reshape((-1, 1)), torch.flip(ns.log_alpha_array, [1]), torch.flip(ns.t_array, [1]))
+    return t.reshape((-1,))
+
+
+@pytest.fixture(params=[torch.float32, torch.float64])
+def noise_schedule(request):
+    betas = torch.linspace(0.0001 ** 0.5, 0.02 ** 0.5, 1000, dtype=torch.float64) ** 2
+    return NoiseScheduleVP(schedule='discrete', betas=betas, dtype=request.param)
+
+
+def query_times(ns):
+    # Both endpoints of [1 / N, T], a knot, the points between the knots and the extrapolated segments
+    # on both sides (above t = 0, where sigma_t vanishes).
+    N = ns.total_N
+    t = torch.tensor([1. / N, ns.T, 0.5, 0.5 / N, 1.01, 1.2], dtype=torch.float64)
+    t = torch.cat([t, 1. / N + torch.rand((100,), generator=torch.Generator().manual_seed(0), dtype=torch.float64)])
+    return t.to(ns.t_array.dtype)
+
+
+def tolerances(dtype):
+    return dict(atol=1e-5, rtol=1e-5) if dtype == torch.float32 else dict(atol=1e-12, rtol=1e-12)
+
+
+def test_lookup_fn_matches_interpolate_fn():
+    generator = torch.Generator().manual_seed(0)
+    xp = torch.sort(torch.rand((50,), generator=generator, dtype=torch.float64)).values
+    yp = torch.randn((50,), generator=generator, dtype=torch.float64)
+    slopes = (yp[1:] - yp[:-1]) / (xp[1:] - xp[:-1])
+    x = torch.cat([xp, xp[:1] - 0.5, xp[-1:] + 0.5, torch.rand((100,), generator=generator, dtype=torch.float64)])
+
+    expected = interpolate_fn(x.reshape((-1, 1)), xp.reshape((1, -1)), yp.reshape((1, -1))).reshape((-1,))
+    torch.testing.assert_close(lookup_fn(x, xp, yp, slopes), expected, atol=1e-12, rtol=1e-12)
+
+
+def test_marginal_matches_interpolate_fn(noise_schedule):
+    ns = noise_schedule
+    t = query_times(ns)
+    for value, expected in zip(ns.marginal(t), interpolate_marginal(ns, t)):
+        torch.testing.assert_close(value, expected, **tolerances(t.dtype))
+
+
+def test_inverse_lambda_matches_interpolate_fn(noise_schedule):
+    ns = noise_schedule
+    t = query_times(ns)
+    lamb = ns.marginal_lambda(t.clamp(1. / ns.total_N, ns.T))
+    # Beyond the lambda_t of both endpoints too.
+    lamb = torch.cat([lamb, lamb.max()[None] + 1., lamb.min()[None] - 1.])
+    torch.testing.assert_close(ns.inverse_lambda(lamb), interpolate_inverse_lambda(ns, lamb),
+                               **tolerances(lamb.dtype))
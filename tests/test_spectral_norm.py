@@ -0,0 +1,38 @@
+import copy
+
+import pytest
+import torch
+
+from src import (ContentEncoder,
+                 StyleEncoder,
+                 bake_spectral_norm)
+from src.modules.spectral_norm import SN_LAYERS
+
+
+def assert_outputs_close(expected, value):
+    if isinstance(expected, (list, tuple)):
+        assert len(expected) == len(value)
+        for e, v in zip(expected, value):
+            assert_outputs_close(e, v)
+    else:
+        torch.testing.assert_close(value, expected)
+
+
+@pytest.mark.parametrize("encoder_cls", [ContentEncoder, StyleEncoder])
+def test_baked_encoder_matches_eval_outputs(encoder_cls):
+    torch.manual_seed(0)
+    encoder = encoder_cls(G_ch=8, resolution=96)
+    images = torch.randn(2, 3, 96, 96)
+    # A few train mode forwards move the u/sv buffers away from their initialization.
+    with torch.no_grad():
+        for _ in range(3):
+            encoder(images)
+    encoder.eval()
+
+    baked = bake_spectral_norm(copy.deepcopy(encoder))
+
+    assert not any(isinstance(module, SN_LAYERS) for module in baked.modules())
+    with torch.no_grad():
+        assert_outputs_close(encoder(images), baked(images))
+        # The SN encoder does not update its buffers in eval mode, so it still matches.
+        assert_outputs_close(encoder(images), baked(images))
@@ -1,16 +1,16 @@
 import os
-import cv2
-import yaml
+import json
 import copy
-import pygame
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from PIL import Image
-from fontTools.ttLib import TTFont
 
 import torch
 import torchvision.transforms as transforms
 
 def save_args_to_yaml(args, output_file):
+    import yaml
+
     # Convert args namespace to a dictionary
     args_dict = vars(args)
 
@@ -19,10 +19,64 @@ def save_args_to_yaml(args, output_file):
         yaml.dump(args_dict, yaml_file, default_flow_style=False)
 
 
+def save_image_atomic(image, save_path, **save_kwargs):
+    """Save the PIL image as a PNG through a temporary file, so an interruption never leaves a \
+        half-written image. `save_kwargs` are passed to `Image.save` (e.g. compress_level).
+    """
+    tmp_path = f"{save_path}.tmp"
+    image.save(tmp_path, format="PNG", **save_kwargs)
+    os.replace(tmp_path, save_path)
+
+
+def save_images_atomic(images, save_paths, mode="RGB", compress_level=6, num_threads=4):
+    """Encode the uint8 batch `images` ([B, H, W, 3] or grayscale [B, H, W]) into the PNGs `save_paths` \
+        by `num_threads` threads, each through a temporary file as `save_image_atomic`.
+
+    `mode` is "RGB", "L" (8-bit grayscale) or "1" (1-bit, thresholded at 128), and `compress_level` \
+        is the zlib level of the PNGs (1 is the fastest).
+    """
+    assert mode in ["RGB", "L", "1"], f"Unsupported PNG mode {mode}."
+
+    def save(image, save_path):
+        if image.ndim == 3 and mode != "RGB":
+            image = image.mean(axis=-1).round().astype(np.uint8)
+        if mode == "1":
+            image = image >= 128
+        save_image_atomic(Image.fromarray(image), save_path, compress_level=compress_level)
+
+    # PIL releases the GIL while compressing, so the images are encoded in parallel.
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        list(executor.map(save, images, save_paths))
+
+
+def read_manifest(manifest_path, job):
+    """Return the (finished codepoints, seed) recorded in the manifest, or (an empty set, None) \
+        if the manifest is missing or was written by another job.
+    """
+    if not os.path.exists(manifest_path):
+        return set(), None
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("job") != job:
+        return set(), None
+    return set(manifest["codepoints"]), manifest.get("seed")
+
+
+def write_manifest(manifest_path, job, codepoints, seed=None):
+    """Write the finished codepoints of the job and the seed they were generated with atomically.
+    """
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"job": job, "seed": seed, "codepoints": sorted(codepoints)}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, manifest_path)
+
+
 def save_single_image(save_dir, image):
 
     save_path = f"{save_dir}/out_single.png"
-    image.save(save_path)
+    save_image_atomic(image=image, save_path=save_path)
 
 
 def save_image_with_content_style(save_dir, image, content_image_pil, content_image_path, style_image_path, resolution):
@@ -83,6 +137,8 @@ def normalize_mean_std(image):
 
 
 def is_char_in_font(font_path, char):
+    from fontTools.ttLib import TTFont
+
     TTFont_font = TTFont(font_path)
     cmap = TTFont_font['cmap']
     for subtable in cmap.tables:
@@ -91,7 +147,30 @@ def is_char_in_font(font_path, char):
     return False
 
 
+def get_font_chars(font_path):
+    """Return the set of the codepoints which have a glyph in the font.
+    """
+    from fontTools.ttLib import TTFont
+
+    TTFont_font = TTFont(font_path)
+    font_chars = set()
+    for subtable in TTFont_font['cmap'].tables:
+        font_chars.update(subtable.cmap.keys())
+    return font_chars
+
+
+def read_charset(charset_path):
+    """Read the characters of a charset file, e.g. big5_4808.txt.
+    """
+    with open(charset_path, "r", encoding="utf-8") as f:
+        return [char for char in f.read() if not char.isspace()]
+
+
 def load_ttf(ttf_path, fsize=128):
+    # pygame and cv2 are only imported by the rendering of the characters.
+    import pygame
+    import pygame.freetype
+
     pygame.init()
 
     font = pygame.freetype.Font(ttf_path, size=fsize)
@@ -99,7 +178,9 @@ def load_ttf(ttf_path, fsize=128):
 
 
 def ttf2im(font, char, fsize=128):
-    
+    import cv2
+    import pygame
+
     try:
         surface, _ = font.render(char)
     except:
@@ -2,7 +2,7 @@ import random
 import gradio as gr
 import os
 from sample import (arg_parse, 
-                    sampling,
+                    iter_sampling_charset,
                     load_fontdiffuer_pipeline)
 from PIL import Image
 import svgwrite
@@ -20,29 +20,22 @@ def run_fontdiffuer(handwriting_image, sampling_step, guidance_scale, batch_size
     args.character_input = True  # 讓系統知道「只用風格圖片」，不需要 content_image
     args.sampling_step = sampling_step
     args.guidance_scale = guidance_scale
-    args.batch_size = batch_size
+    args.batch_size = int(batch_size)
     args.seed = random.randint(0, 10000)
     
-    output_images = []
-    output_folder = "generated_images"
-    os.makedirs(output_folder, exist_ok=True)
+    args.save_image_dir = "generated_images"
+    characters_to_generate = [char for char in characters_to_generate if len(char) == 1]  # 避免意外讀取到多個字元的錯誤
     
-    for char in characters_to_generate:
-        if len(char) != 1:
-            continue  # 避免意外讀取到多個字元的錯誤
-        args.content_character = char  # 設定當前要生成的字
-        out_image = sampling(
-            args=args,
-            pipe=pipe,
-            content_image=None,  # 這裡明確設定為 None，避免報錯
-            style_image=handwriting_image  # 風格圖片
-        )
-        
-        image_path = os.path.join(output_folder, f"{ord(char)}.png")
-        out_image.save(image_path)
-        output_images.append(image_path)
-    
-    return output_images  # 回傳所有字型圖片
+    # 批次生成，風格圖片只編碼一次；每完成一個批次就更新畫面，中斷後重新執行會跳過已生成的字
+    output_images = []
+    for batch in iter_sampling_charset(
+        args=args,
+        pipe=pipe,
+        chars=characters_to_generate,
+        style_image=handwriting_image  # 風格圖片
+    ):
+        output_images.extend(image_path for _, image_path in batch)
+        yield output_images  # 回傳目前已生成的字型圖片
 
 def create_ttf_from_images(image_folder, output_ttf):
     font = TTFont()